@@ -1,3 +1,29 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from apps.books.models import Book
+from apps.education.models import Course
+from apps.films.models import Film
+from apps.reviews.services import add_review, set_favorite
+from main.testing import QueryBudgetMixin
+
+
+class ProfileQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Число запросов профиля не зависит от количества и типов избранного"""
+
+    def test_profile_favorites(self):
+        user = User.objects.create_user('reader', password='pass')
+        self.client.force_login(user)
+
+        def seed_favorites(count):
+            for number in range(count):
+                number = Book.objects.count()
+                book = Book.objects.create(title=f'Книга {number}', author='Автор', content='Текст')
+                film = Film.objects.create(title=f'Фильм {number}', slug=f'film-{number}', description='Описание')
+                course = Course.objects.create(title=f'Курс {number}', instructor='Преподаватель',
+                                               description='Описание', duration_hours=5)
+                for obj in (book, film, course):
+                    set_favorite(user, obj, True)
+                add_review(user, book, 5)
+
+        self.assertConstantQueries('/accounts/profile/', seed_favorites, budget=10)
@@ -36,58 +36,28 @@ class CustomLogoutView(LogoutView):
 class ProfileView(LoginRequiredMixin, TemplateView):
     template_name = 'accounts/profile.html'
 
+    favorites_per_page = 20
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        from django.contrib.contenttypes.models import ContentType
-        from apps.reviews.models import Favorite
-        from apps.books.models import Book
-        from apps.education.models import Course
-        from apps.films.models import Film
-
-        # Получаем все избранные записи пользователя
-        favorites = Favorite.objects.filter(user=self.request.user)
-
-        # Группируем по типам контента
-        book_ids = []
-        course_ids = []
-        film_ids = []
-
-        for fav in favorites:
-            if fav.content_type.model == 'book':
-                book_ids.append(fav.object_id)
-            elif fav.content_type.model == 'course':
-                course_ids.append(fav.object_id)
-            elif fav.content_type.model == 'film':
-                film_ids.append(fav.object_id)
-
-        # Получаем объекты
-        favorite_books = Book.objects.filter(id__in=book_ids) if book_ids else []
-        favorite_courses = Course.objects.filter(id__in=course_ids) if course_ids else []
-        favorite_films = Film.objects.filter(id__in=film_ids) if film_ids else []
+        from apps.reviews.services import get_favorite_counts, get_user_favorites
 
-        # Создаем словарь для быстрого сопоставления объекта с датой добавления в избранное
-        fav_dates = {}
-        for fav in favorites:
-            key = (fav.content_type.model, fav.object_id)
-            fav_dates[key] = fav.created_at
+        # Количество избранного по типам - один запрос с группировкой
+        counts = get_favorite_counts(self.request.user)
 
-        # Передаем в контекст
-        context['favorite_books'] = [
-            {'book': book, 'created_at': fav_dates.get(('book', book.id))}
-            for book in favorite_books
-        ]
-        context['favorite_courses'] = [
-            {'course': course, 'created_at': fav_dates.get(('course', course.id))}
-            for course in favorite_courses
-        ]
-        context['favorite_films'] = [
-            {'film': film, 'created_at': fav_dates.get(('film', film.id))}
-            for film in favorite_films
-        ]
+        # Текущая страница избранного в порядке добавления (новые сверху)
+        page_number = self.request.GET.get('page')
+        favorites_page = get_user_favorites(
+            self.request.user, page_number, self.favorites_per_page, total=sum(counts.values())
+        )
+        context['favorites_page'] = favorites_page
+        context['favorites'] = favorites_page.object_list
+        # При листании избранного сразу открываем его вкладку
+        context['favorites_tab_active'] = page_number is not None
 
         # Статистика для боковой панели
-        context['books_count'] = len(favorite_books)
-        context['films_count'] = len(favorite_films)
-        context['courses_count'] = len(favorite_courses)
+        context['books_count'] = counts.get('book', 0)
+        context['films_count'] = counts.get('film', 0)
+        context['courses_count'] = counts.get('course', 0)
 
         return context
@@ -0,0 +1,26 @@
+# Generated by Django 6.0.2 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+def fill_chunk_offsets(apps, schema_editor):
+    from apps.books.services import compute_chunk_offsets
+    Book = apps.get_model('books', 'Book')
+    for book_id, content in Book.objects.values_list('id', 'content').iterator(chunk_size=100):
+        Book.objects.filter(id=book_id).update(chunk_offsets=compute_chunk_offsets(content))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_alter_favorite_unique_together_remove_favorite_book_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='chunk_offsets',
+            field=models.JSONField(blank=True, default=list, editable=False, verbose_name='Границы фрагментов'),
+        ),
+        migrations.RunPython(fill_chunk_offsets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0.2 on 2026-10-19 12:05
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_likes_count(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Favorite = apps.get_model('reviews', 'Favorite')
+    Book = apps.get_model('books', 'Book')
+    content_type = ContentType.objects.filter(app_label='books', model='book').first()
+    if content_type is None:
+        return
+    counts = Favorite.objects.filter(
+        content_type=content_type, object_id=OuterRef('pk')
+    ).values('object_id').annotate(count=Count('id')).values('count')
+    Book.objects.update(likes_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0003_favorite_user_created_index'),
+        ('books', '0005_book_chunk_offsets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='likes_count',
+            field=models.IntegerField(default=0, verbose_name='Лайки'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['-likes_count'], name='book_likes_idx'),
+        ),
+        migrations.RunPython(fill_likes_count, migrations.RunPython.noop),
+    ]
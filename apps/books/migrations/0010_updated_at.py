@@ -0,0 +1,25 @@
+# Generated by Django 6.0.2 on 2026-10-19 16:02
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_created_at(apps, schema_editor):
+    # Существующие записи не менялись с добавления (иначе - время миграции)
+    apps.get_model('books', 'Book').objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0009_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата обновления'),
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+    ]
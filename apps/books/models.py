@@ -1,13 +1,24 @@
 from django.db import models
+from django.urls import reverse
 from django.contrib.contenttypes.fields import GenericRelation
 
 
+class BookManager(models.Manager):
+    """Менеджер по умолчанию: не загружает полный текст книги"""
+
+    def get_queryset(self):
+        return super().get_queryset().defer('content')
+
+
 class Book(models.Model):
     title = models.CharField('Название', max_length=200)
     author = models.CharField('Автор', max_length=100)
     description = models.TextField('Описание книги', blank=True)
     content = models.TextField('Текст книги')  # Здесь будет обычный текст
+    # Границы фрагментов для постраничного чтения, см. services.compute_chunk_offsets
+    chunk_offsets = models.JSONField('Границы фрагментов', default=list, blank=True, editable=False)
     created_at = models.DateTimeField('Дата добавления', auto_now_add=True)
+    updated_at = models.DateTimeField('Дата обновления', auto_now=True)
 
     # Поля доступности
     has_subtitles = models.BooleanField('Есть субтитры', default=False)
@@ -17,18 +28,50 @@ class Book(models.Model):
     # Теги для рекомендаций
     tags = models.CharField('Теги (через запятую)', max_length=300, blank=True)
 
+    # Сколько раз добавлена в избранное (обновляется в reviews.services)
+    likes_count = models.IntegerField('Лайки', default=0)
+
     # Связь с общей системой отзывов
     reviews = GenericRelation('reviews.Review', content_type_field='content_type', object_id_field='object_id')
     favorites = GenericRelation('reviews.Favorite', content_type_field='content_type', object_id_field='object_id')
+    # Позиции в рейтинге по оценкам (сортировка ?sort=rating)
+    rating_ranks = GenericRelation('reviews.RatingRank', content_type_field='content_type', object_id_field='object_id')
+
+    objects = BookManager()
+    with_content = models.Manager()
 
     class Meta:
         verbose_name = 'Книга'
         verbose_name_plural = 'Книги'
         ordering = ['-created_at']
+        indexes = [
+            # Сортировки списка (views.BOOK_SORTS): поле и id для одинаковых значений
+            models.Index(fields=['-created_at', '-id'], name='book_created_idx'),
+            models.Index(fields=['-likes_count', '-id'], name='book_likes_idx'),
+            models.Index(fields=['title', 'id'], name='book_title_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def get_absolute_url(self):
+        return reverse('books:book_detail', args=[self.id])
+
+    def save(self, *args, **kwargs):
+        # Пересчитываем фрагменты, только если текст загружен (не отложен)
+        if 'content' not in self.get_deferred_fields():
+            from .services import compute_chunk_offsets
+            self.chunk_offsets = compute_chunk_offsets(self.content)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'content' in update_fields:
+                kwargs['update_fields'] = set(update_fields) | {'chunk_offsets'}
+        super().save(*args, **kwargs)
+
+    @property
+    def chunk_count(self):
+        """Количество страниц в режиме чтения"""
+        return max(len(self.chunk_offsets) - 1, 0)
+
     def get_tags_list(self):
         """Возвращает список тегов"""
         if self.tags:
@@ -37,15 +80,15 @@ class Book(models.Model):
 
     @property
     def average_rating(self):
-        """Средний рейтинг из общей системы"""
-        from apps.reviews.services import get_average_rating
-        return get_average_rating('book', self.id)
+        """Средний рейтинг из общей системы (в списках загружается attach_ratings)"""
+        from apps.reviews.services import get_object_rating
+        return get_object_rating(self).average_rating
 
     @property
     def review_count(self):
         """Количество отзывов из общей системы"""
-        from apps.reviews.services import get_review_count
-        return get_review_count('book', self.id)
+        from apps.reviews.services import get_object_rating
+        return get_object_rating(self).review_count
 
     def get_reviews(self):
         """Получить все отзывы для этой книги"""
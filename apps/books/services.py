@@ -0,0 +1,59 @@
+# apps/books/services.py
+from django.conf import settings
+from django.db.models.functions import Substr
+
+
+def get_chunk_size():
+    return getattr(settings, 'BOOK_CHUNK_SIZE', 20000)
+
+
+def compute_chunk_offsets(text, chunk_size=None):
+    """
+    Делит текст на фрагменты примерно по chunk_size символов.
+
+    Граница фрагмента сдвигается назад к концу абзаца (или хотя бы
+    к пробелу), чтобы не резать слова. Возвращает список границ
+    [0, b1, b2, ..., len(text)]: фрагмент i - это text[b[i]:b[i + 1]].
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    length = len(text)
+    offsets = [0]
+    start = 0
+    while length - start > chunk_size:
+        limit = start + chunk_size
+        # Ищем разрыв только во второй половине фрагмента
+        end = text.rfind('\n', start + chunk_size // 2, limit)
+        if end == -1:
+            end = text.rfind(' ', start + chunk_size // 2, limit)
+        end = limit if end == -1 else end + 1
+        offsets.append(end)
+        start = end
+    if length > 0:
+        offsets.append(length)
+    return offsets
+
+
+def ensure_chunk_offsets(book):
+    """
+    Возвращает границы фрагментов книги, вычисляя их один раз.
+    Нужна для книг, загруженных в обход save() (например, loaddata).
+    """
+    if not book.chunk_offsets:
+        from .models import Book
+        content = Book.objects.filter(pk=book.pk).values_list('content', flat=True).get()
+        book.chunk_offsets = compute_chunk_offsets(content)
+        Book.objects.filter(pk=book.pk).update(chunk_offsets=book.chunk_offsets)
+    return book.chunk_offsets
+
+
+def get_book_chunk(book, number):
+    """
+    Текст фрагмента number (с 1) без загрузки всей книги:
+    подстрока вырезается на стороне базы данных.
+    """
+    from .models import Book
+    offsets = ensure_chunk_offsets(book)
+    start, end = offsets[number - 1], offsets[number]
+    return Book.objects.filter(pk=book.pk).annotate(
+        chunk=Substr('content', start + 1, end - start)
+    ).values_list('chunk', flat=True).get()
@@ -0,0 +1,124 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from apps.reviews.services import add_review, set_favorite
+from main.testing import QueryBudgetMixin
+from .models import Book
+from .services import compute_chunk_offsets, ensure_chunk_offsets, get_book_chunk
+
+
+class BookQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Число запросов страниц книг не зависит от числа книг и отзывов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='pass')
+
+    def seed_books(self, count):
+        for number in range(count):
+            book = Book.objects.create(
+                title=f'Книга {Book.objects.count()}', author='Автор', content='Текст книги',
+                tags='классика, проза', has_subtitles=True,
+            )
+            add_review(self.user, book, 4, 'Хорошая книга')
+            set_favorite(self.user, book, True)
+
+    def test_book_list(self):
+        # Блоки «лучшие по оценкам» и «сейчас читают» - по два запроса
+        self.assertConstantQueries('/books/', self.seed_books, budget=11)
+
+    def test_book_list_authenticated(self):
+        self.client.force_login(self.user)
+        self.assertConstantQueries('/books/', self.seed_books, budget=16)
+
+    def test_book_search(self):
+        self.assertConstantQueries('/books/search/?q=Книга', self.seed_books, budget=8)
+
+    def test_book_by_accessibility(self):
+        self.assertConstantQueries('/books/accessibility/?has_subtitles=true', self.seed_books, budget=8)
+
+    def test_book_detail_reviews(self):
+        book = Book.objects.create(title='Война и мир', author='Лев Толстой', content='Текст книги')
+
+        def seed_reviews(count):
+            for number in range(count):
+                user = User.objects.create_user(f'reader{User.objects.count()}')
+                add_review(user, book, 5, 'Отзыв')
+
+        self.assertConstantQueries(f'/books/{book.id}/', seed_reviews, budget=12)
+
+
+class BookConditionalTests(TestCase):
+    def test_edit_invalidates_etag(self):
+        book = Book.objects.create(title='Война и мир', author='Лев Толстой', content='Текст книги')
+        for url in (f'/books/{book.id}/', '/books/'):
+            # Первый просмотр создает CachedRating объекта
+            self.client.get(url)
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            book.description = f'Новое описание {url}'
+            book.save()
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class BookChunkTests(TestCase):
+    text = ''.join(f'Абзац {number}. ' + 'слово ' * 30 + '\n' for number in range(20))
+
+    def test_offsets_split_at_paragraphs(self):
+        offsets = compute_chunk_offsets(self.text, chunk_size=500)
+        self.assertEqual((offsets[0], offsets[-1]), (0, len(self.text)))
+        chunks = [self.text[start:end] for start, end in zip(offsets, offsets[1:])]
+        self.assertEqual(''.join(chunks), self.text)
+        self.assertTrue(all(len(chunk) <= 500 for chunk in chunks))
+        self.assertTrue(all(chunk.endswith('\n') for chunk in chunks))
+        # Без переводов строк - граница по пробелу, в крайнем случае ровно по размеру
+        self.assertEqual(compute_chunk_offsets('слово ' * 10, chunk_size=20), [0, 18, 36, 54, 60])
+        self.assertEqual(compute_chunk_offsets('x' * 50, chunk_size=20), [0, 20, 40, 50])
+        self.assertEqual(compute_chunk_offsets(''), [0])
+
+    @override_settings(BOOK_CHUNK_SIZE=500)
+    def test_save_computes_offsets(self):
+        book = Book.objects.create(title='Книга', author='Автор', content=self.text)
+        self.assertEqual(book.chunk_offsets, compute_chunk_offsets(self.text))
+        self.assertGreater(book.chunk_count, 1)
+
+        # Текст отложен - границы не пересчитываются и не теряются
+        book = Book.objects.get(pk=book.pk)
+        book.title = 'Новое название'
+        book.save()
+        self.assertEqual(Book.objects.get(pk=book.pk).chunk_offsets, compute_chunk_offsets(self.text))
+
+        book = Book.with_content.get(pk=book.pk)
+        book.content = 'Короткий текст'
+        book.save(update_fields=['content'])
+        self.assertEqual(Book.objects.get(pk=book.pk).chunk_offsets, [0, len('Короткий текст')])
+
+    @override_settings(BOOK_CHUNK_SIZE=500)
+    def test_chunks_read_by_substring(self):
+        book = Book.objects.create(title='Книга', author='Автор', content=self.text)
+        # Загружена в обход save() - границы вычисляются при первом чтении
+        Book.objects.filter(pk=book.pk).update(chunk_offsets=[])
+        book = Book.objects.get(pk=book.pk)
+        self.assertEqual(ensure_chunk_offsets(book), compute_chunk_offsets(self.text))
+        self.assertEqual(Book.objects.get(pk=book.pk).chunk_offsets, book.chunk_offsets)
+
+        offsets = book.chunk_offsets
+        with self.assertNumQueries(1):
+            chunk = get_book_chunk(book, 2)
+        self.assertEqual(chunk, self.text[offsets[1]:offsets[2]])
+        self.assertEqual(get_book_chunk(book, book.chunk_count), self.text[offsets[-2]:])
+
+        response = self.client.get(f'/books/{book.id}/read/', {'page': 2})
+        self.assertEqual(response.context['chunk'], chunk)
+        self.assertIn('content', response.context['book'].get_deferred_fields())
+
+    def test_content_deferred_on_pages(self):
+        book = Book.objects.create(title='Книга', author='Автор', content=self.text)
+        self.assertIn('content', Book.objects.get(pk=book.pk).get_deferred_fields())
+
+        response = self.client.get('/books/')
+        self.assertIn('content', response.context['page_obj'][0].get_deferred_fields())
+        response = self.client.get(f'/books/{book.id}/')
+        detail = response.context['book']
+        self.assertIn('content', detail.get_deferred_fields())
+        self.assertEqual(detail.content_preview, self.text[:1000])
@@ -8,4 +8,5 @@ urlpatterns = [
     path('search/', views.book_search, name='book_search'),
     path('accessibility/', views.book_by_accessibility, name='book_by_accessibility'),
     path('<int:book_id>/', views.book_detail, name='book_detail'),
+    path('<int:book_id>/read/', views.book_reader, name='book_reader'),
 ]
\ No newline at end of file
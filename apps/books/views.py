@@ -1,33 +1,84 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.http import Http404
 from django.core.paginator import Paginator
-from django.db.models import Q
+from django.db.models import Max, Count
+from django.db.models.functions import Substr
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.contrib.contenttypes.models import ContentType
+from main.conditional import conditional_page, latest
+from main.search import search_queryset, uses_postgres_search
+from main.sorting import SortOption, SortRegistry
+from main.trending import get_trending_computed_at, record_activity, trending
 from .models import Book
-from apps.reviews.services import get_average_rating, get_review_count, get_reviews_for, add_review, delete_review, toggle_favorite, is_favorited
-
+from .services import ensure_chunk_offsets, get_book_chunk
+from apps.reviews.ranking import get_ranking_computed_at, order_by_rating, top_rated
+from apps.reviews.services import get_object_rating, get_reviews_page, get_user_review_for_object, add_review, delete_review, toggle_favorite, is_favorited, is_favorite, get_rating_last_updated, attach_user_state, attach_ratings, get_user_favorites_state
+
+# Сортировки списков книг (?sort=); индексы - в Book.Meta.indexes
+BOOK_SORTS = SortRegistry({
+    'new': SortOption('Новые', ('-created_at', '-id')),
+    'popular': SortOption('Популярные', ('-likes_count', '-id')),
+    'title': SortOption('По названию', ('title', 'id')),
+    'rating': SortOption('По рейтингу', prepare=order_by_rating),
+}, default='new')
+BOOKS_PER_PAGE = 6  # книг на странице списка
+
+
+def books_last_modified(request, **kwargs):
+    """Последнее изменение списков книг: книги, их рейтинги и отметки избранного пользователя"""
+    content_type = ContentType.objects.get_for_model(Book)
+    stats = Book.objects.aggregate(latest=Max('updated_at'), count=Count('id'))
+    ratings_updated = get_rating_last_updated(content_type)
+    computed_at = latest(get_ranking_computed_at(content_type), get_trending_computed_at(content_type))
+    return latest(stats['latest'], ratings_updated, computed_at), (stats['count'], get_user_favorites_state(request.user, content_type))
+
+
+def book_last_modified(request, book_id):
+    """Последнее изменение страницы книги: книга, отзывы, избранное"""
+    updated_at = Book.objects.filter(id=book_id).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None
+    content_type = ContentType.objects.get_for_model(Book)
+    favorite = request.user.is_authenticated and is_favorite(request.user, content_type, book_id)
+    return latest(updated_at, get_rating_last_updated(content_type, book_id)), favorite
+
+
+@conditional_page(books_last_modified)
 def book_list(request):
     """Список всех книг с пагинацией"""
-    book_list = Book.objects.all()
-    paginator = Paginator(book_list, 6)  # 6 книг на страницу
+    book_list, sort = BOOK_SORTS.apply(Book.objects.all(), request.GET.get('sort'))
+    paginator = Paginator(book_list, BOOKS_PER_PAGE)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
-    return render(request, 'books/book_list.html', {'page_obj': page_obj})
+    # Значки «ваша оценка», «в избранном» и рейтинги карточек - три запроса на страницу
+    page_obj.object_list = attach_ratings(attach_user_state(request.user, page_obj.object_list))
+    return render(request, 'books/book_list.html', {
+        'page_obj': page_obj,
+        'sort_options': BOOK_SORTS.choices(),
+        'current_sort': sort,
+        'top_rated': top_rated('book', 5),
+        'trending_books': trending(Book, 5),
+    })
 
+def count_book_view(request, book_id):
+    """Учитывает просмотр книги в «популярном»"""
+    record_activity(Book, book_id, 'views')
+
+@conditional_page(book_last_modified, on_not_modified=count_book_view)
 def book_detail(request, book_id):
     """Страница одной книги с возможностью оценки, комментариев и добавления в избранное"""
-    book = get_object_or_404(Book, id=book_id)
-    reviews = get_reviews_for('book', book.id)
-    average_rating = get_average_rating('book', book.id) or 0
-    review_count = get_review_count('book', book.id)
+    # Полный текст не загружаем - только начало для превью
+    book = get_object_or_404(Book.objects.annotate(content_preview=Substr('content', 1, 1000)), id=book_id)
+    if request.method == 'GET':
+        count_book_view(request, book.id)
+    content_type = ContentType.objects.get_for_model(Book)
     user_review = None
     is_favorite = False
 
     if request.user.is_authenticated:
         # Получаем отзыв пользователя для этой книги
-        user_reviews = reviews.filter(user=request.user)
-        if user_reviews.exists():
-            user_review = user_reviews.first()
+        user_review = get_user_review_for_object(request.user, content_type, book.id)
         is_favorite = is_favorited(request.user, book)
 
     if request.method == 'POST':
@@ -62,27 +113,47 @@ def book_detail(request, book_id):
                 messages.success(request, 'Книга удалена из избранного.')
         return redirect('books:book_detail', book_id=book.id)
 
+    # Первая страница отзывов или следующая (?reviews_cursor=) - для ссылки «Показать еще» без JavaScript
+    try:
+        reviews, reviews_cursor = get_reviews_page(content_type, book.id, request.GET.get('reviews_cursor'))
+    except ValueError:
+        raise Http404('Некорректный курсор отзывов')
+    rating = get_object_rating(book)
+
     context = {
         'book': book,
         'reviews': reviews,
-        'average_rating': round(average_rating, 1),
-        'review_count': review_count,
+        'reviews_cursor': reviews_cursor,
+        'rating': rating,
+        'average_rating': round(rating.average_rating, 1),
+        'review_count': rating.review_count,
         'user_review': user_review,
         'is_favorite': is_favorite,
     }
     return render(request, 'books/book_detail.html', context)
 
+@conditional_page(book_last_modified)
+def book_reader(request, book_id):
+    """Постраничное чтение книги фрагментами фиксированного размера"""
+    book = get_object_or_404(Book, id=book_id)
+    ensure_chunk_offsets(book)
+    paginator = Paginator(range(book.chunk_count), 1)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    chunk = get_book_chunk(book, page_obj.number) if paginator.count else ''
+    return render(request, 'books/book_reader.html', {
+        'book': book,
+        'page_obj': page_obj,
+        'chunk': chunk,
+    })
+
+@conditional_page(books_last_modified)
 def book_search(request):
     """Поиск книг по различным критериям"""
     query = request.GET.get('q', '')
     books = Book.objects.all()
 
     if query:
-        books = books.filter(
-            Q(title__icontains=query) |
-            Q(author__icontains=query) |
-            Q(tags__icontains=query)
-        )
+        books = search_queryset(books, query)
 
     # Фильтрация по доступности
     has_subtitles = request.GET.get('has_subtitles')
@@ -103,18 +174,34 @@ def book_search(request):
     elif has_audio_description == 'false':
         books = books.filter(has_audio_description=False)
 
+    # Результаты поиска на PostgreSQL без явной сортировки - по релевантности
+    sort = ''
+    if request.GET.get('sort') or not (query and uses_postgres_search()):
+        books, sort = BOOK_SORTS.apply(books, request.GET.get('sort'))
+
     paginator = Paginator(books, 6)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    page_obj.object_list = attach_ratings(attach_user_state(request.user, page_obj.object_list))
+
+    # Лучшие книги с выбранными возможностями доступности
+    required_flags = [flag for flag, value in [
+        ('has_subtitles', has_subtitles), ('has_sign_language', has_sign_language),
+        ('has_audio_description', has_audio_description),
+    ] if value == 'true']
 
     return render(request, 'books/book_list.html', {
         'page_obj': page_obj,
+        'sort_options': BOOK_SORTS.choices(),
+        'current_sort': sort,
+        'top_rated': top_rated('book', 5, required_flags),
         'query': query,
         'has_subtitles': has_subtitles,
         'has_sign_language': has_sign_language,
         'has_audio_description': has_audio_description,
     })
 
+@conditional_page(books_last_modified)
 def book_by_accessibility(request):
     """Фильтрация книг по типам доступности"""
     books = Book.objects.all()
@@ -138,12 +225,24 @@ def book_by_accessibility(request):
     elif has_audio_description == 'false':
         books = books.filter(has_audio_description=False)
 
+    books, sort = BOOK_SORTS.apply(books, request.GET.get('sort'))
+
     paginator = Paginator(books, 6)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    page_obj.object_list = attach_ratings(attach_user_state(request.user, page_obj.object_list))
+
+    # Лучшие книги с выбранными возможностями доступности
+    required_flags = [flag for flag, value in [
+        ('has_subtitles', has_subtitles), ('has_sign_language', has_sign_language),
+        ('has_audio_description', has_audio_description),
+    ] if value == 'true']
 
     return render(request, 'books/book_list.html', {
         'page_obj': page_obj,
+        'sort_options': BOOK_SORTS.choices(),
+        'current_sort': sort,
+        'top_rated': top_rated('book', 5, required_flags),
         'has_subtitles': has_subtitles,
         'has_sign_language': has_sign_language,
         'has_audio_description': has_audio_description,
@@ -0,0 +1,39 @@
+# Generated by Django 6.0.2 on 2026-10-19 12:05
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_likes_count(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Favorite = apps.get_model('reviews', 'Favorite')
+    Course = apps.get_model('education', 'Course')
+    content_type = ContentType.objects.filter(app_label='education', model='course').first()
+    if content_type is None:
+        return
+    counts = Favorite.objects.filter(
+        content_type=content_type, object_id=OuterRef('pk')
+    ).values('object_id').annotate(count=Count('id')).values('count')
+    Course.objects.update(likes_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0003_favorite_user_created_index'),
+        ('education', '0004_delete_review'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='likes_count',
+            field=models.IntegerField(default=0, verbose_name='Лайки'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['-likes_count'], name='course_likes_idx'),
+        ),
+        migrations.RunPython(fill_likes_count, migrations.RunPython.noop),
+    ]
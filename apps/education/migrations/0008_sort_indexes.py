@@ -0,0 +1,41 @@
+# Generated by Django 6.0.2 on 2026-10-19 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('education', '0007_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='course',
+            name='course_likes_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='course',
+            name='course_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='course',
+            name='course_level_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['-created_at', '-id'], name='course_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['level', '-created_at', '-id'], name='course_level_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['-likes_count', '-id'], name='course_likes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['title', 'id'], name='course_title_idx'),
+        ),
+    ]
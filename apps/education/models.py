@@ -1,4 +1,5 @@
 from django.db import models
+from django.urls import reverse
 from django.contrib.contenttypes.fields import GenericRelation
 
 
@@ -8,6 +9,7 @@ class Course(models.Model):
     description = models.TextField('Описание курса')
     duration_hours = models.IntegerField('Продолжительность (часы)')
     created_at = models.DateTimeField('Дата добавления', auto_now_add=True)
+    updated_at = models.DateTimeField('Дата обновления', auto_now=True)
 
     # Поля доступности
     has_subtitles = models.BooleanField('Есть субтитры', default=True)
@@ -30,18 +32,33 @@ class Course(models.Model):
     ]
     level = models.CharField('Уровень', max_length=20, choices=LEVEL_CHOICES, default='beginner')
 
+    # Сколько раз добавлен в избранное (обновляется в reviews.services)
+    likes_count = models.IntegerField('Лайки', default=0)
+
     # Связь с общей системой отзывов
     reviews = GenericRelation('reviews.Review', content_type_field='content_type', object_id_field='object_id')
     favorites = GenericRelation('reviews.Favorite', content_type_field='content_type', object_id_field='object_id')
+    # Позиции в рейтинге по оценкам (сортировка ?sort=rating)
+    rating_ranks = GenericRelation('reviews.RatingRank', content_type_field='content_type', object_id_field='object_id')
 
     class Meta:
         verbose_name = 'Курс'
         verbose_name_plural = 'Курсы'
         ordering = ['-created_at']
+        indexes = [
+            # Сортировки списка (views.COURSE_SORTS) и фильтр по уровню: поле и id для одинаковых значений
+            models.Index(fields=['-created_at', '-id'], name='course_created_idx'),
+            models.Index(fields=['level', '-created_at', '-id'], name='course_level_created_idx'),
+            models.Index(fields=['-likes_count', '-id'], name='course_likes_idx'),
+            models.Index(fields=['title', 'id'], name='course_title_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def get_absolute_url(self):
+        return reverse('education:course_detail', args=[self.id])
+
     def get_tags_list(self):
         """Возвращает список тегов"""
         if self.tags:
@@ -50,15 +67,15 @@ class Course(models.Model):
 
     @property
     def average_rating(self):
-        """Средний рейтинг из общей системы"""
-        from apps.reviews.services import get_average_rating
-        return get_average_rating('course', self.id)
+        """Средний рейтинг из общей системы (в списках загружается attach_ratings)"""
+        from apps.reviews.services import get_object_rating
+        return get_object_rating(self).average_rating
 
     @property
     def review_count(self):
         """Количество отзывов из общей системы"""
-        from apps.reviews.services import get_review_count
-        return get_review_count('course', self.id)
+        from apps.reviews.services import get_object_rating
+        return get_object_rating(self).review_count
 
     def get_reviews(self):
         """Получить все отзывы для этого курса"""
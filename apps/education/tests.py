@@ -1,3 +1,57 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from apps.reviews.services import add_review, set_favorite
+from main.testing import QueryBudgetMixin
+from .models import Course
+
+
+class CourseQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Число запросов страниц курсов не зависит от числа курсов и отзывов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', password='pass')
+
+    def seed_courses(self, count):
+        for number in range(count):
+            course = Course.objects.create(
+                title=f'Курс {Course.objects.count()}', instructor='Преподаватель',
+                description='Описание курса', duration_hours=10, tags='python, основы',
+            )
+            add_review(self.user, course, 5, 'Полезный курс')
+            set_favorite(self.user, course, True)
+
+    def test_course_list(self):
+        self.assertConstantQueries('/education/', self.seed_courses, budget=8)
+
+    def test_course_list_authenticated(self):
+        self.client.force_login(self.user)
+        self.assertConstantQueries('/education/?level=beginner', self.seed_courses, budget=14)
+
+    def test_course_detail_reviews(self):
+        course = Course.objects.create(
+            title='Django', instructor='Преподаватель', description='Описание', duration_hours=20, tags='python',
+        )
+
+        def seed_reviews(count):
+            for number in range(count):
+                user = User.objects.create_user(f'student{User.objects.count()}')
+                add_review(user, course, 4, 'Отзыв')
+            # Рекомендации - курсы с теми же тегами
+            self.seed_courses(count)
+
+        self.assertConstantQueries(f'/education/{course.id}/', seed_reviews, budget=14)
+
+
+class CourseConditionalTests(TestCase):
+    def test_edit_invalidates_etag(self):
+        course = Course.objects.create(title='Python', instructor='Преподаватель', description='Описание', duration_hours=10)
+        for url in (f'/education/{course.id}/', '/education/'):
+            # Первый просмотр создает CachedRating объекта
+            self.client.get(url)
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            course.description = f'Новое описание {url}'
+            course.save()
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
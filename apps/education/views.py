@@ -1,58 +1,111 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.http import Http404
 from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Max, Count
+from main.conditional import conditional_page, latest
+from main.sorting import SortOption, SortRegistry
+from main.trending import record_activity
 from .models import Course
-from apps.reviews.services import get_average_rating, get_review_count, get_reviews_for, add_review, toggle_favorite, is_favorited
+from apps.reviews.ranking import get_ranking_computed_at, order_by_rating, top_rated
+from apps.reviews.services import get_object_rating, get_reviews_page, get_user_review_for_object, add_review, toggle_favorite, is_favorited, is_favorite, get_rating_last_updated, attach_user_state, attach_ratings, get_user_favorites_state
 
+# Сортировки списка курсов (?sort=); индексы - в Course.Meta.indexes
+COURSE_SORTS = SortRegistry({
+    'new': SortOption('Новые', ('-created_at', '-id')),
+    'popular': SortOption('Популярные', ('-likes_count', '-id')),
+    'title': SortOption('По названию', ('title', 'id')),
+    'rating': SortOption('По рейтингу', prepare=order_by_rating),
+}, default='new')
+# Курсов на странице списка и страницы уровня
+COURSES_PER_PAGE = 9
+COURSES_BY_LEVEL_PER_PAGE = 12
+LEVELS = ('beginner', 'intermediate', 'advanced')
 
-def course_list(request):
-    """Список всех курсов с фильтрацией по уровню и доступности"""
+
+def courses_last_modified(request, **kwargs):
+    """Последнее изменение списков курсов: курсы, их рейтинги и отметки избранного пользователя"""
+    content_type = ContentType.objects.get_for_model(Course)
+    stats = Course.objects.aggregate(latest=Max('updated_at'), count=Count('id'))
+    ratings_updated = get_rating_last_updated(content_type)
+    return latest(stats['latest'], ratings_updated, get_ranking_computed_at(content_type)), (stats['count'], get_user_favorites_state(request.user, content_type))
+
+
+def course_last_modified(request, course_id):
+    """Последнее изменение страницы курса: курс, отзывы, избранное, рекомендации"""
+    updated_at = Course.objects.filter(id=course_id).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None
+    content_type = ContentType.objects.get_for_model(Course)
+    courses = Course.objects.aggregate(latest=Max('updated_at'), count=Count('id'))
+    favorite = request.user.is_authenticated and is_favorite(request.user, content_type, course_id)
+    return (
+        latest(updated_at, courses['latest'], get_rating_last_updated(content_type, course_id)),
+        (courses['count'], favorite),
+    )
+
+
+def course_list_queryset(level=None, required_flags=()):
+    """Курсы списка до сортировки: фильтры по уровню и доступности (представление и index_audit)"""
     courses = Course.objects.all()
+    if level in LEVELS:
+        courses = courses.filter(level=level)
+    return courses.filter(**{flag: True for flag in required_flags})
 
-    # Фильтрация по уровню
+
+@conditional_page(courses_last_modified)
+def course_list(request):
+    """Список всех курсов с фильтрацией по уровню и доступности"""
     level = request.GET.get('level')
-    if level in ['beginner', 'intermediate', 'advanced']:
-        courses = courses.filter(level=level)
+    required_flags = [
+        flag for flag in ('has_subtitles', 'has_sign_language', 'has_audio_description', 'has_transcript')
+        if request.GET.get(flag) == 'on'
+    ]
+    courses = course_list_queryset(level, required_flags)
 
-    # Фильтрация по доступности
-    if request.GET.get('has_subtitles') == 'on':
-        courses = courses.filter(has_subtitles=True)
-    if request.GET.get('has_sign_language') == 'on':
-        courses = courses.filter(has_sign_language=True)
-    if request.GET.get('has_audio_description') == 'on':
-        courses = courses.filter(has_audio_description=True)
-    if request.GET.get('has_transcript') == 'on':
-        courses = courses.filter(has_transcript=True)
+    # Сортировка по рейтингу показывает только оцененные курсы, всего - без нее
+    total_courses = courses.count()
+    courses, sort = COURSE_SORTS.apply(courses, request.GET.get('sort'))
 
     # Пагинация
-    paginator = Paginator(courses, 9)  # 9 курсов на странице
+    paginator = Paginator(courses, COURSES_PER_PAGE)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    # Значки «ваша оценка», «в избранном» и рейтинги карточек - три запроса на страницу
+    page_obj.object_list = attach_ratings(attach_user_state(request.user, page_obj.object_list))
 
     context = {
         'page_obj': page_obj,
         'level_filter': level,
-        'total_courses': courses.count(),
+        'sort_options': COURSE_SORTS.choices(),
+        'current_sort': sort,
+        'total_courses': total_courses,
+        'top_rated': top_rated('course', 5, required_flags),
     }
     return render(request, 'education/list.html', context)
 
 
+def count_course_view(request, course_id):
+    """Учитывает просмотр курса в «популярном»"""
+    record_activity(Course, course_id, 'views')
+
+
+@conditional_page(course_last_modified, on_not_modified=count_course_view)
 def course_detail(request, course_id):
     """Страница одного курса с возможностью оценки, комментариев и добавления в избранное"""
     course = get_object_or_404(Course, id=course_id)
+    if request.method == 'GET':
+        count_course_view(request, course.id)
     recommendations = Course.objects.exclude(id=course_id).filter(tags__icontains=course.tags)[:3]
-    reviews = get_reviews_for('course', course.id)
-    average_rating = get_average_rating('course', course.id) or 0
-    review_count = get_review_count('course', course.id)
+    content_type = ContentType.objects.get_for_model(Course)
     user_review = None
     is_favorite = False
 
     if request.user.is_authenticated:
         # Получаем отзыв пользователя для этого курса
-        user_reviews = reviews.filter(user=request.user)
-        if user_reviews.exists():
-            user_review = user_reviews.first()
+        user_review = get_user_review_for_object(request.user, content_type, course.id)
         is_favorite = is_favorited(request.user, course)
 
     if request.method == 'POST':
@@ -87,26 +140,36 @@ def course_detail(request, course_id):
                 messages.success(request, 'Курс удалён из избранного.')
         return redirect('education:course_detail', course_id=course.id)
 
+    # Первая страница отзывов или следующая (?reviews_cursor=) - для ссылки «Показать еще» без JavaScript
+    try:
+        reviews, reviews_cursor = get_reviews_page(content_type, course.id, request.GET.get('reviews_cursor'))
+    except ValueError:
+        raise Http404('Некорректный курсор отзывов')
+    rating = get_object_rating(course)
+
     context = {
         'course': course,
         'recommendations': recommendations,
         'reviews': reviews,
-        'average_rating': round(average_rating, 1),
-        'review_count': review_count,
+        'reviews_cursor': reviews_cursor,
+        'rating': rating,
+        'average_rating': round(rating.average_rating, 1),
+        'review_count': rating.review_count,
         'user_review': user_review,
         'is_favorite': is_favorite,
     }
     return render(request, 'education/detail.html', context)
 
 
+@conditional_page(courses_last_modified)
 def course_by_level(request, level):
     """Курсы по уровню сложности"""
-    if level not in ['beginner', 'intermediate', 'advanced']:
+    if level not in LEVELS:
         level = 'beginner'
-    courses = Course.objects.filter(level=level)
-    paginator = Paginator(courses, 12)
+    paginator = Paginator(course_list_queryset(level), COURSES_BY_LEVEL_PER_PAGE)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
+    page_obj.object_list = attach_ratings(attach_user_state(request.user, page_obj.object_list))
     context = {
         'page_obj': page_obj,
         'level': level,
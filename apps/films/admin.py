@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
+from main.thumbnails import thumbnail_url
 from .models import Genre, Country, Actor, Director, Film, VideoSource, Episode, FilmRating, FilmReview, FilmCollection
 
 @admin.register(Genre)
@@ -30,7 +31,7 @@ class ActorAdmin(admin.ModelAdmin):
     
     def photo_preview(self, obj):
         if obj.photo:
-            return format_html('<img src="{}" style="width: 50px; height: 50px; object-fit: cover; border-radius: 4px;" />', obj.photo.url)
+            return format_html('<img src="{}" style="width: 50px; height: 50px; object-fit: cover; border-radius: 4px;" />', thumbnail_url(obj.photo, 100))
         return "Нет фото"
     photo_preview.short_description = 'Фото'
 
@@ -41,7 +42,7 @@ class DirectorAdmin(admin.ModelAdmin):
     
     def photo_preview(self, obj):
         if obj.photo:
-            return format_html('<img src="{}" style="width: 50px; height: 50px; object-fit: cover; border-radius: 4px;" />', obj.photo.url)
+            return format_html('<img src="{}" style="width: 50px; height: 50px; object-fit: cover; border-radius: 4px;" />', thumbnail_url(obj.photo, 100))
         return "Нет фото"
     photo_preview.short_description = 'Фото'
 
@@ -117,13 +118,13 @@ class FilmAdmin(admin.ModelAdmin):
     
     def poster_preview(self, obj):
         if obj.poster:
-            return format_html('<img src="{}" style="width: 50px; height: 75px; object-fit: cover; border-radius: 4px;" />', obj.poster.url)
+            return format_html('<img src="{}" style="width: 50px; height: 75px; object-fit: cover; border-radius: 4px;" />', thumbnail_url(obj.poster, 100))
         return "Нет постера"
     poster_preview.short_description = 'Постер'
     
     def backdrop_preview(self, obj):
         if obj.backdrop:
-            return format_html('<img src="{}" style="width: 100px; height: 56px; object-fit: cover; border-radius: 4px;" />', obj.backdrop.url)
+            return format_html('<img src="{}" style="width: 100px; height: 56px; object-fit: cover; border-radius: 4px;" />', thumbnail_url(obj.backdrop, 200))
         return "Нет фона"
     backdrop_preview.short_description = 'Фон'
 
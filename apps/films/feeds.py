@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+
+from main.cache import cache_page_anonymous
+from .models import Film
+
+
+class LatestFilmsFeed(Feed):
+    """Atom-лента новых фильмов (/films/feed/)"""
+    feed_type = Atom1Feed
+    title = 'Новые фильмы'
+    subtitle = 'Фильмы и сериалы, добавленные в каталог'
+
+    def link(self):
+        return reverse('films:list')
+
+    def items(self):
+        # По индексу film_created_idx; полное описание не загружается
+        limit = getattr(settings, 'FEED_ITEMS', 30)
+        return Film.objects.only('title', 'slug', 'short_description', 'year', 'created_at', 'updated_at').order_by(
+            '-created_at', '-id',
+        )[:limit]
+
+    def item_title(self, item):
+        return f'{item.title} ({item.year})' if item.year else item.title
+
+    def item_description(self, item):
+        return item.short_description
+
+    def item_pubdate(self, item):
+        return item.created_at
+
+    def item_updateddate(self, item):
+        return item.updated_at
+
+
+latest_films_feed = LatestFilmsFeed()
+
+
+@cache_page_anonymous('film')
+def films_feed(request):
+    return latest_films_feed(request)
@@ -0,0 +1,34 @@
+# Generated by Django 6.0.2 on 2026-10-19 12:05
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_likes_count(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Favorite = apps.get_model('reviews', 'Favorite')
+    Film = apps.get_model('films', 'Film')
+    content_type = ContentType.objects.filter(app_label='films', model='film').first()
+    if content_type is None:
+        return
+    counts = Favorite.objects.filter(
+        content_type=content_type, object_id=OuterRef('pk')
+    ).values('object_id').annotate(count=Count('id')).values('count')
+    Film.objects.update(likes_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0003_favorite_user_created_index'),
+        ('films', '0003_alter_videosource_options_videosource_created_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['-likes_count'], name='film_likes_idx'),
+        ),
+        migrations.RunPython(fill_likes_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 6.0.2 on 2026-10-19 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('films', '0006_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='film',
+            name='films_film_title_72d7db_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='film',
+            name='films_film_year_30d277_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='film',
+            name='film_likes_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='film',
+            name='film_views_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='film',
+            name='film_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['-created_at', '-id'], name='film_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['-views_count', '-id'], name='film_views_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['-likes_count', '-id'], name='film_likes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['-year', '-id'], name='film_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['title', 'id'], name='film_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(condition=models.Q(('imdb_rating__isnull', False)), fields=['-imdb_rating', '-id'], name='film_imdb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(condition=models.Q(('kinopoisk_rating__isnull', False)), fields=['-kinopoisk_rating', '-id'], name='film_kinopoisk_idx'),
+        ),
+    ]
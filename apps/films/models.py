@@ -2,6 +2,8 @@ from django.db import models
 from django.urls import reverse
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.fields import GenericRelation
+from main import thumbnails
 
 class Genre(models.Model):
     """Жанры фильмов"""
@@ -117,6 +119,9 @@ class Film(models.Model):
     views_count = models.IntegerField('Просмотры', default=0)
     likes_count = models.IntegerField('Лайки', default=0)
     
+    # Позиции в рейтинге по оценкам (сортировка ?sort=rating)
+    rating_ranks = GenericRelation('reviews.RatingRank', content_type_field='content_type', object_id_field='object_id')
+    
     created_at = models.DateTimeField('Добавлено', auto_now_add=True)
     updated_at = models.DateTimeField('Обновлено', auto_now=True)
     
@@ -125,9 +130,18 @@ class Film(models.Model):
         verbose_name_plural = 'Фильмы'
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['title']),
-            models.Index(fields=['year']),
             models.Index(fields=['content_type']),
+            # Сортировки списка (views.FILM_SORTS): поле и id для одинаковых значений
+            models.Index(fields=['-created_at', '-id'], name='film_created_idx'),
+            models.Index(fields=['-views_count', '-id'], name='film_views_idx'),
+            models.Index(fields=['-likes_count', '-id'], name='film_likes_idx'),
+            models.Index(fields=['-year', '-id'], name='film_year_idx'),
+            models.Index(fields=['title', 'id'], name='film_title_idx'),
+            # Сортировки по рейтингам показывают только фильмы с рейтингом
+            models.Index(fields=['-imdb_rating', '-id'], condition=models.Q(imdb_rating__isnull=False),
+                         name='film_imdb_idx'),
+            models.Index(fields=['-kinopoisk_rating', '-id'], condition=models.Q(kinopoisk_rating__isnull=False),
+                         name='film_kinopoisk_idx'),
         ]
     
     def __str__(self):
@@ -215,10 +229,14 @@ class VideoSource(models.Model):
             return f'<iframe src="https://vkvideo.ru/video_ext.php?oid={owner}&id={self.vk_id}&hash=3ac5b93799aaa07d" width="100%" height="100%" frameborder="0" allowfullscreen="1" allow="autoplay; encrypted-media; fullscreen; picture-in-picture"></iframe>'
         
         if self.platform == 'local' and self.video_file:
-            return f'<video width="100%" height="100%" controls><source src="{self.video_file.url}" type="video/mp4">Ваш браузер не поддерживает видео.</video>'
+            return f'<video width="100%" height="100%" controls><source src="{self.get_stream_url()}" type="video/mp4">Ваш браузер не поддерживает видео.</video>'
         
         return '<p>Видео временно недоступно</p>'
     
+    def get_stream_url(self):
+        """URL потоковой отдачи локального файла (с поддержкой Range)"""
+        return reverse('films:video_stream', args=[self.id])
+
     def get_thumbnail(self):
         """Получить миниатюру для видео"""
         # Здесь можно добавить логику для получения превью
@@ -289,4 +307,11 @@ class FilmCollection(models.Model):
         verbose_name_plural = 'Подборки'
     
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+
+# Миниатюры для постеров, фонов, фото и обложек подборок
+thumbnails.register(Actor, 'photo')
+thumbnails.register(Director, 'photo')
+thumbnails.register(Film, 'poster', 'backdrop')
+thumbnails.register(FilmCollection, 'image')
@@ -0,0 +1,172 @@
+# apps/films/streaming.py
+import io
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """
+    Файловый объект, ограниченный диапазоном байт [start, stop).
+
+    FileResponse вычисляет Content-Length через seek/tell, а WSGI-серверы
+    с wsgi.file_wrapper (gunicorn и др.) отдают его через os.sendfile,
+    начиная с текущей позиции дескриптора, без копирования в Python.
+    """
+
+    def __init__(self, file, start, length):
+        self._file = file
+        self.name = getattr(file, 'name', '')
+        self.start = start
+        self.stop = start + length
+        self._file.seek(start)
+
+    def read(self, size=-1):
+        remaining = self.stop - self._file.tell()
+        if remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        return self._file.read(size)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_END:
+            position = self.stop + offset
+        elif whence == io.SEEK_CUR:
+            position = self._file.tell() + offset
+        else:
+            position = offset
+        return self._file.seek(min(max(position, self.start), self.stop))
+
+    def tell(self):
+        return self._file.tell()
+
+    def seekable(self):
+        return True
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        self._file.close()
+
+
+def parse_range(header, size):
+    """
+    Разбирает заголовок Range для одного диапазона.
+
+    Возвращает (start, end) включительно, None если заголовок нужно
+    проигнорировать (нет, несколько диапазонов, синтаксическая ошибка),
+    или False если диапазон невыполним (ответ 416).
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-500: последние 500 байт
+        suffix = int(last)
+        if suffix == 0:
+            return False
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    if start >= size:
+        return False
+    end = int(last) if last else size - 1
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def file_validators(stat):
+    """ETag и Last-Modified по размеру и времени изменения файла"""
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    return etag, int(stat.st_mtime)
+
+
+def if_range_matches(request, etag, last_modified):
+    """Проверяет If-Range: диапазон отдается только для неизмененного файла"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def serve_file(request, field_file, content_type=None):
+    """
+    Отдает файл из FileField с поддержкой Range/206 и условных запросов.
+
+    Режим задается settings.MEDIA_STREAMING_MODE:
+      'python'     - FileResponse (os.sendfile через wsgi.file_wrapper);
+      'x-accel'    - X-Accel-Redirect для nginx;
+      'x-sendfile' - X-Sendfile для Apache/lighttpd.
+    В режимах фронтенд-сервера диапазоны обрабатывает сам сервер.
+    """
+    path = field_file.path
+    stat = os.stat(path)
+    etag, last_modified = file_validators(stat)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    if content_type is None:
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    mode = getattr(settings, 'MEDIA_STREAMING_MODE', 'python')
+    if mode == 'x-accel':
+        prefix = getattr(settings, 'MEDIA_STREAMING_ACCEL_PREFIX', '/protected-media/')
+        response = HttpResponse(content_type=content_type)
+        # Путь в URL-кодировке: иначе Django закодирует не-ASCII имя по RFC 2047,
+        # и сервер не найдет файл; nginx и mod_xsendfile декодируют путь сами
+        response['X-Accel-Redirect'] = quote(prefix.rstrip('/') + '/' + field_file.name.lstrip('/'))
+    elif mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = quote(path)
+    else:
+        response = _python_response(request, path, stat.st_size, content_type, etag, last_modified)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def _python_response(request, path, size, content_type, etag, last_modified):
+    """Ответ средствами Django: целый файл (200) или его диапазон (206)"""
+    byte_range = None
+    if if_range_matches(request, etag, last_modified):
+        byte_range = parse_range(request.headers.get('Range'), size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range is None:
+        return FileResponse(open(path, 'rb'), content_type=content_type)
+
+    start, end = byte_range
+    response = FileResponse(
+        RangeFile(open(path, 'rb'), start, end - start + 1),
+        content_type=content_type,
+        status=206,
+    )
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
@@ -0,0 +1,133 @@
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils.http import http_date
+
+from main.testing import QueryBudgetMixin
+from .models import Actor, Country, Director, Film, FilmCollection, Genre, VideoSource
+from .streaming import parse_range
+
+
+class FilmQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Число запросов страниц фильмов не зависит от числа фильмов, подборок и актеров"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.genre = Genre.objects.create(name='Драма', slug='drama')
+
+    def create_film(self):
+        number = Film.objects.count()
+        film = Film.objects.create(title=f'Фильм {number}', slug=f'film-{number}', description='Описание', year=2020)
+        film.genres.add(self.genre)
+        return film
+
+    def seed_films(self, count):
+        for number in range(count):
+            film = self.create_film()
+            collection = FilmCollection.objects.create(title=f'Подборка {number}', slug=f'collection-{film.slug}')
+            collection.films.add(film)
+
+    def test_film_list(self):
+        self.assertConstantQueries('/films/', self.seed_films, budget=13)
+
+    def test_film_detail(self):
+        film = self.create_film()
+
+        def seed_related(count):
+            for number in range(count):
+                number = Actor.objects.count()
+                film.actors.add(Actor.objects.create(name=f'Актер {number}'))
+                film.directors.add(Director.objects.create(name=f'Режиссер {number}'))
+                film.countries.add(Country.objects.create(name=f'Страна {number}'))
+                VideoSource.objects.create(film=film, platform='youtube', youtube_id=f'id{number}')
+                # Похожие фильмы - того же жанра
+                self.create_film()
+
+        self.assertConstantQueries(f'/films/{film.slug}/', seed_related, budget=14)
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_ranges(self):
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_range('bytes=900-', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-5000', 1000), (0, 999))
+        self.assertEqual(parse_range('bytes=500-5000', 1000), (500, 999))
+
+    def test_ignored(self):
+        # Несколько диапазонов и ошибки синтаксиса - весь файл
+        for header in (None, '', 'bytes=0-1,5-9', 'bytes=-', 'items=0-9', 'bytes=9-1', 'bytes=a-b'):
+            self.assertIsNone(parse_range(header, 1000), header)
+
+    def test_unsatisfiable(self):
+        self.assertIs(parse_range('bytes=1000-', 1000), False)
+        self.assertIs(parse_range('bytes=-0', 1000), False)
+
+
+class VideoStreamTests(TestCase):
+    content = bytes(range(256)) * 4
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.media_root)
+        cls.enterClassContext(override_settings(MEDIA_ROOT=cls.media_root))
+        os.makedirs(os.path.join(cls.media_root, 'films', 'videos'))
+        with open(os.path.join(cls.media_root, 'films', 'videos', 'клип 1.mp4'), 'wb') as file:
+            file.write(cls.content)
+
+    @classmethod
+    def setUpTestData(cls):
+        film = Film.objects.create(title='Фильм', slug='film')
+        video = VideoSource.objects.create(film=film, platform='local', video_file='films/videos/клип 1.mp4')
+        cls.url = f'/films/video/{video.id}/'
+
+    def test_full_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Length'], '1024')
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_partial_content(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 100-199/1024')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-24')
+        self.assertEqual(response['Content-Range'], 'bytes 1000-1023/1024')
+        self.assertEqual(b''.join(response.streaming_content), self.content[1000:])
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_if_range(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        # Файл изменился с тех пор, как клиент получил начало - весь файл заново
+        for validator in ('"stale"', http_date(0)):
+            response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=validator)
+            self.assertEqual(response.status_code, 200, validator)
+            self.assertEqual(response['Content-Length'], '1024')
+
+    def test_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_front_end_server_paths_are_quoted(self):
+        with override_settings(MEDIA_STREAMING_MODE='x-accel'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/films/videos/%D0%BA%D0%BB%D0%B8%D0%BF%201.mp4')
+        with override_settings(MEDIA_STREAMING_MODE='x-sendfile'):
+            response = self.client.get(self.url)
+        self.assertTrue(response['X-Sendfile'].endswith('/films/videos/%D0%BA%D0%BB%D0%B8%D0%BF%201.mp4'))
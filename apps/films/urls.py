@@ -1,11 +1,13 @@
 from django.urls import path
-from . import views
+from . import feeds, views
 
 app_name = 'films'
 
 urlpatterns = [
     path('', views.film_list, name='list'),
     path('search/', views.search, name='search'),
+    path('feed/', feeds.films_feed, name='feed'),
+    path('video/<int:video_id>/', views.video_stream, name='video_stream'),
     path('collection/<slug:slug>/', views.collection_detail, name='collection'),
     path('<slug:slug>/', views.film_detail, name='detail'),
 ]
\ No newline at end of file
@@ -1,43 +1,115 @@
+from functools import partial
+
 from django.shortcuts import render, get_object_or_404
-from django.db.models import Q, Count, Avg
+from django.http import Http404
+from django.db.models import Q, Count, Avg, Max, F
 from django.core.paginator import Paginator
-from .models import Film, Genre, Country, FilmCollection
+from django.contrib.contenttypes.models import ContentType
+from .models import Film, Genre, Country, FilmCollection, VideoSource
+from .streaming import serve_file
+from main.cache import cache_page_anonymous, cache_version, get_timeout
+from main.conditional import conditional_page, latest
+from main.search import search_queryset, uses_postgres_search
+from main.sorting import SortOption, SortRegistry
+from main.trending import get_trending_computed_at, record_activity, trending
+from apps.reviews.ranking import get_ranking_computed_at, order_by_rating, top_rated
+from apps.reviews.services import is_favorite, is_favorited
+
+# Сортировки каталога (?sort=); индексы - в Film.Meta.indexes. Год и рейтинги
+# есть не у всех фильмов: по ним показываются только фильмы со значением
+FILM_SORTS = SortRegistry({
+    'new': SortOption('По дате добавления', ('-created_at', '-id')),
+    'popular': SortOption('По популярности', ('-views_count', '-id')),
+    'likes': SortOption('По количеству лайков', ('-likes_count', '-id')),
+    'rating': SortOption('По оценкам зрителей', prepare=order_by_rating),
+    'imdb': SortOption('По рейтингу IMDb', ('-imdb_rating', '-id'), filter={'imdb_rating__isnull': False}),
+    'kinopoisk': SortOption('По рейтингу Кинопоиска', ('-kinopoisk_rating', '-id'),
+                            filter={'kinopoisk_rating__isnull': False}),
+    'year': SortOption('По году (новые)', ('-year', '-id'), filter={'year__isnull': False}),
+    'year_old': SortOption('По году (старые)', ('year', 'id'), filter={'year__isnull': False}),
+    'title': SortOption('По названию', ('title', 'id')),
+}, default='new', aliases={
+    # Прежние значения ?sort= - имена полей
+    '-created_at': 'new', '-views_count': 'popular', '-likes_count': 'likes',
+    '-year': 'year',
+})
+FILMS_PER_PAGE = 24  # фильмов на странице каталога
+
+
+def films_last_modified(request):
+    """Последнее изменение каталога фильмов и подборок"""
+    films = Film.objects.aggregate(latest=Max('updated_at'), count=Count('id'))
+    collections = FilmCollection.objects.aggregate(latest=Max('created_at'), count=Count('id'))
+    content_type = ContentType.objects.get_for_model(Film)
+    computed_at = latest(get_ranking_computed_at(content_type), get_trending_computed_at(content_type))
+    return latest(films['latest'], collections['latest'], computed_at), (films['count'], collections['count'])
+
+
+def film_last_modified(request, slug):
+    """Последнее изменение страницы фильма: фильм, его видео, избранное"""
+    film = Film.objects.filter(slug=slug).values('id', 'updated_at', 'likes_count').first()
+    if film is None:
+        return None
+    videos = VideoSource.objects.filter(film_id=film['id']).aggregate(latest=Max('created_at'), count=Count('id'))
+    favorite = request.user.is_authenticated and is_favorite(
+        request.user, ContentType.objects.get_for_model(Film), film['id']
+    )
+    return latest(film['updated_at'], videos['latest']), (videos['count'], film['likes_count'], favorite)
+
+
+def count_film_view(request, slug, film_id=None):
+    """Увеличивает счетчик просмотров фильма и учитывает просмотр в «популярном»"""
+    Film.objects.filter(slug=slug).update(views_count=F('views_count') + 1)
+    # При ответе 304 фильм не загружен - только его id
+    if film_id is None:
+        film_id = Film.objects.filter(slug=slug).values_list('id', flat=True).first()
+    if film_id is not None:
+        record_activity(Film, film_id, 'views')
+
+def film_list_queryset(content_type='all', genre_slug=None, year=None):
+    """Фильмы каталога до поиска и сортировки: фильтры по типу, жанру и году (представление и index_audit)"""
+    films = Film.objects.all()
+    if content_type != 'all':
+        films = films.filter(content_type=content_type)
+    if genre_slug:
+        films = films.filter(genres__slug=genre_slug)
+    if year:
+        films = films.filter(year=year)
+    return films
+
+
+def popular_films_fallback():
+    """«Популярные сейчас», пока популярность не рассчитана: по всем просмотрам"""
+    return Film.objects.order_by('-views_count')
 
+
+def latest_films(limit=12):
+    """Новинки на главной каталога"""
+    return Film.objects.order_by('-created_at')[:limit]
+
+
+@conditional_page(films_last_modified, has_counters=True)
+@cache_page_anonymous('film')
 def film_list(request):
     """Главная страница с фильмами"""
     content_type = request.GET.get('type', 'all')
     genre_slug = request.GET.get('genre')
     year = request.GET.get('year')
-    sort = request.GET.get('sort', '-created_at')
     query = request.GET.get('q', '')
     
-    films = Film.objects.all()
+    films = film_list_queryset(content_type, genre_slug, year)
     
     # Поиск
     if query:
-        films = films.filter(
-            Q(title__icontains=query) | 
-            Q(description__icontains=query) |
-            Q(original_title__icontains=query)
-        )
+        films = search_queryset(films, query)
     
-    # Фильтр по типу
-    if content_type != 'all':
-        films = films.filter(content_type=content_type)
-    
-    # Фильтр по жанру
-    if genre_slug:
-        films = films.filter(genres__slug=genre_slug)
-    
-    # Фильтр по году
-    if year:
-        films = films.filter(year=year)
-    
-    # Сортировка
-    films = films.order_by(sort)
+    # Сортировка (результаты поиска на PostgreSQL без явной сортировки - по релевантности)
+    sort = ''
+    if request.GET.get('sort') or not (query and uses_postgres_search()):
+        films, sort = FILM_SORTS.apply(films, request.GET.get('sort'))
     
     # Пагинация
-    paginator = Paginator(films, 24)  # 24 фильма на страницу
+    paginator = Paginator(films, FILMS_PER_PAGE)
     page = request.GET.get('page')
     films_page = paginator.get_page(page)
     
@@ -46,13 +118,17 @@ def film_list(request):
     years = Film.objects.values_list('year', flat=True).distinct().order_by('-year')
     
     # Подборки для главной
-    collections = FilmCollection.objects.all()[:5]
+    collections = FilmCollection.objects.annotate(films_count=Count('films'))[:5]
     
-    # Популярные фильмы
-    popular_films = Film.objects.order_by('-views_count')[:10]
+    # Популярные сейчас (с затуханием), пока не рассчитаны - по всем просмотрам;
+    # вычисляются только при промахе кэша фрагмента
+    popular_films = partial(trending, Film, 10, fallback=popular_films_fallback())
     
+    # Лучшие по оценкам (вычисляются только при промахе кэша фрагмента)
+    top_rated_films = partial(top_rated, 'film', 10)
+
     # Новинки
-    new_films = Film.objects.order_by('-created_at')[:12]
+    new_films = latest_films()
     
     context = {
         'films': films_page,
@@ -60,21 +136,26 @@ def film_list(request):
         'years': years,
         'collections': collections,
         'popular_films': popular_films,
+        'top_rated_films': top_rated_films,
         'new_films': new_films,
         'current_type': content_type,
         'current_genre': genre_slug,
+        'sort_options': FILM_SORTS.choices(),
         'current_sort': sort,
         'query': query,
+        'cache_version': cache_version('film'),
+        'cache_timeout': get_timeout(),
     }
     return render(request, 'films/list.html', context)
 
+@conditional_page(film_last_modified, on_not_modified=count_film_view)
 def film_detail(request, slug):
     """Страница фильма"""
     film = get_object_or_404(Film, slug=slug)
     
     # Увеличиваем счетчик просмотров
+    count_film_view(request, slug, film.id)
     film.views_count += 1
-    film.save(update_fields=['views_count'])
     
     videos = film.videos.all().order_by('-is_primary', 'order')
     
@@ -87,9 +168,20 @@ def film_detail(request, slug):
         'film': film,
         'videos': videos,
         'similar_films': similar_films,
+        'is_favorite': is_favorited(request.user, film),
     }
     return render(request, 'films/detail.html', context)
 
+def video_stream(request, video_id):
+    """Потоковая отдача локального видео с поддержкой перемотки (Range)"""
+    video = get_object_or_404(VideoSource, id=video_id)
+    if not video.video_file:
+        raise Http404('Видео файл не загружен')
+    try:
+        return serve_file(request, video.video_file)
+    except FileNotFoundError:
+        raise Http404('Видео файл не найден')
+
 def collection_detail(request, slug):
     """Страница подборки"""
     collection = get_object_or_404(FilmCollection, slug=slug)
@@ -110,13 +202,12 @@ def search(request):
     query = request.GET.get('q', '')
     
     if query:
-        films = Film.objects.filter(
-            Q(title__icontains=query) | 
-            Q(original_title__icontains=query) |
-            Q(description__icontains=query) |
-            Q(actors__name__icontains=query) |
-            Q(directors__name__icontains=query)
-        ).distinct().order_by('-views_count')
+        films = search_queryset(
+            Film.objects.all(),
+            query,
+            extra_q=Q(actors__name__icontains=query) | Q(directors__name__icontains=query),
+            fallback_order=['-views_count'],
+        )
     else:
         films = Film.objects.none()
     
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.text import Truncator
+
+from main.cache import cache_page_anonymous
+from .models import ForumTopic
+
+
+class LatestTopicsFeed(Feed):
+    """Atom-лента новых тем форума (/forum/feed/)"""
+    feed_type = Atom1Feed
+    title = 'Новые темы форума'
+    subtitle = 'Последние обсуждения сообщества'
+
+    def link(self):
+        return reverse('forum:index')
+
+    def items(self):
+        # Новые - по id (порядок создания, первичный ключ), без отдельного индекса по created_at
+        limit = getattr(settings, 'FEED_ITEMS', 30)
+        return ForumTopic.objects.filter(is_active=True).select_related('author', 'category').order_by('-id')[:limit]
+
+    def item_title(self, item):
+        return item.title
+
+    def item_description(self, item):
+        return Truncator(item.content).chars(500)
+
+    def item_author_name(self, item):
+        return item.author.username
+
+    def item_categories(self, item):
+        return [item.category.name]
+
+    def item_pubdate(self, item):
+        return item.created_at
+
+    def item_updateddate(self, item):
+        return item.updated_at
+
+
+latest_topics_feed = LatestTopicsFeed()
+
+
+@cache_page_anonymous('forum')
+def topics_feed(request):
+    return latest_topics_feed(request)
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.2 on 2026-10-19 13:10
+
+from django.db import migrations
+
+from main.search import search_index_migration
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0001_initial'),
+    ]
+
+    operations = [
+        # Только PostgreSQL: GIN-индексы полнотекстового и триграммного поиска
+        search_index_migration('forum', 'ForumTopic'),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0.2 on 2026-10-19 12:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0002_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='forumpost',
+            index=models.Index(fields=['topic', 'created_at'], name='post_topic_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='forumtopic',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category', '-is_pinned', '-updated_at'], name='topic_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='forumtopic',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-updated_at'], name='topic_recent_idx'),
+        ),
+    ]
@@ -52,6 +52,13 @@ class ForumTopic(models.Model):
         verbose_name = 'Тема форума'
         verbose_name_plural = 'Темы форума'
         ordering = ['-is_pinned', '-updated_at']
+        indexes = [
+            # Активные темы категории в порядке ordering
+            models.Index(fields=['category', '-is_pinned', '-updated_at'], condition=models.Q(is_active=True),
+                         name='topic_category_idx'),
+            # Последние активные темы на главной форума
+            models.Index(fields=['-updated_at'], condition=models.Q(is_active=True), name='topic_recent_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -75,6 +82,10 @@ class ForumPost(models.Model):
         verbose_name = 'Сообщение форума'
         verbose_name_plural = 'Сообщения форума'
         ordering = ['created_at']
+        indexes = [
+            # Постраничный вывод сообщений темы
+            models.Index(fields=['topic', 'created_at'], name='post_topic_created_idx'),
+        ]
     
     def __str__(self):
         return f"Сообщение #{self.id} от {self.author.username}"
@@ -1,3 +1,43 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from main.testing import QueryBudgetMixin
+from .models import ForumCategory, ForumPost, ForumTopic
+
+
+class ForumQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Число запросов страниц форума не зависит от числа тем, сообщений и авторов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = ForumCategory.objects.create(name='Общение', slug='talk')
+
+    def create_user(self):
+        return User.objects.create_user(f'user{User.objects.count()}')
+
+    def seed_topics(self, count):
+        for number in range(count):
+            author = self.create_user()
+            topic = ForumTopic.objects.create(
+                title=f'Тема {ForumTopic.objects.count()}', category=self.category, author=author, content='Текст',
+            )
+            ForumPost.objects.create(topic=topic, author=self.create_user(), content='Ответ')
+
+    def test_forum_index(self):
+        self.assertConstantQueries('/forum/', self.seed_topics, budget=8)
+
+    def test_category_topics(self):
+        self.assertConstantQueries('/forum/category/talk/', self.seed_topics, budget=10)
+
+    def test_search(self):
+        self.assertConstantQueries('/forum/search/?q=Тема', self.seed_topics, budget=4)
+
+    def test_topic_detail_posts(self):
+        topic = ForumTopic.objects.create(title='Тема', category=self.category, author=self.create_user(), content='Текст')
+        first = ForumPost.objects.create(topic=topic, author=topic.author, content='Первое сообщение')
+
+        def seed_posts(count):
+            for number in range(count):
+                ForumPost.objects.create(topic=topic, author=self.create_user(), content='Ответ', parent=first)
+
+        self.assertConstantQueries(f'/forum/topic/{topic.id}/', seed_posts, budget=14)
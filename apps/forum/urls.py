@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import feeds, views
 
 app_name = 'forum'
 
@@ -11,4 +11,5 @@ urlpatterns = [
     path('topic/<int:topic_id>/post/', views.create_post, name='create_post'),
     path('post/<int:post_id>/edit/', views.edit_post, name='edit_post'),
     path('search/', views.search, name='search'),
+    path('feed/', feeds.topics_feed, name='feed'),
 ]
\ No newline at end of file
@@ -1,51 +1,119 @@
+from functools import partial
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.models import User
-from django.db.models import Q, Count
+from django.db.models import Q, Count, Max, F, Prefetch
 from django.core.paginator import Paginator
 from django.urls import reverse
+from main.cache import cache_page_anonymous, cache_version, get_or_set, get_timeout
+from main.conditional import conditional_page, latest
+from main.search import search_queryset
+from main.trending import record_activity, trending
 from .models import ForumCategory, ForumTopic, ForumPost
 
+TOPICS_PER_PAGE = 20  # тем на странице категории
+POSTS_PER_PAGE = 15   # сообщений на странице темы
+
+def category_last_modified(request, slug):
+    """Последнее изменение списка тем категории (темы и ответы в них)"""
+    category = ForumCategory.objects.filter(slug=slug, is_active=True).values_list('id', flat=True).first()
+    if category is None:
+        return None
+    topics = ForumTopic.objects.filter(category_id=category).aggregate(latest=Max('updated_at'), count=Count('id'))
+    posts = ForumPost.objects.filter(topic__category_id=category).aggregate(latest=Max('updated_at'), count=Count('id'))
+    return latest(topics['latest'], posts['latest']), (topics['count'], posts['count'])
+
+def topic_last_modified(request, topic_id):
+    """Последнее изменение темы: сама тема и ее сообщения"""
+    updated_at = ForumTopic.objects.filter(id=topic_id, is_active=True).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None
+    posts = ForumPost.objects.filter(topic_id=topic_id).aggregate(latest=Max('updated_at'), count=Count('id'))
+    return latest(updated_at, posts['latest']), posts['count']
+
+def attach_author_stats(posts):
+    """
+    Проставляет авторам сообщений страницы posts_total и topics_total
+    (два группирующих запроса вместо двух COUNT на каждое сообщение).
+    """
+    posts = list(posts)
+    author_ids = {post.author_id for post in posts}
+    posts_total = dict(ForumPost.objects.filter(author_id__in=author_ids)
+                       .values_list('author').annotate(count=Count('id')).order_by())
+    topics_total = dict(ForumTopic.objects.filter(author_id__in=author_ids)
+                        .values_list('author').annotate(count=Count('id')).order_by())
+    for post in posts:
+        post.author.posts_total = posts_total.get(post.author_id, 0)
+        post.author.topics_total = topics_total.get(post.author_id, 0)
+    return posts
+
+def count_topic_view(request, topic_id):
+    """Увеличивает счетчик просмотров темы"""
+    ForumTopic.objects.filter(id=topic_id).update(views=F('views') + 1)
+    record_activity(ForumTopic, topic_id, 'views')
+
+def recent_topics_queryset(limit=10):
+    """Последние активные темы на главной форума"""
+    return ForumTopic.objects.filter(is_active=True).select_related('author', 'category').order_by('-updated_at')[:limit]
+
+def category_topics_queryset(category):
+    """Темы категории до поиска (представление и index_audit)"""
+    # Последнее сообщение каждой темы - одним запросом на страницу
+    last_posts = ForumPost.objects.select_related('author').order_by('-created_at', '-id')[:1]
+    return ForumTopic.objects.filter(category=category, is_active=True)\
+        .select_related('author')\
+        .prefetch_related(Prefetch('posts', queryset=last_posts, to_attr='last_posts'))
+
+def topic_posts_queryset(topic_id):
+    """Сообщения темы в порядке показа"""
+    return ForumPost.objects.filter(topic_id=topic_id).select_related('author', 'parent__author')
+
+@cache_page_anonymous('forum')
 def forum_index(request):
     """Главная страница форума"""
     categories = ForumCategory.objects.filter(parent__isnull=True, is_active=True)
     
     # Статистика
-    total_topics = ForumTopic.objects.filter(is_active=True).count()
-    total_posts = ForumPost.objects.count()
-    total_users = User.objects.count()
+    stats = get_or_set('forum_stats', ['forum'], lambda: {
+        'total_topics': ForumTopic.objects.filter(is_active=True).count(),
+        'total_posts': ForumPost.objects.count(),
+        'total_users': User.objects.count(),
+    })
     
     # Последние темы
-    recent_topics = ForumTopic.objects.filter(is_active=True)\
-                     .select_related('author', 'category')\
-                     .order_by('-updated_at')[:10]
+    recent_topics = recent_topics_queryset()
     
+    # Обсуждаемые сейчас: просмотры и ответы за последние дни с затуханием
+    # (вычисляются только при промахе кэша фрагмента)
+    trending_topics = partial(
+        trending, ForumTopic, 5, queryset=ForumTopic.objects.filter(is_active=True).select_related('author', 'category'),
+    )
+
     context = {
         'categories': categories,
         'recent_topics': recent_topics,
-        'total_topics': total_topics,
-        'total_posts': total_posts,
-        'total_users': total_users,
+        'trending_topics': trending_topics,
+        'cache_version': cache_version('forum'),
+        'cache_timeout': get_timeout(),
+        **stats,
     }
     return render(request, 'forum/index.html', context)
 
+@conditional_page(category_last_modified, has_counters=True)
 def category_topics(request, slug):
     """Список тем в категории"""
     category = get_object_or_404(ForumCategory, slug=slug, is_active=True)
-    topics = ForumTopic.objects.filter(category=category, is_active=True)\
-              .select_related('author')
+    topics = category_topics_queryset(category)
     
     # Поиск
     query = request.GET.get('q')
     if query:
-        topics = topics.filter(
-            Q(title__icontains=query) | 
-            Q(content__icontains=query)
-        )
+        topics = search_queryset(topics, query)
     
     # Пагинация
-    paginator = Paginator(topics, 20)
+    paginator = Paginator(topics, TOPICS_PER_PAGE)
     page = request.GET.get('page')
     topics_page = paginator.get_page(page)
     
@@ -56,21 +124,23 @@ def category_topics(request, slug):
     }
     return render(request, 'forum/category.html', context)
 
+@conditional_page(topic_last_modified, has_counters=True, on_not_modified=count_topic_view)
 def topic_detail(request, topic_id):
     """Просмотр темы"""
-    topic = get_object_or_404(ForumTopic, id=topic_id, is_active=True)
+    topic = get_object_or_404(ForumTopic.objects.select_related('author', 'category'), id=topic_id, is_active=True)
     
     # Увеличиваем просмотры
+    count_topic_view(request, topic_id)
     topic.views += 1
-    topic.save(update_fields=['views'])
     
     # Получаем сообщения
-    posts = topic.posts.select_related('author').all()
+    posts = topic_posts_queryset(topic.pk)
     
     # Пагинация сообщений
-    paginator = Paginator(posts, 15)
+    paginator = Paginator(posts, POSTS_PER_PAGE)
     page = request.GET.get('page')
     posts_page = paginator.get_page(page)
+    posts_page.object_list = attach_author_stats(posts_page.object_list)
     
     context = {
         'topic': topic,
@@ -123,9 +193,9 @@ def create_post(request, topic_id):
                 parent_id=parent_id if parent_id else None
             )
             
-            # Обновляем количество ответов в теме
+            # Обновляем количество ответов и время активности темы (lastmod в карте сайта)
             topic.posts_count = topic.posts.count()
-            topic.save(update_fields=['posts_count'])
+            topic.save(update_fields=['posts_count', 'updated_at'])
             
             messages.success(request, 'Ответ добавлен!')
             return redirect(f"{topic.get_absolute_url()}?page=last#post-{post.id}")
@@ -157,11 +227,11 @@ def search(request):
     query = request.GET.get('q', '')
     
     if query:
-        topics = ForumTopic.objects.filter(
-            Q(title__icontains=query) | 
-            Q(content__icontains=query) |
-            Q(posts__content__icontains=query)
-        ).filter(is_active=True).distinct()[:30]
+        topics = search_queryset(
+            ForumTopic.objects.filter(is_active=True).select_related('author', 'category'),
+            query,
+            extra_q=Q(posts__content__icontains=query),
+        )[:30]
     else:
         topics = []
     
@@ -0,0 +1,49 @@
+# Generated by Django 6.0.2 on 2026-10-19 13:10
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_rating_counts(apps, schema_editor):
+    Review = apps.get_model('reviews', 'Review')
+    CachedRating = apps.get_model('reviews', 'CachedRating')
+    counts = {}
+    rows = (
+        Review.objects.filter(rating__gt=0)
+        .values_list('content_type_id', 'object_id', 'rating')
+        .annotate(count=Count('id')).order_by()
+    )
+    for content_type_id, object_id, rating, count in rows.iterator():
+        counts.setdefault((content_type_id, object_id), [0] * 5)[rating - 1] = count
+    ratings = []
+    for rating in CachedRating.objects.only('content_type_id', 'object_id').iterator():
+        rating.rating_counts = counts.get((rating.content_type_id, rating.object_id), [0] * 5)
+        ratings.append(rating)
+    CachedRating.objects.bulk_update(ratings, ['rating_counts'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('reviews', '0004_composite_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='review',
+            name='review_object_created_idx',
+        ),
+        migrations.AddField(
+            model_name='cachedrating',
+            name='rating_counts',
+            field=models.JSONField(blank=True, default=list, verbose_name='Распределение оценок'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['content_type', 'object_id', '-created_at', '-id'], name='review_object_created_idx'),
+        ),
+        migrations.RunPython(fill_rating_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0.2 on 2026-10-19 13:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('reviews', '0005_rating_distribution'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingRank',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('accessibility', models.CharField(blank=True, default='', max_length=100, verbose_name='Флаги доступности')),
+                ('score', models.FloatField(verbose_name='Взвешенный рейтинг')),
+                ('average_rating', models.FloatField(verbose_name='Средний рейтинг')),
+                ('review_count', models.PositiveIntegerField(verbose_name='Количество оценок')),
+                ('computed_at', models.DateTimeField(verbose_name='Дата расчета')),
+                ('content_type', models.ForeignKey(limit_choices_to={'model__in': ['book', 'course', 'film']}, on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'verbose_name': 'Позиция в рейтинге',
+                'verbose_name_plural': 'Рейтинг по оценкам',
+                'indexes': [models.Index(fields=['content_type', 'accessibility', '-score', 'object_id'], name='rank_score_idx')],
+                'unique_together': {('content_type', 'accessibility', 'object_id')},
+            },
+        ),
+    ]
@@ -33,7 +33,8 @@ class Review(models.Model):
         verbose_name_plural = 'Отзывы'
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['content_type', 'object_id']),
+            # Отзывы объекта, новые сверху; id - для keyset-пагинации (см. get_reviews_page)
+            models.Index(fields=['content_type', 'object_id', '-created_at', '-id'], name='review_object_created_idx'),
             models.Index(fields=['user', 'content_type']),
         ]
 
@@ -62,6 +63,8 @@ class CachedRating(models.Model):
 
     average_rating = models.FloatField('Средний рейтинг', default=0.0)
     review_count = models.PositiveIntegerField('Количество отзывов', default=0)
+    # Распределение оценок: rating_counts[0] - число оценок 1, ..., rating_counts[4] - оценок 5
+    rating_counts = models.JSONField('Распределение оценок', default=list, blank=True)
     last_updated = models.DateTimeField('Последнее обновление', auto_now=True)
 
     class Meta:
@@ -76,6 +79,45 @@ class CachedRating(models.Model):
     def __str__(self):
         return f'{self.content_type} #{self.object_id}: {self.average_rating:.1f} ({self.review_count})'
 
+    def distribution(self):
+        """Гистограмма оценок от 5 до 1: [(оценка, количество, процент)]"""
+        counts = self.rating_counts or [0] * 5
+        total = sum(counts)
+        return [
+            (stars, counts[stars - 1], round(counts[stars - 1] * 100 / total) if total else 0)
+            for stars in range(5, 0, -1)
+        ]
+
+
+class RatingRank(models.Model):
+    """
+    Материализованный рейтинг «лучшие по оценкам» (см. ranking.py).
+    На объект приходится строка для каждого набора его флагов доступности
+    (accessibility - отсортированные имена флагов через запятую, '' - все
+    объекты), поэтому топ с любым сочетанием фильтров - чтение по индексу.
+    """
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE,
+                                    limit_choices_to={'model__in': ['book', 'course', 'film']})
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey('content_type', 'object_id')
+    accessibility = models.CharField('Флаги доступности', max_length=100, blank=True, default='')
+
+    score = models.FloatField('Взвешенный рейтинг')
+    average_rating = models.FloatField('Средний рейтинг')
+    review_count = models.PositiveIntegerField('Количество оценок')
+    computed_at = models.DateTimeField('Дата расчета')
+
+    class Meta:
+        unique_together = ('content_type', 'accessibility', 'object_id')
+        verbose_name = 'Позиция в рейтинге'
+        verbose_name_plural = 'Рейтинг по оценкам'
+        indexes = [
+            models.Index(fields=['content_type', 'accessibility', '-score', 'object_id'], name='rank_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.content_type} #{self.object_id} [{self.accessibility}]: {self.score:.2f}'
+
 
 class Favorite(models.Model):
     """Избранное (лайк) для любого типа контента"""
@@ -93,6 +135,8 @@ class Favorite(models.Model):
         indexes = [
             models.Index(fields=['content_type', 'object_id']),
             models.Index(fields=['user', 'content_type']),
+            # Страница избранного в профиле: новые сверху
+            models.Index(fields=['user', '-created_at', '-id'], name='fav_user_created_idx'),
         ]
 
     def __str__(self):
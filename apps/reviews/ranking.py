@@ -0,0 +1,133 @@
+# apps/reviews/ranking.py
+"""
+Рейтинг «лучшие по оценкам» по байесовской (взвешенной) оценке.
+
+Сортировка по CachedRating.average_rating поднимает наверх объекты с
+единственной пятеркой. Взвешенная оценка тянет среднюю объекта к средней
+всех оценок того же типа тем сильнее, чем меньше у объекта оценок:
+
+    score = (C * m + сумма оценок объекта) / (C + число оценок объекта)
+
+m - средняя всех оценок типа, C - settings.RATING_PRIOR_WEIGHT.
+
+rebuild_rankings() (manage.py rank_ratings, по расписанию) пересчитывает
+таблицу RatingRank целиком, страницы ее только читают: top_rated() -
+топ по индексу без соединений, order_by_rating() - сортировка списков
+(?sort=rating, только оцененные объекты).
+"""
+from itertools import combinations
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from main.cache import invalidate
+from .models import CachedRating, RatingRank
+from .services import get_content_type
+
+# Флаги доступности, сочетания которых получают свой рейтинг (у курсов есть еще расшифровка)
+ACCESSIBILITY_FLAGS = ('has_subtitles', 'has_sign_language', 'has_audio_description', 'has_transcript')
+
+
+def accessibility_key(flags):
+    """Значение RatingRank.accessibility для набора флагов: 'has_sign_language,has_subtitles'"""
+    return ','.join(sorted(flags))
+
+
+def model_flags(model):
+    """Флаги доступности, которые есть у модели"""
+    names = {field.name for field in model._meta.get_fields()}
+    return [flag for flag in ACCESSIBILITY_FLAGS if flag in names]
+
+
+def bayesian_score(average, count, prior_mean, prior_weight):
+    return (prior_weight * prior_mean + average * count) / (prior_weight + count)
+
+
+def _rank_rows(content_type, ratings, prior_mean, computed_at):
+    """Строки RatingRank: по одной на каждое подмножество флагов объекта"""
+    model = content_type.model_class()
+    flags = model_flags(model)
+    prior_weight = getattr(settings, 'RATING_PRIOR_WEIGHT', 10)
+    for pk, *values in model._default_manager.values_list('pk', *flags).iterator():
+        if pk not in ratings:
+            continue
+        average, count = ratings[pk]
+        score = bayesian_score(average, count, prior_mean, prior_weight)
+        present = [flag for flag, value in zip(flags, values) if value]
+        for size in range(len(present) + 1):
+            for subset in combinations(present, size):
+                yield RatingRank(
+                    content_type=content_type, object_id=pk, accessibility=accessibility_key(subset),
+                    score=score, average_rating=average, review_count=count, computed_at=computed_at,
+                )
+
+
+def rebuild_rankings(content_type_str, batch_size=2000):
+    """
+    Пересчитывает рейтинг одного типа контента ('book', 'course', 'film').
+    Таблица заменяется в одной транзакции: читатели видят либо прежний,
+    либо новый рейтинг. Возвращает число строк рейтинга.
+    """
+    content_type = get_content_type(content_type_str)
+    ratings = {
+        object_id: (average, count)
+        for object_id, average, count in CachedRating.objects.filter(content_type=content_type, review_count__gt=0)
+        .values_list('object_id', 'average_rating', 'review_count').iterator()
+    }
+    # Априорная средняя - средняя всех оценок типа, а не средняя средних
+    total = sum(count for _, count in ratings.values())
+    prior_mean = sum(average * count for average, count in ratings.values()) / total if total else 0
+
+    created = 0
+    with transaction.atomic():
+        RatingRank.objects.filter(content_type=content_type).delete()
+        batch = []
+        for row in _rank_rows(content_type, ratings, prior_mean, timezone.now()):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                RatingRank.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        RatingRank.objects.bulk_create(batch)
+        created += len(batch)
+    # Закэшированные страницы с блоками «лучшие по оценкам»
+    invalidate(content_type_str)
+    return created
+
+
+def get_ranking_computed_at(content_type):
+    """Дата последнего пересчета рейтинга типа (для условных GET-запросов)"""
+    # Все строки типа пересчитываются вместе - достаточно любой из них
+    return next(iter(RatingRank.objects.filter(content_type=content_type).values_list('computed_at', flat=True)[:1]), None)
+
+
+def top_rated(content_type_str, limit=10, flags=()):
+    """
+    Лучшие по оценкам объекты типа, у которых есть все флаги flags.
+    У каждого объекта - атрибут rating_rank (RatingRank). Два запроса:
+    позиции по индексу rank_score_idx и сами объекты по первичному ключу.
+    """
+    content_type = get_content_type(content_type_str)
+    ranks = list(
+        RatingRank.objects.filter(content_type=content_type, accessibility=accessibility_key(flags))
+        .order_by('-score', 'object_id')[:limit]
+    )
+    objects = content_type.model_class()._default_manager.in_bulk([rank.object_id for rank in ranks])
+    result = []
+    for rank in ranks:
+        obj = objects.get(rank.object_id)
+        # Объект мог быть удален после пересчета
+        if obj is not None:
+            obj.rating_rank = rank
+            result.append(obj)
+    return result
+
+
+def order_by_rating(queryset):
+    """
+    Оцененные объекты queryset по взвешенному рейтингу. Соединение с
+    RatingRank (связь rating_ranks модели) в порядке индекса rank_score_idx:
+    страница читается по индексу, без сортировки всех объектов.
+    """
+    return queryset.filter(rating_ranks__accessibility='').order_by('-rating_ranks__score', 'rating_ranks__object_id')
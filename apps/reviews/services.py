@@ -1,8 +1,30 @@
 # apps/reviews/services.py
-from django.db.models import Avg, Count
+import binascii
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.core.paginator import Paginator
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Count, F, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.contenttypes.models import ContentType
 from .models import Review, CachedRating
 
+RATING_VALUES = range(1, 6)
+
+
+def _rating_aggregates():
+    """Средняя оценка, число оценок и число оценок каждого значения - одним агрегатом"""
+    aggregates = {'avg_rating': Avg('rating'), 'count': Count('id')}
+    for value in RATING_VALUES:
+        aggregates[f'stars_{value}'] = Count('id', filter=Q(rating=value))
+    return aggregates
+
+
+def _rating_counts(stats):
+    return [stats.get(f'stars_{value}') or 0 for value in RATING_VALUES]
+
+
 def update_cached_rating(content_type, object_id):
     """
     Обновляет кэшированный рейтинг для объекта
@@ -21,10 +43,7 @@ def update_cached_rating(content_type, object_id):
         content_type=content_type,
         object_id=object_id,
         rating__gt=0  # Только оценки, не комментарии
-    ).aggregate(
-        avg_rating=Avg('rating'),
-        count=Count('id')
-    )
+    ).aggregate(**_rating_aggregates())
 
     # Создаем или обновляем кэшированный рейтинг
     cached_rating, created = CachedRating.objects.update_or_create(
@@ -33,12 +52,59 @@ def update_cached_rating(content_type, object_id):
         defaults={
             'average_rating': stats['avg_rating'] or 0,
             'review_count': stats['count'] or 0,
+            'rating_counts': _rating_counts(stats),
         }
     )
 
     return cached_rating
 
 
+def update_cached_ratings(keys):
+    """
+    Пересчитывает кэшированные рейтинги сразу для многих объектов:
+    один агрегирующий запрос с группировкой и одна вставка с обновлением
+    при конфликте (независимо от количества объектов).
+
+    keys - пары (content_type_id, object_id).
+    """
+    keys = set(keys)
+    if not keys:
+        return
+    stats = {
+        (row['content_type'], row['object_id']): row
+        for row in Review.objects.filter(_objects_filter(keys), rating__gt=0)
+        .values('content_type', 'object_id')
+        .annotate(**_rating_aggregates())
+    }
+    ratings = []
+    for key in keys:
+        row = stats.get(key, {})
+        ratings.append(CachedRating(
+            content_type_id=key[0],
+            object_id=key[1],
+            average_rating=row.get('avg_rating') or 0,
+            review_count=row.get('count') or 0,
+            rating_counts=_rating_counts(row),
+        ))
+    CachedRating.objects.bulk_create(
+        ratings,
+        update_conflicts=True,
+        unique_fields=['content_type', 'object_id'],
+        update_fields=['average_rating', 'review_count', 'rating_counts', 'last_updated'],
+    )
+
+
+def _objects_filter(keys):
+    """Условие «объект из списка» для пар (content_type_id, object_id): OR по типам"""
+    ids_by_type = {}
+    for content_type_id, object_id in keys:
+        ids_by_type.setdefault(content_type_id, set()).add(object_id)
+    condition = Q()
+    for content_type_id, ids in ids_by_type.items():
+        condition |= Q(content_type_id=content_type_id, object_id__in=ids)
+    return condition
+
+
 def get_cached_rating(content_type, object_id):
     """
     Получает кэшированный рейтинг для объекта
@@ -52,6 +118,18 @@ def get_cached_rating(content_type, object_id):
         return update_cached_rating(content_type, object_id)
 
 
+def get_rating_last_updated(content_type, object_id=None):
+    """
+    Дата последнего изменения отзывов объекта (или всех объектов типа).
+    CachedRating пересчитывается при каждом добавлении/удалении отзыва,
+    поэтому его last_updated учитывает и удаления.
+    """
+    ratings = CachedRating.objects.filter(content_type=content_type)
+    if object_id is not None:
+        ratings = ratings.filter(object_id=object_id)
+    return ratings.aggregate(latest=Max('last_updated'))['latest']
+
+
 def delete_cached_rating(content_type, object_id):
     """
     Удаляет кэшированный рейтинг для объекта
@@ -72,6 +150,51 @@ def get_reviews_for_object(content_type, object_id):
     ).select_related('user').order_by('-created_at')
 
 
+REVIEWS_PER_PAGE = 10
+
+
+def encode_review_cursor(review):
+    """Курсор «после этого отзыва»: дата создания и id в base64"""
+    value = f'{review.created_at.isoformat()}|{review.pk}'
+    return urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def decode_review_cursor(cursor):
+    """(created_at, id) из курсора; ValueError, если курсор поврежден"""
+    try:
+        value = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = value.split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f'Некорректный курсор отзывов: {cursor!r}')
+
+
+def reviews_page_queryset(content_type, object_id, cursor=None):
+    """Отзывы объекта после курсора в порядке страниц (get_reviews_page и index_audit)"""
+    reviews = get_reviews_for_object(content_type, object_id).order_by('-created_at', '-id')
+    if cursor:
+        created_at, pk = decode_review_cursor(cursor)
+        reviews = reviews.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    return reviews
+
+
+def get_reviews_page(content_type, object_id, cursor=None, per_page=REVIEWS_PER_PAGE):
+    """
+    Страница отзывов объекта (новые сверху) и курсор следующей страницы
+    (None - страница последняя).
+
+    Keyset-пагинация по (created_at, id): следующая страница начинается
+    сразу после последнего показанного отзыва, поэтому запрос идет по
+    индексу review_object_created_idx без OFFSET и подсчета всех строк,
+    а новые отзывы не сдвигают уже открытые страницы.
+    """
+    reviews = reviews_page_queryset(content_type, object_id, cursor)
+    # Лишняя строка показывает, есть ли следующая страница
+    page = list(reviews[:per_page + 1])
+    next_cursor = encode_review_cursor(page[per_page - 1]) if len(page) > per_page else None
+    return page[:per_page], next_cursor
+
+
 def get_user_review_for_object(user, content_type, object_id):
     """
     Получает отзыв пользователя для конкретного объекта
@@ -100,22 +223,36 @@ def is_favorite(user, content_type, object_id):
 
 # Утилиты для удобного вызова с объектом или строковым идентификатором
 
+CONTENT_TYPES = {
+    'book': ('books', 'book'),
+    'course': ('education', 'course'),
+    'film': ('films', 'film'),
+}
+
+
+def get_content_type(content_type_str):
+    """ContentType по строке 'book', 'course', 'film' (из кэша ContentType, без запроса)"""
+    if content_type_str not in CONTENT_TYPES:
+        raise ValueError(f"Unknown content type string: {content_type_str}")
+    return ContentType.objects.get_by_natural_key(*CONTENT_TYPES[content_type_str])
+
+
+def get_object_rating(obj):
+    """
+    Кэшированный рейтинг объекта. Запоминается на экземпляре, поэтому
+    average_rating и review_count не повторяют запрос; для списков
+    рейтинги заранее загружает attach_ratings.
+    """
+    if '_cached_rating' not in obj.__dict__:
+        obj._cached_rating = get_cached_rating(ContentType.objects.get_for_model(obj), obj.pk)
+    return obj._cached_rating
+
 def get_average_rating(content_type_str, object_id):
     """
     Возвращает средний рейтинг для объекта по app_label и model
     content_type_str: строка 'book', 'course', 'film'
     """
-    from django.contrib.contenttypes.models import ContentType
-    # Преобразуем строку в ContentType
-    if content_type_str == 'book':
-        ct = ContentType.objects.get(app_label='books', model='book')
-    elif content_type_str == 'course':
-        ct = ContentType.objects.get(app_label='education', model='course')
-    elif content_type_str == 'film':
-        ct = ContentType.objects.get(app_label='films', model='film')
-    else:
-        raise ValueError(f"Unknown content type string: {content_type_str}")
-    cached = get_cached_rating(ct, object_id)
+    cached = get_cached_rating(get_content_type(content_type_str), object_id)
     return cached.average_rating
 
 
@@ -123,16 +260,7 @@ def get_review_count(content_type_str, object_id):
     """
     Возвращает количество отзывов для объекта по app_label и model
     """
-    from django.contrib.contenttypes.models import ContentType
-    if content_type_str == 'book':
-        ct = ContentType.objects.get(app_label='books', model='book')
-    elif content_type_str == 'course':
-        ct = ContentType.objects.get(app_label='education', model='course')
-    elif content_type_str == 'film':
-        ct = ContentType.objects.get(app_label='films', model='film')
-    else:
-        raise ValueError(f"Unknown content type string: {content_type_str}")
-    cached = get_cached_rating(ct, object_id)
+    cached = get_cached_rating(get_content_type(content_type_str), object_id)
     return cached.review_count
 
 
@@ -140,16 +268,7 @@ def get_reviews_for(content_type_str, object_id):
     """
     Возвращает список отзывов для объекта по app_label и model
     """
-    from django.contrib.contenttypes.models import ContentType
-    if content_type_str == 'book':
-        ct = ContentType.objects.get(app_label='books', model='book')
-    elif content_type_str == 'course':
-        ct = ContentType.objects.get(app_label='education', model='course')
-    elif content_type_str == 'film':
-        ct = ContentType.objects.get(app_label='films', model='film')
-    else:
-        raise ValueError(f"Unknown content type string: {content_type_str}")
-    return get_reviews_for_object(ct, object_id)
+    return get_reviews_for_object(get_content_type(content_type_str), object_id)
 
 
 def add_review(user, obj, rating, comment='', **accessibility_fields):
@@ -226,27 +345,109 @@ def add_review(user, obj, rating, comment='', **accessibility_fields):
             setattr(review, field, value)
         review.save()
 
-    # Обновить кэшированный рейтинг
-    update_cached_rating(content_type, obj.id)
+    # Кэшированный рейтинг уже пересчитан в Review.save();
+    # запомненный на объекте (get_object_rating) устарел
+    obj.__dict__.pop('_cached_rating', None)
     return review, created
 
 
-def toggle_favorite(user, obj):
+# Поле модели со счетчиком добавлений в избранное (Film, Book, Course)
+FAVORITE_COUNTER_FIELD = 'likes_count'
+
+
+def _update_favorite_counter(obj, delta):
+    """Атомарно меняет счетчик избранного объекта (UPDATE ... SET x = x + delta)"""
+    model = type(obj)
+    if not any(f.name == FAVORITE_COUNTER_FIELD for f in model._meta.concrete_fields):
+        return
+    rows = model._default_manager.filter(pk=obj.pk)
+    if delta < 0:
+        rows = rows.filter(**{f'{FAVORITE_COUNTER_FIELD}__gt': 0})
+    rows.update(**{FAVORITE_COUNTER_FIELD: F(FAVORITE_COUNTER_FIELD) + delta})
+
+
+def _add_favorite(user, content_type, obj):
     """
-    Добавляет или удаляет объект из избранного пользователя.
+    Вставляет запись избранного. Возвращает False, если она уже есть
+    (в том числе вставлена параллельным запросом).
     """
-    from django.contrib.contenttypes.models import ContentType
     from .models import Favorite
-    content_type = ContentType.objects.get_for_model(obj)
-    favorite, created = Favorite.objects.get_or_create(
+    try:
+        with transaction.atomic():
+            Favorite.objects.create(user=user, content_type=content_type, object_id=obj.pk)
+    except IntegrityError:
+        return False
+    _update_favorite_counter(obj, 1)
+    return True
+
+
+def _remove_favorite(user, content_type, obj):
+    """Удаляет запись избранного одним DELETE. Возвращает True, если она была"""
+    from .models import Favorite
+    deleted, _ = Favorite.objects.filter(
         user=user,
         content_type=content_type,
-        object_id=obj.id
-    )
-    if not created:
-        favorite.delete()
-        return False  # Удален
-    return True  # Добавлен
+        object_id=obj.pk
+    ).delete()
+    if deleted:
+        _update_favorite_counter(obj, -1)
+    return bool(deleted)
+
+
+def set_favorite(user, obj, value):
+    """
+    Идемпотентно добавляет (value=True) или удаляет объект из избранного.
+    Повторный запрос (двойной клик) ничего не меняет.
+    Возвращает True, если состояние изменилось.
+    """
+    content_type = ContentType.objects.get_for_model(obj)
+    with transaction.atomic():
+        if value:
+            return _add_favorite(user, content_type, obj)
+        return _remove_favorite(user, content_type, obj)
+
+
+def toggle_favorite(user, obj):
+    """
+    Добавляет или удаляет объект из избранного пользователя.
+
+    Без предварительного SELECT: сначала DELETE, и если удалять было
+    нечего - INSERT, который при гонке упирается в уникальный индекс.
+    Счетчик likes_count меняется в той же транзакции.
+    """
+    content_type = ContentType.objects.get_for_model(obj)
+    with transaction.atomic():
+        if _remove_favorite(user, content_type, obj):
+            return False  # Удален
+        _add_favorite(user, content_type, obj)
+        return True  # Добавлен
+
+
+def get_favorite_count(obj):
+    """Сколько пользователей добавили объект в избранное"""
+    count = getattr(obj, FAVORITE_COUNTER_FIELD, None)
+    if count is not None:
+        return count
+    from .models import Favorite
+    return Favorite.objects.filter(
+        content_type=ContentType.objects.get_for_model(obj),
+        object_id=obj.pk
+    ).count()
+
+
+def recount_favorites(model):
+    """
+    Пересчитывает счетчики избранного всех объектов модели
+    (после импорта данных или ручных правок в базе).
+    """
+    from .models import Favorite
+    counts = Favorite.objects.filter(
+        content_type=ContentType.objects.get_for_model(model),
+        object_id=OuterRef('pk')
+    ).values('object_id').annotate(count=Count('id')).values('count')
+    model._default_manager.update(**{
+        FAVORITE_COUNTER_FIELD: Coalesce(Subquery(counts), 0)
+    })
 
 
 def is_favorited(user, obj):
@@ -265,6 +466,218 @@ def is_favorited(user, obj):
     ).exists()
 
 
+def get_favorite_counts(user):
+    """
+    Количество избранного пользователя по типам контента
+    одним запросом с группировкой: {'book': 3, 'film': 10, ...}
+    """
+    from .models import Favorite
+    rows = Favorite.objects.filter(user=user).values('content_type').annotate(count=Count('id'))
+    return {
+        ContentType.objects.get_for_id(row['content_type']).model: row['count']
+        for row in rows
+    }
+
+
+def resolve_favorites(favorites):
+    """
+    Превращает записи избранного (словари с content_type, object_id,
+    created_at) в список словарей {'type', 'object', 'created_at', 'rating'}
+    в том же порядке.
+
+    Объекты загружаются одним запросом на тип контента, рейтинги -
+    одним запросом на все типы. Записи удаленных объектов пропускаются.
+    """
+    ids_by_type = {}
+    for fav in favorites:
+        ids_by_type.setdefault(fav['content_type'], []).append(fav['object_id'])
+    if not ids_by_type:
+        return []
+
+    objects = {}
+    for ct_id, ids in ids_by_type.items():
+        model = ContentType.objects.get_for_id(ct_id).model_class()
+        if model is None:
+            continue
+        for obj in model._default_manager.filter(pk__in=ids):
+            objects[(ct_id, obj.pk)] = obj
+
+    ratings = {}
+    # Все объекты страницы удалены - пустое условие выбрало бы все рейтинги
+    if objects:
+        ratings = {
+            (rating.content_type_id, rating.object_id): rating
+            for rating in CachedRating.objects.filter(_objects_filter(objects))
+        }
+
+    result = []
+    for fav in favorites:
+        key = (fav['content_type'], fav['object_id'])
+        obj = objects.get(key)
+        if obj is None:
+            continue
+        result.append({
+            'type': ContentType.objects.get_for_id(fav['content_type']).model,
+            'object': obj,
+            'created_at': fav['created_at'],
+            'rating': ratings.get(key),
+        })
+    return result
+
+
+FAVORITES_PER_PAGE = 20
+
+
+def user_favorites_queryset(user):
+    """Записи избранного пользователя, новые сверху (get_user_favorites и index_audit)"""
+    from .models import Favorite
+    return Favorite.objects.filter(user=user).order_by('-created_at', '-id').values(
+        'content_type', 'object_id', 'created_at'
+    )
+
+
+def get_user_favorites(user, page=1, per_page=FAVORITES_PER_PAGE, total=None):
+    """
+    Страница избранного пользователя, новые сверху.
+
+    Возвращает объект страницы Paginator, object_list которого уже
+    содержит разрешенные объекты (см. resolve_favorites). Загружаются
+    только записи текущей страницы, поэтому объем работы не зависит
+    от общего количества избранного.
+    total - уже известное общее количество (экономит COUNT-запрос).
+    """
+    paginator = Paginator(user_favorites_queryset(user), per_page)
+    if total is not None:
+        paginator.count = total
+    page_obj = paginator.get_page(page)
+    page_obj.object_list = resolve_favorites(list(page_obj.object_list))
+    return page_obj
+
+
+# Пакетные операции: импорт отзывов и отметки пользователя в списках
+
+REVIEW_UPDATE_FIELDS = [
+    'rating',
+    'comment',
+    'accessibility_subtitles',
+    'accessibility_sign_language',
+    'accessibility_audio_description',
+    'accessibility_transcript',
+    'updated_at',
+]
+
+
+def bulk_add_reviews(reviews, batch_size=500):
+    """
+    Создает или обновляет много отзывов сразу (импорт исторических оценок).
+
+    reviews - итерируемый набор несохраненных Review с заполненными
+    user, content_type (или content_object), object_id и rating.
+    Существующие отзывы тех же пользователей обновляются
+    (INSERT ... ON CONFLICT DO UPDATE), из повторов внутри набора
+    побеждает последний. Кэшированные рейтинги пересчитываются один раз
+    для каждого затронутого объекта. Возвращает количество отзывов.
+    """
+    unique = {}
+    for review in reviews:
+        review.clean()  # проверка диапазона оценки без запросов к базе
+        unique[(review.user_id, review.content_type_id, review.object_id)] = review
+    if not unique:
+        return 0
+
+    with transaction.atomic():
+        Review.objects.bulk_create(
+            unique.values(),
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['user', 'content_type', 'object_id'],
+            update_fields=REVIEW_UPDATE_FIELDS,
+        )
+        update_cached_ratings((content_type_id, object_id) for _, content_type_id, object_id in unique)
+    return len(unique)
+
+
+def _object_keys(objects):
+    """{(content_type_id, pk): объект} для набора объектов любых типов"""
+    return {
+        (ContentType.objects.get_for_model(obj).id, obj.pk): obj
+        for obj in objects
+    }
+
+
+def reviews_for(user, objects):
+    """
+    Отзывы пользователя для набора объектов одним запросом:
+    {объект: Review}. Объекты без отзыва в словарь не попадают.
+    """
+    keys = _object_keys(objects)
+    if not keys or not user.is_authenticated:
+        return {}
+    reviews = Review.objects.filter(_objects_filter(keys), user=user)
+    return {keys[(review.content_type_id, review.object_id)]: review for review in reviews}
+
+
+def favorites_for(user, objects):
+    """
+    Отметки избранного пользователя для набора объектов одним запросом:
+    {объект: True/False}.
+    """
+    from .models import Favorite
+    keys = _object_keys(objects)
+    if not keys or not user.is_authenticated:
+        return dict.fromkeys(keys.values(), False)
+    favorites = set(
+        Favorite.objects.filter(_objects_filter(keys), user=user).values_list('content_type', 'object_id')
+    )
+    return {obj: key in favorites for key, obj in keys.items()}
+
+
+def attach_user_state(user, objects):
+    """
+    Проставляет объектам списка user_review и is_favorite
+    (два запроса на весь список) для значков «ваша оценка» и «в избранном».
+    """
+    objects = list(objects)
+    user_reviews = reviews_for(user, objects)
+    favorites = favorites_for(user, objects)
+    for obj in objects:
+        obj.user_review = user_reviews.get(obj)
+        obj.is_favorite = favorites.get(obj, False)
+    return objects
+
+
+def attach_ratings(objects):
+    """
+    Загружает кэшированные рейтинги набора объектов одним запросом
+    (для average_rating и review_count в карточках списков).
+    Объектам без отзывов достается пустой рейтинг.
+    """
+    objects = list(objects)
+    keys = _object_keys(objects)
+    if keys:
+        ratings = {
+            (rating.content_type_id, rating.object_id): rating
+            for rating in CachedRating.objects.filter(_objects_filter(keys))
+        }
+        for key, obj in keys.items():
+            obj._cached_rating = ratings.get(key) or CachedRating(content_type_id=key[0], object_id=key[1])
+    return objects
+
+
+def get_user_favorites_state(user, content_type):
+    """
+    Состояние избранного пользователя для одного типа контента
+    (количество и последнее добавление) - для ETag списков с отметками.
+    """
+    from .models import Favorite
+    if not user.is_authenticated:
+        return None
+    state = Favorite.objects.filter(user=user, content_type=content_type).aggregate(
+        count=Count('id'), latest=Max('created_at')
+    )
+    return state['count'], state['latest']
+
+
 def delete_review(user, obj):
     """
     Удаляет отзыв пользователя для объекта.
@@ -280,5 +693,6 @@ def delete_review(user, obj):
     ).delete()
     if deleted:
         update_cached_rating(content_type, obj.id)
+        obj.__dict__.pop('_cached_rating', None)
         return True
     return False
@@ -1,3 +1,274 @@
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
 
-# Create your tests here.
+from apps.books.models import Book
+from apps.education.models import Course
+from apps.films.models import Film
+from .models import CachedRating, Favorite, RatingRank, Review
+from .ranking import bayesian_score, order_by_rating, rebuild_rankings, top_rated
+from .services import (
+    REVIEWS_PER_PAGE, add_review, attach_ratings, attach_user_state, bulk_add_reviews, favorites_for,
+    get_reviews_page, get_user_favorites, recount_favorites, reviews_for, set_favorite, toggle_favorite,
+    update_cached_ratings,
+)
+
+
+class BatchLookupQueryTests(TestCase):
+    """Пакетные выборки для карточек списков: число запросов не зависит от числа объектов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader')
+        cls.objects = []
+        for number in range(5):
+            book = Book.objects.create(title=f'Книга {number}', author='Автор', content='Текст')
+            course = Course.objects.create(title=f'Курс {number}', instructor='Преподаватель',
+                                           description='Описание', duration_hours=5)
+            add_review(cls.user, book, number % 5 + 1)
+            set_favorite(cls.user, course, True)
+            cls.objects += [book, course]
+
+    def fresh_objects(self):
+        return list(Book.objects.order_by('id')) + list(Course.objects.order_by('id'))
+
+    def test_attach_ratings(self):
+        objects = self.fresh_objects()
+        with self.assertNumQueries(1):
+            attach_ratings(objects)
+        with self.assertNumQueries(0):
+            ratings = [(obj.average_rating, obj.review_count) for obj in objects]
+        self.assertEqual(ratings[:5], [(number + 1, 1) for number in range(5)])
+        self.assertEqual(ratings[5:], [(0, 0)] * 5)
+
+    def test_attach_user_state(self):
+        objects = self.fresh_objects()
+        with self.assertNumQueries(2):
+            attach_user_state(self.user, objects)
+        self.assertEqual([obj.user_review is not None for obj in objects], [True] * 5 + [False] * 5)
+        self.assertEqual([obj.is_favorite for obj in objects], [False] * 5 + [True] * 5)
+
+    def test_rating_refreshes_after_review(self):
+        book = Book.objects.order_by('id').first()
+        self.assertEqual(book.average_rating, 1)
+        add_review(User.objects.create_user('critic'), book, 5)
+        self.assertEqual(book.average_rating, 3)
+        self.assertEqual(book.review_count, 2)
+
+
+class ReviewPaginationTests(TestCase):
+    """Keyset-пагинация отзывов и распределение оценок"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title='Книга', author='Автор', content='Текст')
+        # Одинаковая дата у всех отзывов: порядок и граница страниц задаются id
+        created_at = timezone.now()
+        for number in range(25):
+            add_review(User.objects.create_user(f'reader{number}'), cls.book, number % 5 + 1, f'Отзыв {number}')
+        Review.objects.update(created_at=created_at)
+        cls.content_type = ContentType.objects.get_for_model(Book)
+
+    def test_pages_cover_all_reviews_once(self):
+        seen, cursor = [], None
+        for _ in range(3):
+            reviews, cursor = get_reviews_page(self.content_type, self.book.id, cursor, per_page=10)
+            seen += [review.pk for review in reviews]
+        self.assertIsNone(cursor)
+        self.assertEqual(seen, list(Review.objects.order_by('-created_at', '-id').values_list('pk', flat=True)))
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            get_reviews_page(self.content_type, self.book.id, 'не курсор')
+
+    def test_load_more_endpoint(self):
+        url = reverse('reviews:list', args=['book', self.book.id])
+        response = self.client.get(self.book.get_absolute_url())
+        self.assertEqual(len(response.context['reviews']), REVIEWS_PER_PAGE)
+        cursor = response.context['reviews_cursor']
+
+        data = self.client.get(url, {'cursor': cursor}).json()
+        self.assertEqual(data['html'].count('list-group-item'), 10)
+        data = self.client.get(url, {'cursor': data['next_cursor']}).json()
+        self.assertEqual(data['html'].count('list-group-item'), 5)
+        self.assertIsNone(data['next_cursor'])
+        self.assertEqual(self.client.get(url, {'cursor': '!!!'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('reviews:list', args=['site', 1])).status_code, 404)
+
+    def test_rating_distribution(self):
+        rating = CachedRating.objects.get(content_type=self.content_type, object_id=self.book.id)
+        self.assertEqual(rating.rating_counts, [5, 5, 5, 5, 5])
+        self.assertEqual(rating.distribution()[0], (5, 5, 20))
+
+        Review.objects.filter(rating=1).delete()
+        update_cached_ratings([(self.content_type.id, self.book.id)])
+        rating.refresh_from_db()
+        self.assertEqual(rating.rating_counts, [0, 5, 5, 5, 5])
+        self.assertEqual(rating.review_count, 20)
+
+
+class RatingRankingTests(TestCase):
+    """Байесовский рейтинг «лучшие по оценкам»"""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = [User.objects.create_user(f'voter{number}') for number in range(20)]
+        # Одна пятерка против двадцати оценок со средней 4.5
+        cls.lucky = Book.objects.create(title='Одна пятерка', author='Автор', content='Текст', has_subtitles=True)
+        add_review(users[0], cls.lucky, 5)
+        cls.solid = Book.objects.create(title='Много оценок', author='Автор', content='Текст',
+                                        has_subtitles=True, has_sign_language=True)
+        for number, user in enumerate(users):
+            add_review(user, cls.solid, 5 if number % 2 else 4)
+        # Низкие оценки опускают среднюю по всем книгам (априорную)
+        cls.poor = Book.objects.create(title='Низкие оценки', author='Автор', content='Текст')
+        for user in users:
+            add_review(user, cls.poor, 2)
+        cls.unrated = Book.objects.create(title='Без оценок', author='Автор', content='Текст')
+
+    def setUp(self):
+        rebuild_rankings('book')
+
+    def test_many_votes_beat_single_five(self):
+        self.assertEqual([book.pk for book in top_rated('book')], [self.solid.pk, self.lucky.pk, self.poor.pk])
+        prior_mean = (5 + 90 + 40) / 41
+        self.assertAlmostEqual(
+            top_rated('book')[1].rating_rank.score, bayesian_score(5, 1, prior_mean, settings.RATING_PRIOR_WEIGHT),
+        )
+
+    def test_accessibility_combinations(self):
+        self.assertEqual(RatingRank.objects.filter(object_id=self.solid.pk).count(), 4)
+        self.assertEqual([book.pk for book in top_rated('book', flags=['has_sign_language'])], [self.solid.pk])
+        self.assertEqual(top_rated('book', flags=['has_audio_description']), [])
+        with self.assertNumQueries(2):
+            top_rated('book', flags=['has_subtitles'])
+
+    def test_order_by_rating_lists_rated_objects(self):
+        books = order_by_rating(Book.objects.all())
+        expected = [self.solid.pk, self.lucky.pk, self.poor.pk]
+        self.assertEqual([book.pk for book in books], expected)
+        response = self.client.get(reverse('books:book_list'), {'sort': 'rating'})
+        self.assertEqual([book.pk for book in response.context['page_obj']], expected)
+
+    def test_rebuild_replaces_rows(self):
+        self.solid.delete()
+        rebuild_rankings('book')
+        self.assertEqual([book.pk for book in top_rated('book')], [self.lucky.pk, self.poor.pk])
+        self.assertEqual(RatingRank.objects.count(), 3)
+
+
+class FavoriteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader')
+        cls.other = User.objects.create_user('other')
+        cls.book = Book.objects.create(title='Книга', author='Автор', content='Текст')
+        cls.content_type = ContentType.objects.get_for_model(Book)
+
+    def assertLikes(self, count):
+        self.book.refresh_from_db(fields=['likes_count'])
+        self.assertEqual(self.book.likes_count, count)
+        self.assertEqual(Favorite.objects.filter(content_type=self.content_type, object_id=self.book.pk).count(), count)
+
+    def test_toggle_add_remove_add(self):
+        self.assertIs(toggle_favorite(self.user, self.book), True)
+        self.assertLikes(1)
+        self.assertIs(toggle_favorite(self.user, self.book), False)
+        self.assertLikes(0)
+        self.assertIs(toggle_favorite(self.user, self.book), True)
+        self.assertIs(toggle_favorite(self.other, self.book), True)
+        self.assertLikes(2)
+
+    def test_duplicate_add_keeps_counter(self):
+        set_favorite(self.user, self.book, True)
+        # Запись, вставленная параллельным запросом: INSERT упирается в уникальный индекс
+        Favorite.objects.create(user=self.other, content_type=self.content_type, object_id=self.book.pk)
+        Book.objects.filter(pk=self.book.pk).update(likes_count=2)
+        self.assertIs(set_favorite(self.other, self.book, True), False)
+        self.assertIs(set_favorite(self.user, self.book, True), False)
+        self.assertLikes(2)
+        # Удаление отсутствующей записи не уводит счетчик ниже числа записей
+        self.assertIs(set_favorite(User.objects.create_user('third'), self.book, False), False)
+        self.assertLikes(2)
+
+    def test_recount_favorites(self):
+        set_favorite(self.user, self.book, True)
+        set_favorite(self.other, self.book, True)
+        Book.objects.filter(pk=self.book.pk).update(likes_count=10)
+        recount_favorites(Book)
+        self.assertLikes(2)
+        Favorite.objects.all().delete()
+        recount_favorites(Book)
+        self.assertLikes(0)
+
+    def test_page_of_deleted_films(self):
+        films = [Film.objects.create(title=f'Фильм {number}', slug=f'film-{number}') for number in range(3)]
+        for film in films:
+            set_favorite(self.user, film, True)
+        add_review(self.other, self.book, 5)
+        # У Film нет GenericRelation к избранному - записи остаются после удаления фильмов
+        Film.objects.all().delete()
+        self.assertEqual(Favorite.objects.filter(user=self.user).count(), 3)
+        ContentType.objects.get_for_model(Film)
+        # Страница избранного и фильмы страницы; рейтинги не запрашиваются
+        with self.assertNumQueries(2):
+            page = get_user_favorites(self.user, total=3)
+        self.assertEqual(page.object_list, [])
+
+
+class BulkReviewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'reader{number}') for number in range(3)]
+        cls.books = [Book.objects.create(title=f'Книга {number}', author='Автор', content='Текст') for number in range(2)]
+        cls.content_type = ContentType.objects.get_for_model(Book)
+
+    def review(self, user, book, rating, comment=''):
+        return Review(user=user, content_type=self.content_type, object_id=book.pk, rating=rating, comment=comment)
+
+    def test_upserts_existing_reviews_and_recomputes_ratings(self):
+        first, second = self.books
+        add_review(self.users[0], first, 1, 'Было')
+        count = bulk_add_reviews([
+            self.review(self.users[0], first, 5, 'Стало'),
+            self.review(self.users[1], first, 3),
+            self.review(self.users[2], second, 2),
+            # Повтор внутри набора - побеждает последний
+            self.review(self.users[2], second, 4),
+        ])
+        self.assertEqual(count, 3)
+        self.assertEqual(Review.objects.count(), 3)
+        review = Review.objects.get(user=self.users[0], object_id=first.pk)
+        self.assertEqual((review.rating, review.comment), (5, 'Стало'))
+
+        ratings = {rating.object_id: rating for rating in CachedRating.objects.filter(content_type=self.content_type)}
+        self.assertEqual((ratings[first.pk].average_rating, ratings[first.pk].review_count), (4, 2))
+        self.assertEqual(ratings[first.pk].rating_counts, [0, 0, 1, 0, 1])
+        self.assertEqual((ratings[second.pk].average_rating, ratings[second.pk].review_count), (4, 1))
+
+    def test_invalid_rating_rejected(self):
+        with self.assertRaises(ValidationError):
+            bulk_add_reviews([self.review(self.users[0], self.books[0], 7)])
+        self.assertFalse(Review.objects.exists())
+
+    def test_batched_lookups(self):
+        first, second = self.books
+        course = Course.objects.create(title='Курс', instructor='Преподаватель', description='Описание', duration_hours=5)
+        add_review(self.users[0], first, 4)
+        set_favorite(self.users[0], course, True)
+        objects = [first, second, course]
+        with self.assertNumQueries(1):
+            reviews = reviews_for(self.users[0], objects)
+        self.assertEqual(list(reviews), [first])
+        self.assertEqual(reviews[first].rating, 4)
+        with self.assertNumQueries(1):
+            favorites = favorites_for(self.users[0], objects)
+        self.assertEqual(favorites, {first: False, second: False, course: True})
+        anonymous = AnonymousUser()
+        with self.assertNumQueries(0):
+            self.assertEqual(reviews_for(anonymous, objects), {})
+            self.assertEqual(favorites_for(anonymous, objects), dict.fromkeys(objects, False))
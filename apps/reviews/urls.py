@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+app_name = 'reviews'
+
+urlpatterns = [
+    path('favorite/<str:content_type>/<int:object_id>/', views.favorite, name='favorite'),
+    path('list/<str:content_type>/<int:object_id>/', views.review_list, name='list'),
+]
@@ -1,3 +1,77 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.template.loader import render_to_string
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_GET, require_POST
 
-# Create your views here.
+from .services import (
+    CONTENT_TYPES, FAVORITE_COUNTER_FIELD, get_content_type, get_favorite_count, get_reviews_page,
+    set_favorite, toggle_favorite,
+)
+
+def _wants_json(request):
+    return 'application/json' in request.headers.get('Accept', '')
+
+
+@require_POST
+def favorite(request, content_type, object_id):
+    """
+    Добавление/удаление из избранного.
+
+    Параметр favorite=1/0 задает нужное состояние (повторный запрос
+    ничего не меняет), без него состояние переключается.
+    Для fetch-запросов (Accept: application/json) отвечает JSON
+    {"favorite": bool, "count": int}, иначе возвращает на страницу.
+    """
+    # В избранное добавляются те же типы, что и отзывы (services.CONTENT_TYPES)
+    if content_type not in CONTENT_TYPES:
+        raise Http404('Неизвестный тип контента')
+    if not request.user.is_authenticated:
+        if _wants_json(request):
+            return JsonResponse({'error': 'Требуется вход', 'login_url': settings.LOGIN_URL}, status=401)
+        return redirect_to_login(request.POST.get('next') or request.get_full_path())
+
+    model = get_content_type(content_type).model_class()
+    obj = get_object_or_404(model._default_manager.only('pk'), pk=object_id)
+
+    value = request.POST.get('favorite')
+    if value in ('0', '1'):
+        is_favorite = value == '1'
+        set_favorite(request.user, obj, is_favorite)
+    else:
+        is_favorite = toggle_favorite(request.user, obj)
+
+    if _wants_json(request):
+        obj.refresh_from_db(fields=[FAVORITE_COUNTER_FIELD])
+        return JsonResponse({'favorite': is_favorite, 'count': get_favorite_count(obj)})
+
+    if is_favorite:
+        messages.success(request, 'Добавлено в избранное.')
+    else:
+        messages.success(request, 'Удалено из избранного.')
+    next_url = request.POST.get('next')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        next_url = obj.get_absolute_url()
+    return redirect(next_url)
+
+
+@require_GET
+def review_list(request, content_type, object_id):
+    """
+    Следующая страница отзывов объекта для кнопки «Показать еще».
+
+    Параметр cursor - курсор из предыдущего ответа (или из страницы
+    объекта). Отвечает JSON {"html": str, "next_cursor": str | null}:
+    html - готовые элементы списка (reviews/partials/review_items.html).
+    """
+    if content_type not in CONTENT_TYPES:
+        raise Http404('Неизвестный тип контента')
+    try:
+        reviews, next_cursor = get_reviews_page(get_content_type(content_type), object_id, request.GET.get('cursor'))
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    html = render_to_string('reviews/partials/review_items.html', {'reviews': reviews}, request)
+    return JsonResponse({'html': html, 'next_cursor': next_cursor})
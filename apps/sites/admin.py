@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import SiteCategory, Site
+from main.thumbnails import thumbnail_url
+from .models import SiteCategory, Site, SiteVisitDay
 
 @admin.register(SiteCategory)
 class SiteCategoryAdmin(admin.ModelAdmin):
@@ -41,6 +42,20 @@ class SiteAdmin(admin.ModelAdmin):
 
     def logo_preview(self, obj):
         if obj.logo:
-            return format_html('<img src="{}" style="width: 50px; height: 50px; object-fit: contain;" />', obj.logo.url)
+            return format_html('<img src="{}" style="width: 50px; height: 50px; object-fit: contain;" />', thumbnail_url(obj.logo, 100))
         return "Нет лого"
     logo_preview.short_description = 'Лого'
+
+@admin.register(SiteVisitDay)
+class SiteVisitDayAdmin(admin.ModelAdmin):
+    list_display = ['site', 'day', 'visits']
+    list_filter = ['site__category']
+    search_fields = ['site__title']
+    date_hierarchy = 'day'
+    list_select_related = ['site']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
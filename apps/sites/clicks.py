@@ -0,0 +1,103 @@
+# apps/sites/clicks.py
+"""
+Учет переходов на внешние сайты (/sites/<slug>/go/) без записи в запросе.
+
+redirect_to_site только добавляет переход в буфер процесса и сразу
+отвечает редиректом. Буфер записывается одним bulk_create в журнал
+SiteClick (только вставки - без блокировок строки Site) фоновым потоком
+процесса (main/buffers.py): раз в SITE_CLICK_FLUSH_INTERVAL секунд, раньше -
+при SITE_CLICK_BUFFER_SIZE накопленных переходах, и при штатном завершении
+процесса. При аварийной остановке теряются только переходы, накопленные
+с последней записи.
+
+rollup_clicks() (manage.py rollup_site_clicks, по расписанию) переносит
+журнал в Site.visits_count и дневную статистику SiteVisitDay и удаляет
+перенесенные строки.
+"""
+import logging
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from main.buffers import PeriodicBuffer
+from .models import Site, SiteClick, SiteVisitDay
+
+logger = logging.getLogger(__name__)
+
+
+class ClickBuffer(PeriodicBuffer):
+    """Переходы (id сайта, время) в памяти процесса с записью пакетами в SiteClick"""
+    interval_setting = 'SITE_CLICK_FLUSH_INTERVAL'
+    default_interval = 10
+    size_setting = 'SITE_CLICK_BUFFER_SIZE'
+    default_size = 500
+
+    def new(self):
+        return []
+
+    def add(self, site_id):
+        with self.lock:
+            self.pending.append((site_id, timezone.now()))
+            size = len(self.pending)
+        self.added(size)
+
+    def write(self, clicks):
+        # Сайт мог быть удален, пока переход ждал в буфере
+        existing = set(Site.objects.filter(pk__in={site_id for site_id, _ in clicks}).values_list('pk', flat=True))
+        rows = [SiteClick(site_id=site_id, clicked_at=clicked_at) for site_id, clicked_at in clicks if site_id in existing]
+        SiteClick.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+
+buffer = ClickBuffer()
+
+
+def record_click(site_id):
+    """Учитывает переход на сайт (запись в базу - позже, пакетом)"""
+    buffer.add(site_id)
+
+
+def flush_clicks():
+    return buffer.flush()
+
+
+def _add_visits(site_id, day, visits):
+    days = SiteVisitDay.objects.filter(site_id=site_id, day=day)
+    if days.update(visits=F('visits') + visits):
+        return
+    try:
+        with transaction.atomic():
+            SiteVisitDay.objects.create(site_id=site_id, day=day, visits=visits)
+    except IntegrityError:
+        # Строку дня только что создал другой процесс
+        days.update(visits=F('visits') + visits)
+
+
+def rollup_clicks():
+    """
+    Переносит журнал переходов в Site.visits_count и SiteVisitDay (дни -
+    в TIME_ZONE) и удаляет перенесенные строки. Возвращает число переходов.
+    """
+    last_id = SiteClick.objects.aggregate(last=Max('id'))['last']
+    if last_id is None:
+        return 0
+    clicks = SiteClick.objects.filter(id__lte=last_id)
+    with transaction.atomic():
+        per_day = clicks.annotate(day=TruncDate('clicked_at')).values('site_id', 'day').annotate(visits=Count('id')).order_by()
+        totals = Counter()
+        for row in per_day:
+            _add_visits(row['site_id'], row['day'], row['visits'])
+            totals[row['site_id']] += row['visits']
+        for site_id, visits in totals.items():
+            Site.objects.filter(pk=site_id).update(visits_count=F('visits_count') + visits)
+        deleted, _ = clicks.delete()
+        if deleted != sum(totals.values()):
+            # Параллельный перенос или переход, записанный между подсчетом и удалением:
+            # откат, строки будут перенесены при следующем запуске
+            transaction.set_rollback(True)
+            logger.warning('Перенос журнала переходов отменен: журнал изменился во время переноса')
+            return 0
+    return deleted
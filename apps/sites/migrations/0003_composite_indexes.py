@@ -0,0 +1,21 @@
+# Generated by Django 6.0.2 on 2026-10-19 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sites', '0002_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='site',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-is_featured', 'title'], name='site_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='site',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['category', '-is_featured', 'title'], name='site_category_idx'),
+        ),
+    ]
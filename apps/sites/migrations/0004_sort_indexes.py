@@ -0,0 +1,41 @@
+# Generated by Django 6.0.2 on 2026-10-19 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sites', '0003_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='site',
+            name='site_published_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='site',
+            name='site_category_idx',
+        ),
+        migrations.AddIndex(
+            model_name='site',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-is_featured', 'title', 'id'], name='site_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='site',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['category', '-is_featured', 'title', 'id'], name='site_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='site',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['title', 'id'], name='site_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='site',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-visits_count', '-id'], name='site_visits_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='site',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-created_at', '-id'], name='site_created_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0.2 on 2026-10-19 14:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sites', '0004_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SiteClick',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clicked_at', models.DateTimeField(verbose_name='Время перехода')),
+                ('site', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='sites.site', verbose_name='Сайт')),
+            ],
+            options={
+                'verbose_name': 'Переход на сайт',
+                'verbose_name_plural': 'Журнал переходов',
+            },
+        ),
+        migrations.CreateModel(
+            name='SiteVisitDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('visits', models.PositiveIntegerField(default=0, verbose_name='Переходы')),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visit_days', to='sites.site', verbose_name='Сайт')),
+            ],
+            options={
+                'verbose_name': 'Переходы за день',
+                'verbose_name_plural': 'Переходы по дням',
+                'ordering': ['-day', 'site'],
+                'unique_together': {('site', 'day')},
+            },
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.urls import reverse
+from main import thumbnails
 
 class SiteCategory(models.Model):
     """Категории сайтов (например: Госуслуги, Образование, Здравоохранение)"""
@@ -55,9 +56,58 @@ class Site(models.Model):
         verbose_name = 'Сайт'
         verbose_name_plural = 'Сайты'
         ordering = ['-is_featured', 'title']
+        # Частичные индексы по опубликованным сайтам в порядке ordering и сортировок
+        # списка (views.SITE_SORTS); рекомендуемые идут первыми, поэтому их выборка
+        # тоже берется из site_published_idx
+        indexes = [
+            models.Index(fields=['-is_featured', 'title', 'id'], condition=models.Q(is_published=True),
+                         name='site_published_idx'),
+            models.Index(fields=['category', '-is_featured', 'title', 'id'], condition=models.Q(is_published=True),
+                         name='site_category_idx'),
+            models.Index(fields=['title', 'id'], condition=models.Q(is_published=True),
+                         name='site_title_idx'),
+            models.Index(fields=['-visits_count', '-id'], condition=models.Q(is_published=True),
+                         name='site_visits_idx'),
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(is_published=True),
+                         name='site_created_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
     def get_absolute_url(self):
         return reverse('sites:detail', args=[self.slug])
+
+
+class SiteClick(models.Model):
+    """Переход на сайт (журнал только для добавления, см. apps/sites/clicks.py)"""
+    # Без индекса по сайту: журнал короткий (сворачивается rollup_site_clicks),
+    # а каждая вставка не обновляет лишний индекс
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, db_index=False, verbose_name='Сайт')
+    clicked_at = models.DateTimeField('Время перехода')
+
+    class Meta:
+        verbose_name = 'Переход на сайт'
+        verbose_name_plural = 'Журнал переходов'
+
+    def __str__(self):
+        return f'{self.site_id} {self.clicked_at:%Y-%m-%d %H:%M}'
+
+
+class SiteVisitDay(models.Model):
+    """Переходы на сайт за день (из журнала SiteClick)"""
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name='visit_days', verbose_name='Сайт')
+    day = models.DateField('День')
+    visits = models.PositiveIntegerField('Переходы', default=0)
+
+    class Meta:
+        unique_together = ('site', 'day')
+        verbose_name = 'Переходы за день'
+        verbose_name_plural = 'Переходы по дням'
+        ordering = ['-day', 'site']
+
+    def __str__(self):
+        return f'{self.site} {self.day}: {self.visits}'
+
+
+thumbnails.register(Site, 'logo')
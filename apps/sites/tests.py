@@ -1,3 +1,120 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
 
-# Create your tests here.
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from main.testing import QueryBudgetMixin
+from .clicks import buffer, flush_clicks, record_click, rollup_clicks
+from .models import Site, SiteCategory, SiteClick, SiteVisitDay
+
+
+class SiteQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Число запросов страниц сайтов не зависит от числа сайтов и категорий"""
+
+    def seed_sites(self, count):
+        for number in range(count):
+            number = Site.objects.count()
+            category = SiteCategory.objects.create(name=f'Категория {number}', slug=f'category-{number}')
+            Site.objects.create(
+                title=f'Сайт {number}', slug=f'site-{number}', url=f'https://example.com/{number}',
+                category=category, description='Описание', is_featured=number % 2 == 0,
+            )
+
+    def test_site_list(self):
+        self.assertConstantQueries('/sites/', self.seed_sites, budget=8)
+
+    def test_site_detail(self):
+        category = SiteCategory.objects.create(name='Госуслуги', slug='gov')
+        site = Site.objects.create(title='Портал', slug='portal', url='https://example.com', category=category,
+                                   description='Описание')
+
+        def seed_similar(count):
+            for number in range(count):
+                number = Site.objects.count()
+                Site.objects.create(title=f'Сайт {number}', slug=f'site-{number}', url='https://example.com',
+                                    category=category, description='Описание')
+
+        self.assertConstantQueries(f'/sites/{site.slug}/', seed_similar, budget=6)
+
+
+@override_settings(SITE_CLICK_FLUSH_INTERVAL=None)
+class SiteClickTests(TestCase):
+    def setUp(self):
+        category = SiteCategory.objects.create(name='Госуслуги', slug='gov')
+        self.site = Site.objects.create(title='Портал', slug='portal', url='https://example.com', category=category,
+                                        description='Описание', visits_count=5)
+
+    def test_redirect_does_not_write(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/sites/portal/go/')
+        self.assertRedirects(response, 'https://example.com', fetch_redirect_response=False)
+        self.assertEqual(flush_clicks(), 1)
+        self.assertEqual(SiteClick.objects.count(), 1)
+        self.site.refresh_from_db()
+        self.assertEqual(self.site.visits_count, 5)
+
+    def test_rollup_counts_visits_per_day(self):
+        today = timezone.now()
+        SiteClick.objects.bulk_create([
+            SiteClick(site=self.site, clicked_at=today),
+            SiteClick(site=self.site, clicked_at=today),
+            SiteClick(site=self.site, clicked_at=today - timedelta(days=1)),
+        ])
+        self.assertEqual(rollup_clicks(), 3)
+        SiteClick.objects.create(site=self.site, clicked_at=today)
+        self.assertEqual(rollup_clicks(), 1)
+
+        self.site.refresh_from_db()
+        self.assertEqual(self.site.visits_count, 9)
+        self.assertEqual(
+            list(SiteVisitDay.objects.values_list('day', 'visits')),
+            [(timezone.localdate(today), 3), (timezone.localdate(today - timedelta(days=1)), 1)],
+        )
+        self.assertFalse(SiteClick.objects.exists())
+        self.assertEqual(rollup_clicks(), 0)
+
+    def test_flush_skips_deleted_sites(self):
+        self.client.get('/sites/portal/go/')
+        self.site.delete()
+        self.assertEqual(flush_clicks(), 0)
+
+
+class SiteClickFlushTests(TransactionTestCase):
+    """Фоновая запись журнала переходов (в остальных тестах отключена)"""
+
+    def setUp(self):
+        category = SiteCategory.objects.create(name='Госуслуги', slug='gov')
+        self.site = Site.objects.create(title='Портал', slug='portal', url='https://example.com', category=category,
+                                        description='Описание')
+        # Выполняется после отмены настроек: разбуженный поток видит интервал None и завершается
+        self.addCleanup(self.stop_thread)
+        self.enterContext(override_settings(SITE_CLICK_FLUSH_INTERVAL=60, SITE_CLICK_BUFFER_SIZE=2))
+
+    def stop_thread(self):
+        buffer._wakeup.set()
+        if buffer._thread is not None:
+            buffer._thread.join(5)
+
+    def wait_for_flush(self, timeout=5):
+        # База в памяти общая с потоком записи: опрос таблицы во время записи
+        # упирается в блокировку, поэтому ждем сам буфер
+        deadline = time.monotonic() + timeout
+        while buffer.pending and time.monotonic() < deadline:
+            time.sleep(0.02)
+        # Буфер уже забран - запись держит _flush_lock до конца bulk_create
+        with buffer._flush_lock:
+            pass
+
+    def test_full_buffer_is_written_without_waiting(self):
+        record_click(self.site.pk)
+        time.sleep(0.2)
+        self.assertEqual(len(buffer.pending), 1)
+        record_click(self.site.pk)
+        self.wait_for_flush()
+        self.assertEqual(SiteClick.objects.count(), 2)
+
+    def test_written_at_exit(self):
+        record_click(self.site.pk)
+        buffer._flush_at_exit()
+        self.assertEqual(SiteClick.objects.count(), 1)
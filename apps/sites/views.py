@@ -1,35 +1,77 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Q, Count
+from django.db.models import Q, Count, Max, F
 from django.core.paginator import Paginator
+from main.cache import cache_page_anonymous, cache_version, get_timeout
+from main.conditional import conditional_page, latest
+from main.search import search_queryset, uses_postgres_search
+from main.sorting import SortOption, SortRegistry
+from .clicks import record_click
 from .models import Site, SiteCategory
 
+# Сортировки каталога (?sort=); частичные индексы по опубликованным - в Site.Meta.indexes
+SITE_SORTS = SortRegistry({
+    'featured': SortOption('Рекомендуемые', ('-is_featured', 'title', 'id')),
+    'title': SortOption('По названию', ('title', 'id')),
+    'popular': SortOption('Популярные', ('-visits_count', '-id')),
+    'new': SortOption('Новые', ('-created_at', '-id')),
+}, default='featured')
+SITES_PER_PAGE = 12  # сайтов на странице каталога
+
+
+def sites_last_modified(request):
+    """Последнее изменение каталога сайтов"""
+    sites = Site.objects.aggregate(latest=Max('updated_at'), count=Count('id'))
+    return sites['latest'], (sites['count'], SiteCategory.objects.count())
+
+def site_last_modified(request, slug):
+    """Последнее изменение страницы сайта (с учетом похожих сайтов)"""
+    site = Site.objects.filter(slug=slug, is_published=True).values('category_id', 'updated_at').first()
+    if site is None:
+        return None
+    similar = Site.objects.filter(category_id=site['category_id']).aggregate(latest=Max('updated_at'), count=Count('id'))
+    return latest(site['updated_at'], similar['latest']), similar['count']
+
+def count_site_visit(request, slug):
+    """Увеличивает счетчик переходов"""
+    Site.objects.filter(slug=slug).update(visits_count=F('visits_count') + 1)
+
+def site_list_queryset(category_slug=None):
+    """Опубликованные сайты каталога до поиска и сортировки (представление и index_audit)"""
+    sites = Site.objects.filter(is_published=True).select_related('category')
+    if category_slug:
+        sites = sites.filter(category__slug=category_slug)
+    return sites
+
+def featured_sites_queryset(limit=5):
+    """Рекомендуемые сайты над каталогом"""
+    return Site.objects.filter(is_featured=True, is_published=True)[:limit]
+
+@conditional_page(sites_last_modified, has_counters=True)
+@cache_page_anonymous('site')
 def site_list(request):
     """Главная страница со списком государственных сайтов"""
     category_slug = request.GET.get('category')
     query = request.GET.get('q', '')
 
-    sites = Site.objects.filter(is_published=True)
+    sites = site_list_queryset(category_slug)
 
     # Поиск
     if query:
-        sites = sites.filter(
-            Q(title__icontains=query) |
-            Q(description__icontains=query) |
-            Q(url__icontains=query)
-        )
+        sites = search_queryset(sites, query, extra_q=Q(url__icontains=query))
 
-    # Фильтр по категории
-    if category_slug:
-        sites = sites.filter(category__slug=category_slug)
+    # Сортировка (результаты поиска на PostgreSQL без явной сортировки - по релевантности)
+    sort = ''
+    if request.GET.get('sort') or not (query and uses_postgres_search()):
+        sites, sort = SITE_SORTS.apply(sites, request.GET.get('sort'))
 
     # Категории для фильтра
     categories = SiteCategory.objects.annotate(sites_count=Count('sites'))
 
     # Рекомендуемые сайты
-    featured_sites = Site.objects.filter(is_featured=True, is_published=True)[:5]
+    featured_sites = featured_sites_queryset()
 
     # Пагинация
-    paginator = Paginator(sites, 12)
+    paginator = Paginator(sites, SITES_PER_PAGE)
     page = request.GET.get('page')
     sites_page = paginator.get_page(page)
 
@@ -38,17 +80,22 @@ def site_list(request):
         'categories': categories,
         'featured_sites': featured_sites,
         'current_category': category_slug,
+        'sort_options': SITE_SORTS.choices(),
+        'current_sort': sort,
         'query': query,
+        'cache_version': cache_version('site'),
+        'cache_timeout': get_timeout(),
     }
     return render(request, 'sites/list.html', context)
 
+@conditional_page(site_last_modified, has_counters=True, on_not_modified=count_site_visit)
 def site_detail(request, slug):
     """Детальная страница сайта"""
     site = get_object_or_404(Site, slug=slug, is_published=True)
 
     # Увеличиваем счетчик
+    count_site_visit(request, slug)
     site.visits_count += 1
-    site.save(update_fields=['visits_count'])
 
     # Похожие сайты
     similar_sites = Site.objects.filter(
@@ -63,7 +110,7 @@ def site_detail(request, slug):
     return render(request, 'sites/detail.html', context)
 
 def redirect_to_site(request, slug):
-    site = get_object_or_404(Site, slug=slug)
-    site.visits_count += 1
-    site.save(update_fields=['visits_count'])
+    """Переход на сайт: учитывается в журнале (apps/sites/clicks.py), без записи в базу в запросе"""
+    site = get_object_or_404(Site.objects.only('url'), slug=slug)
+    record_click(site.pk)
     return redirect(site.url)
@@ -1,3 +1,17 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import LinkCheck
+
+
+@admin.register(LinkCheck)
+class LinkCheckAdmin(admin.ModelAdmin):
+    list_display = ['url', 'content_type', 'object_id', 'status', 'latency_ms', 'error', 'failures', 'checked_at']
+    list_filter = ['is_alive', 'content_type']
+    search_fields = ['url']
+    date_hierarchy = 'checked_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class MainConfig(AppConfig):
     name = 'main'
+
+    def ready(self):
+        from . import autocomplete, cache, trending
+        cache.connect_signals()
+        trending.connect_signals()
+        autocomplete.connect_signals()
@@ -0,0 +1,281 @@
+# main/autocomplete.py
+"""
+Подсказки поиска по мере ввода (/search/autocomplete/?q=...).
+
+Названия книг, фильмов, курсов, опубликованных сайтов и имена актеров и
+режиссеров хранятся в памяти процесса одним отсортированным списком
+ключей (нормализованный текст, вид, id). Подсказки по префиксу - bisect
+и просмотр соседних ключей, без запросов к базе. Ключи строятся от
+начала названия и от начала каждого следующего слова: «мир» находит
+«Война и мир».
+
+Если по префиксу ничего нет, проверяются все варианты запроса с одной
+опечаткой (замена, пропуск, лишняя или переставленная буква) - тоже
+через bisect, по одному на вариант.
+
+Индекс строится при первом обращении (в WSGI/ASGI-процессе - сразу при
+старте, см. preload), сигналы сохранения и удаления исправляют его
+точечно после фиксации транзакции. Изменения, сделанные другими процессами, появляются после
+полной перестройки в фоне раз в AUTOCOMPLETE_MAX_AGE секунд.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from functools import partial
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.urls import reverse
+
+# Вид подсказки -> (модель, поле текста, поле для URL, имя URL или None - поиск фильмов, фильтр)
+SOURCES = {
+    'book': ('books.Book', 'title', 'pk', 'books:book_detail', {}),
+    'film': ('films.Film', 'title', 'slug', 'films:detail', {}),
+    'course': ('education.Course', 'title', 'pk', 'education:course_detail', {}),
+    'site': ('sites.Site', 'title', 'slug', 'sites:detail', {'is_published': True}),
+    'actor': ('films.Actor', 'name', 'pk', None, {}),
+    'director': ('films.Director', 'name', 'pk', None, {}),
+}
+
+# Подписи видов в подсказках
+LABELS = {
+    'book': 'Книга', 'film': 'Фильм', 'course': 'Курс', 'site': 'Сайт',
+    'actor': 'Актер', 'director': 'Режиссер',
+}
+
+# Слов названия, с которых начинаются ключи (дальше - редкие длинные названия)
+MAX_WORDS = 8
+
+# Сколько ключей после найденной позиции просматривается ради подсказок с начала названия
+SCAN_LIMIT = 200
+
+NON_WORD = re.compile(r'[\W_]+')
+
+
+def normalize(text):
+    """Ключ сравнения: нижний регистр, ё -> е, слова через один пробел"""
+    return NON_WORD.sub(' ', text.casefold().replace('ё', 'е')).strip()
+
+
+def word_keys(text):
+    """Ключи названия: с начала и с каждого следующего слова"""
+    words = normalize(text).split(' ')
+    return [' '.join(words[start:]) for start in range(min(len(words), MAX_WORDS)) if words[start]]
+
+
+class AutocompleteIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+        self.keys = []       # отсортированные (ключ, вид, id)
+        self.objects = {}    # (вид, id) -> (текст, значение для URL, ключи)
+        self.loaded_at = None
+        self.rebuilding = False
+
+    def clear(self):
+        """Сбрасывает индекс: следующее обращение построит его заново"""
+        with self.lock:
+            self.keys, self.objects, self.loaded_at = [], {}, None
+
+    def build(self):
+        """Полная перестройка из базы; пока она идет, отвечает прежний индекс"""
+        from django.apps import apps
+        keys, objects = [], {}
+        for kind, (label, text_field, url_field, _, filters) in SOURCES.items():
+            model = apps.get_model(label)
+            for pk, text, url_value in model._default_manager.filter(**filters).values_list(
+                'pk', text_field, url_field,
+            ).iterator(chunk_size=5000):
+                object_keys = word_keys(text)
+                objects[(kind, pk)] = (text, url_value, object_keys)
+                keys.extend((key, kind, pk) for key in object_keys)
+        keys.sort()
+        with self.lock:
+            self.keys, self.objects = keys, objects
+            self.loaded_at = time.monotonic()
+
+    def ensure_loaded(self):
+        if self.loaded_at is None:
+            # Первый запрос строит индекс, одновременные ждут его
+            with self.build_lock:
+                if self.loaded_at is None:
+                    self.build()
+            return
+        max_age = getattr(settings, 'AUTOCOMPLETE_MAX_AGE', 15 * 60)
+        if max_age is not None and time.monotonic() - self.loaded_at >= max_age and not self.rebuilding:
+            self.rebuilding = True
+            threading.Thread(target=self._rebuild_in_background, daemon=True).start()
+
+    def _rebuild_in_background(self):
+        try:
+            with self.build_lock:
+                self.build()
+        finally:
+            self.rebuilding = False
+            connection.close()
+
+    def update(self, kind, pk, text, url_value):
+        """Заменяет ключи объекта (text=None - удаляет объект)"""
+        if self.loaded_at is None:
+            return
+        with self.lock:
+            old = self.objects.pop((kind, pk), None)
+            if old is not None:
+                for key in old[2]:
+                    position = bisect_left(self.keys, (key, kind, pk))
+                    if position < len(self.keys) and self.keys[position] == (key, kind, pk):
+                        del self.keys[position]
+            if text is None:
+                return
+            object_keys = word_keys(text)
+            self.objects[(kind, pk)] = (text, url_value, object_keys)
+            for key in object_keys:
+                insort(self.keys, (key, kind, pk))
+
+    def _prefix_matches(self, prefix, limit, found, kinds):
+        """Добавляет в found (вид, id) с ключом на prefix; сначала совпадения с начала названия"""
+        keys = self.keys
+        position = bisect_left(keys, (prefix,))
+        later = []
+        for key, kind, pk in keys[position:position + SCAN_LIMIT]:
+            if not key.startswith(prefix):
+                break
+            if kinds and kind not in kinds:
+                continue
+            entry = self.objects.get((kind, pk))
+            # Объект мог быть удален сигналом во время просмотра
+            if entry is None or (kind, pk) in found or (kind, pk) in later:
+                continue
+            if key == entry[2][0]:
+                found.append((kind, pk))
+                if len(found) >= limit:
+                    return
+            else:
+                later.append((kind, pk))
+        found.extend(later[:limit - len(found)])
+
+    def _next_chars(self, head):
+        """Символы, которые следуют за head в ключах индекса (по bisect на символ)"""
+        keys = self.keys
+        chars = []
+        position = bisect_left(keys, (head,))
+        while position < len(keys) and keys[position][0].startswith(head):
+            key = keys[position][0]
+            if len(key) == len(head):
+                position += 1
+                continue
+            char = key[len(head)]
+            chars.append(char)
+            position = bisect_left(keys, (head + chr(ord(char) + 1),))
+        return chars
+
+    def typo_variants(self, query):
+        """
+        Варианты query с одной опечаткой, с которых начинается хотя бы
+        один ключ: вставляются и подставляются только символы, которые
+        встречаются в индексе после той же начальной части.
+        """
+        variants = {}
+        for i in range(len(query) + 1):
+            head, tail = query[:i], query[i:]
+            if tail:
+                variants[head + tail[1:]] = None
+                if len(tail) > 1:
+                    variants[head + tail[1] + tail[0] + tail[2:]] = None
+            for char in self._next_chars(head):
+                variants[head + char + tail] = None
+                if tail and char != tail[0]:
+                    variants[head + char + tail[1:]] = None
+        variants.pop(query, None)
+        return list(variants)
+
+    def suggest(self, query, limit=10, kinds=None):
+        """Подсказки для query: список (вид, id, текст, значение для URL); kinds - только эти виды"""
+        self.ensure_loaded()
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        found = []
+        self._prefix_matches(prefix, limit, found, kinds)
+        # Опечатка: только для запросов от трех символов, иначе вариантов слишком много
+        if not found and len(prefix) >= 3:
+            for variant in self.typo_variants(prefix):
+                self._prefix_matches(variant, limit, found, kinds)
+                if len(found) >= limit:
+                    break
+        result = []
+        for kind, pk in found[:limit]:
+            # Объект мог быть удален между поиском и чтением
+            entry = self.objects.get((kind, pk))
+            if entry is not None:
+                result.append((kind, pk, entry[0], entry[1]))
+        return result
+
+
+index = AutocompleteIndex()
+
+
+def suggestion_url(kind, url_value, text):
+    url_name = SOURCES[kind][3]
+    if url_name is None:
+        # У актеров и режиссеров нет страниц - поиск фильмов с ними
+        return reverse('films:search') + '?' + urlencode({'q': text})
+    return reverse(url_name, args=[url_value])
+
+
+def suggest(query, limit=10, kinds=None):
+    """Подсказки для ответа JSON: [{'type', 'label', 'id', 'title', 'url'}]"""
+    return [
+        {'type': kind, 'label': LABELS[kind], 'id': pk, 'title': text, 'url': suggestion_url(kind, url_value, text)}
+        for kind, pk, text, url_value in index.suggest(query, limit, kinds)
+    ]
+
+
+def preload():
+    """Строит индекс в фоне при старте веб-процесса (до первого запроса подсказок)"""
+    def load():
+        try:
+            index.ensure_loaded()
+        except DatabaseError:
+            # База еще не создана (первый запуск до migrate) - индекс построится по запросу
+            pass
+        finally:
+            connection.close()
+    threading.Thread(target=load, daemon=True).start()
+
+
+def _source_for(sender):
+    for kind, (label, text_field, url_field, _, filters) in SOURCES.items():
+        if sender._meta.label == label:
+            return kind, text_field, url_field, filters
+    return None
+
+
+def _on_save(sender, instance, raw=False, update_fields=None, using=None, **kwargs):
+    if raw:
+        return
+    kind, text_field, url_field, filters = _source_for(sender)
+    # Сохранение счетчиков (views_count и т.п.) подсказок не меняет
+    if update_fields and not {text_field, url_field, *filters} & set(update_fields):
+        return
+    visible = all(getattr(instance, field) == value for field, value in filters.items())
+    text = getattr(instance, text_field) if visible else None
+    # Только после фиксации: откаченное сохранение не должно попасть в индекс
+    transaction.on_commit(partial(index.update, kind, instance.pk, text, getattr(instance, url_field)), using=using)
+
+
+def _on_delete(sender, instance, using=None, **kwargs):
+    kind = _source_for(sender)[0]
+    transaction.on_commit(partial(index.update, kind, instance.pk, None, None), using=using)
+
+
+def connect_signals():
+    """Подключает точечное обновление индекса к сохранению и удалению моделей"""
+    from django.apps import apps
+    for kind, (label, *_) in SOURCES.items():
+        model = apps.get_model(label)
+        post_save.connect(_on_save, sender=model, dispatch_uid=f'autocomplete_{kind}')
+        post_delete.connect(_on_delete, sender=model, dispatch_uid=f'autocomplete_{kind}')
@@ -0,0 +1,98 @@
+# main/buffers.py
+"""
+Буферы событий в памяти процесса с записью в базу пакетами.
+
+Счетчики «популярного» (main/trending.py) и журнал переходов на сайты
+(apps/sites/clicks.py) не пишут в базу в запросе: события копятся в
+памяти, а фоновый поток процесса записывает их раз в интервал, раньше -
+если буфер достиг заданного размера, и при штатном завершении процесса
+(atexit). При аварийной остановке теряются только события за последний
+интервал.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicBuffer:
+    """
+    Основа буфера: pending - накопленные данные (пустые - new()),
+    write(pending) записывает их в базу. Подкласс добавляет данные под
+    self.lock и затем вызывает added() с размером буфера.
+    """
+    # Настройка интервала записи в секундах; None в ней - только явный flush() (тесты)
+    interval_setting = None
+    default_interval = 60
+    # Настройка размера, при котором запись не ждет интервала (None - без ограничения)
+    size_setting = None
+    default_size = None
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = self.new()
+        self._flush_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._thread = None
+        self._wakeup = threading.Event()
+        atexit.register(self._flush_at_exit)
+
+    def new(self):
+        raise NotImplementedError
+
+    def write(self, pending):
+        raise NotImplementedError
+
+    def get_interval(self):
+        return getattr(settings, self.interval_setting, self.default_interval)
+
+    def get_size(self):
+        return getattr(settings, self.size_setting, self.default_size) if self.size_setting else None
+
+    def added(self, size):
+        """Запускает фоновую запись (при первом событии процесса) и будит ее по размеру буфера"""
+        if self.get_interval() is None:
+            return
+        # После fork (gunicorn --preload) потока в процессе нет - запускается заново
+        if self._thread is None or not self._thread.is_alive():
+            with self._thread_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(
+                        target=self._run, name=f'{type(self).__name__}-flush', daemon=True,
+                    )
+                    self._thread.start()
+        limit = self.get_size()
+        if limit is not None and size >= limit:
+            self._wakeup.set()
+
+    def _run(self):
+        while (interval := self.get_interval()) is not None:
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Не удалось записать буфер %s', type(self).__name__)
+            finally:
+                connection.close()
+
+    def flush(self):
+        """Записывает накопленное; возвращает результат write() или 0, если записывать нечего"""
+        with self._flush_lock:
+            with self.lock:
+                pending, self.pending = self.pending, self.new()
+            if not pending:
+                return 0
+            return self.write(pending)
+
+    def _flush_at_exit(self):
+        if self.get_interval() is None:
+            return
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Не удалось записать буфер %s при завершении процесса', type(self).__name__)
@@ -0,0 +1,195 @@
+# main/cache.py
+"""
+Кэширование фрагментов шаблонов и страниц с инвалидацией по тегам.
+
+Каждому тегу ('book', 'film', 'course', 'site', 'forum') соответствует
+номер версии в кэше. Ключи записей включают версии своих тегов, поэтому
+при изменении модели достаточно сменить версию тега: старые записи
+перестают использоваться и вытесняются по таймауту.
+
+Бэкенд кэша (local-memory, файловый или Redis) задается в settings.CACHES.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.http import HttpResponse
+
+VERSION_PREFIX = 'tagver:'
+
+# модель -> тег, версия которого меняется при ее сохранении/удалении
+TAGGED_MODELS = {
+    'books.Book': 'book',
+    'films.Film': 'film',
+    'films.FilmCollection': 'film',
+    'films.Genre': 'film',
+    'education.Course': 'course',
+    'sites.Site': 'site',
+    'sites.SiteCategory': 'site',
+    'forum.ForumCategory': 'forum',
+    'forum.ForumTopic': 'forum',
+    'forum.ForumPost': 'forum',
+}
+
+# Счетчики просмотров/переходов меняются на каждый запрос -
+# их обновление не сбрасывает кэш (устаревание ограничено таймаутом)
+COUNTER_FIELDS = {'views', 'views_count', 'likes_count', 'visits_count'}
+
+# Заголовки, которые сохраняются вместе с закэшированной страницей
+# (Last-Modified карты сайта и лент, X-Robots-Tag разделов карты сайта)
+CACHED_HEADERS = ('Content-Type', 'Last-Modified', 'X-Robots-Tag')
+
+
+def get_cache():
+    return caches[getattr(settings, 'PAGE_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'PAGE_CACHE_TIMEOUT', 600)
+
+
+def _new_version():
+    # Монотонно растущее значение: если ключ версии вытеснен из кэша,
+    # новая версия не совпадет ни с одной из прежних
+    return int(time.time() * 1000)
+
+
+def cache_version(*tags):
+    """Строка версий тегов для включения в ключ кэша, например '17..:42..'"""
+    cache = get_cache()
+    keys = [VERSION_PREFIX + tag for tag in tags]
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return ':'.join(str(versions[key]) for key in keys)
+
+
+def invalidate(*tags):
+    """Сбрасывает все записи, зависящие от указанных тегов"""
+    cache = get_cache()
+    for tag in tags:
+        key = VERSION_PREFIX + tag
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), None)
+
+
+def get_or_set(name, tags, default, timeout=None):
+    """
+    Значение из кэша по имени и версиям тегов; при промахе
+    вычисляется вызовом default() и сохраняется.
+    """
+    key = f'data:{name}:{cache_version(*tags)}'
+    return get_cache().get_or_set(key, default, timeout or get_timeout())
+
+
+def _is_cacheable_request(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.user.is_authenticated:
+        return False
+    # Не теряем и не кэшируем flash-сообщения
+    return len(get_messages(request)) == 0
+
+
+def _cached_page(request, view_func, tags):
+    """(ключ, закэшированный ответ или None); ключ None - запрос не кэшируется"""
+    if not _is_cacheable_request(request):
+        return None, None
+    # Схема и хост - часть ключа: карта сайта и ленты содержат абсолютные ссылки
+    path_hash = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    # v2 - запись (содержимое, заголовки); записи прежнего формата не читаются
+    key = f'page:v2:{view_func.__module__}.{view_func.__name__}:{path_hash}:{cache_version(*tags)}'
+    cached = get_cache().get(key)
+    if cached is None:
+        return key, None
+    content, headers = cached
+    return key, HttpResponse(content, headers=headers)
+
+
+def _store_page(key, request, response, timeout):
+    if (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+    ):
+        headers = {name: response[name] for name in CACHED_HEADERS if response.has_header(name)}
+        timeout = timeout() if callable(timeout) else timeout
+        get_cache().set(key, (response.content, headers), timeout or get_timeout())
+
+
+def cache_page_anonymous(*tags, timeout=None):
+    """
+    Кэширует всю страницу для анонимных пользователей.
+    Ключ - полный адрес с параметрами запроса и версии тегов.
+    Ответы, выставившие cookie или CSRF-токен, не кэшируются.
+    timeout - секунды или функция без аргументов, которая читает их из
+    настроек при каждой записи (по умолчанию PAGE_CACHE_TIMEOUT).
+    Подходит и для асинхронных представлений: кэш и пользователь
+    запроса читаются через sync_to_async.
+    """
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                key, cached = await sync_to_async(_cached_page)(request, view_func, tags)
+                if cached is not None:
+                    return cached
+                response = await view_func(request, *args, **kwargs)
+                if key is not None:
+                    await sync_to_async(_store_page)(key, request, response, timeout)
+                return response
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            key, cached = _cached_page(request, view_func, tags)
+            if cached is not None:
+                return cached
+            response = view_func(request, *args, **kwargs)
+            if key is not None:
+                _store_page(key, request, response, timeout)
+            return response
+        return wrapper
+    return decorator
+
+
+def _on_save(sender, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= COUNTER_FIELDS:
+        return
+    invalidate(TAGGED_MODELS[sender._meta.label])
+
+
+def _on_delete(sender, **kwargs):
+    invalidate(TAGGED_MODELS[sender._meta.label])
+
+
+def _on_m2m_changed(sender, instance, action, model, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # instance может быть с любой стороны связи (film.actors / actor.film_set)
+    tag = TAGGED_MODELS.get(instance._meta.label) or TAGGED_MODELS.get(model._meta.label)
+    if tag:
+        invalidate(tag)
+
+
+def connect_signals():
+    """Подключает инвалидацию тегов к сохранению и удалению моделей"""
+    from django.apps import apps
+    for label in TAGGED_MODELS:
+        model = apps.get_model(label)
+        uid = f'page_cache_{label}'
+        post_save.connect(_on_save, sender=model, dispatch_uid=uid)
+        post_delete.connect(_on_delete, sender=model, dispatch_uid=uid)
+        for field in model._meta.many_to_many:
+            m2m_changed.connect(_on_m2m_changed, sender=field.remote_field.through,
+                                dispatch_uid=f'{uid}_{field.name}')
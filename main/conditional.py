@@ -0,0 +1,84 @@
+# main/conditional.py
+"""
+Условные GET-запросы (ETag / Last-Modified) для HTML-страниц.
+
+Аналог django.views.decorators.http.condition(), но с учетом того,
+что страницы зависят от пользователя: ETag включает id пользователя
+и дополнительное состояние (например, «в избранном»), а запросы
+с непоказанными flash-сообщениями всегда получают полную страницу.
+"""
+import hashlib
+import time
+from datetime import datetime
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def latest(*values):
+    """Максимальная из дат, пропуская None"""
+    values = [v for v in values if v is not None]
+    return max(values) if values else None
+
+
+def conditional_page(last_modified_func, has_counters=False, on_not_modified=None):
+    """
+    Отвечает 304 Not Modified, если страница не изменилась.
+
+    last_modified_func(request, *args, **kwargs) должна быть дешевой
+    (индексированные даты, без рендеринга) и возвращать datetime или
+    кортеж (datetime, state), где state - любое значение, влияющее на
+    страницу помимо даты (количество строк, флаг избранного и т. п.).
+    None - условный ответ не используется.
+
+    has_counters - страница показывает счетчики просмотров, которые не
+    меняют даты: ETag меняется не реже, чем раз в COUNTER_MAX_STALE секунд.
+    on_not_modified - вызывается вместо представления при ответе 304
+    (например, чтобы учесть просмотр).
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or len(get_messages(request)):
+                return view_func(request, *args, **kwargs)
+
+            result = last_modified_func(request, *args, **kwargs)
+            if result is None:
+                return view_func(request, *args, **kwargs)
+            last_modified, state = result if isinstance(result, tuple) else (result, None)
+            timestamp = int(last_modified.timestamp()) if isinstance(last_modified, datetime) else 0
+            max_stale = getattr(settings, 'COUNTER_MAX_STALE', 300) if has_counters else None
+            bucket = int(time.time() // max_stale) if max_stale else None
+
+            # В ETag - дата с микросекундами: правка в ту же секунду тоже меняет его
+            version = last_modified.isoformat() if isinstance(last_modified, datetime) else ''
+            raw = f'{request.user.pk}:{version}:{state}:{bucket}'
+            etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+            response = get_conditional_response(
+                request,
+                etag=etag,
+                last_modified=timestamp if timestamp and not max_stale else None,
+            )
+            if response is not None:
+                if response.status_code == 304 and on_not_modified is not None:
+                    on_not_modified(request, *args, **kwargs)
+            else:
+                response = view_func(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+
+            response['ETag'] = etag
+            if timestamp and not max_stale:
+                response['Last-Modified'] = http_date(timestamp)
+            # Браузер хранит копию, но каждый раз сверяется с сервером
+            if request.user.is_authenticated:
+                patch_cache_control(response, no_cache=True, private=True)
+            else:
+                patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
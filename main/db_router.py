@@ -0,0 +1,101 @@
+# main/db_router.py
+"""
+Разделение чтения и записи между базами данных.
+
+Запись всегда идет в 'default', чтение - в случайную реплику из
+settings.DATABASE_REPLICAS. Чтобы пользователь сразу видел свои изменения
+(read-your-writes), чтение переключается на основную базу:
+- в запросах, изменяющих данные (POST и т. п.);
+- в течение REPLICA_PIN_SECONDS после такого запроса (cookie,
+  см. ReplicaPinningMiddleware);
+- внутри транзакций (atomic) и в блоке use_primary().
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'db_primary'
+
+_pinned = ContextVar('db_pinned', default=False)
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+@contextmanager
+def use_primary():
+    """Все чтения внутри блока идут в основную базу"""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if not replicas or _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in get_replicas():
+            return False
+        return None
+
+
+class ReplicaPinningMiddleware:
+    """
+    Закрепляет чтение за основной базой во время и после изменяющих запросов.
+    Работает и в асинхронной цепочке (ASGI), не переводя ее в синхронный режим.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        is_write = request.method not in ('GET', 'HEAD', 'OPTIONS')
+        token = _pinned.set(is_write or PIN_COOKIE in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            _pinned.reset(token)
+        return self._pin_after_write(response, is_write)
+
+    async def __acall__(self, request):
+        is_write = request.method not in ('GET', 'HEAD', 'OPTIONS')
+        token = _pinned.set(is_write or PIN_COOKIE in request.COOKIES)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _pinned.reset(token)
+        return self._pin_after_write(response, is_write)
+
+    def _pin_after_write(self, response, is_write):
+        if is_write and get_replicas():
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
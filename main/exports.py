@@ -0,0 +1,185 @@
+# main/exports.py
+"""
+Выгрузка каталога, отзывов и сообщений форума в CSV и JSON Lines.
+
+Строки читаются values_list(...).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+в порядке id - без объектов моделей и без загрузки всей выборки в
+память - и сразу превращаются в текст пакетами по EXPORT_CHUNK_SIZE
+строк. Связи многие-ко-многим (актеры, режиссеры фильмов и т.п.) читаются
+одним запросом на пакет из промежуточной таблицы, а не на каждую строку.
+
+Выгрузка доступна персоналу по адресу /export/<имя>.<csv|jsonl>
+(StreamingHttpResponse) и командой manage.py export. Значения CSV,
+начинающиеся с символа формулы (=, +, -, @, табуляция, CR), экранируются
+апострофом.
+"""
+import csv
+import datetime
+import io
+import json
+from collections import defaultdict
+from decimal import Decimal
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+
+
+class Export:
+    """
+    Выгрузка модели: columns - имена полей или пары (столбец, поле
+    values_list), первым идет id; many - столбец -> (поле многие-ко-многим,
+    поле связанной модели), значение столбца - список.
+    """
+
+    def __init__(self, model, columns, many=None, filters=None):
+        self.model = model
+        self.columns = [column if isinstance(column, tuple) else (column, column) for column in columns]
+        self.many = many or {}
+        self.filters = filters or {}
+
+    @property
+    def header(self):
+        return [name for name, _ in self.columns] + list(self.many)
+
+    def get_queryset(self):
+        model = apps.get_model(self.model)
+        lookups = [lookup for _, lookup in self.columns]
+        return model._default_manager.filter(**self.filters).order_by('pk').values_list(*lookups)
+
+    def rows(self, chunk_size=None):
+        """Строки выгрузки (кортежи в порядке header)"""
+        chunk_size = chunk_size or get_chunk_size()
+        rows = self.get_queryset().iterator(chunk_size=chunk_size)
+        if not self.many:
+            yield from rows
+            return
+        model = apps.get_model(self.model)
+        while chunk := list(islice(rows, chunk_size)):
+            ids = [row[0] for row in chunk]
+            related = [self._related(model, field, name, ids) for field, name in self.many.values()]
+            for row in chunk:
+                yield (*row, *(values.get(row[0], []) for values in related))
+
+    def _related(self, model, field_name, related_field, ids):
+        """{id объекта: [значения]} для пакета ids - один запрос к промежуточной таблице"""
+        field = model._meta.get_field(field_name)
+        source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+        values = defaultdict(list)
+        # Порядок добавления связей (например, актеры в порядке титров)
+        links = field.remote_field.through.objects.filter(**{f'{source}_id__in': ids}).order_by('pk')
+        for object_id, value in links.values_list(f'{source}_id', f'{target}__{related_field}'):
+            values[object_id].append(value)
+        return values
+
+
+EXPORTS = {
+    'books': Export('books.Book', [
+        'id', 'title', 'author', 'description', 'tags', 'has_subtitles', 'has_sign_language',
+        'has_audio_description', 'likes_count', 'created_at', 'updated_at',
+    ]),
+    'films': Export('films.Film', [
+        'id', 'title', 'original_title', 'slug', 'content_type', 'year', 'duration', 'age_rating',
+        'imdb_rating', 'kinopoisk_rating', 'status', 'has_subtitles', 'has_sign_language',
+        'has_audio_description', 'views_count', 'likes_count', 'created_at', 'updated_at',
+    ], many={
+        'directors': ('directors', 'name'),
+        'actors': ('actors', 'name'),
+        'genres': ('genres', 'name'),
+        'countries': ('countries', 'name'),
+    }),
+    'courses': Export('education.Course', [
+        'id', 'title', 'instructor', 'platform', 'course_url', 'level', 'duration_hours', 'has_subtitles',
+        'has_sign_language', 'has_audio_description', 'has_transcript', 'tags', 'likes_count',
+        'created_at', 'updated_at',
+    ]),
+    'sites': Export('sites.Site', [
+        'id', 'title', 'slug', 'url', ('category', 'category__name'), 'short_description', 'phone', 'email',
+        'visits_count', 'is_published', 'is_featured', 'created_at', 'updated_at',
+    ]),
+    'reviews': Export('reviews.Review', [
+        'id', ('content_type', 'content_type__model'), 'object_id', ('user', 'user__username'), 'rating',
+        'comment', 'accessibility_subtitles', 'accessibility_sign_language',
+        'accessibility_audio_description', 'accessibility_transcript', 'created_at', 'updated_at',
+    ]),
+    'posts': Export('forum.ForumPost', [
+        'id', 'topic_id', ('topic', 'topic__title'), ('author', 'author__username'), 'parent_id', 'content',
+        'created_at', 'updated_at',
+    ]),
+}
+
+
+def get_chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+# Начала текста, которые табличные редакторы считают формулой
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        value = '; '.join(map(str, value))
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    # Текст пользователей (отзывы, сообщения) не должен выполняться при открытии
+    # файла в Excel или LibreOffice: апостроф делает формулу обычным текстом
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} не сериализуется в JSON')
+
+
+def render_csv(header, rows, batch_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    while batch := list(islice(rows, batch_size)):
+        writer.writerows([_csv_value(value) for value in row] for row in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Только заголовок - пустая выгрузка
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def render_jsonl(header, rows, batch_size):
+    while batch := list(islice(rows, batch_size)):
+        yield ''.join(
+            json.dumps(dict(zip(header, row)), ensure_ascii=False, default=_json_default) + '\n' for row in batch
+        )
+
+
+# Формат -> (Content-Type, функция записи)
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', render_csv),
+    'jsonl': ('application/x-ndjson; charset=utf-8', render_jsonl),
+}
+
+
+def stream_export(name, fmt, chunk_size=None):
+    """Текст выгрузки name в формате fmt частями по chunk_size строк"""
+    export = EXPORTS[name]
+    chunk_size = chunk_size or get_chunk_size()
+    return FORMATS[fmt][1](export.header, export.rows(chunk_size), chunk_size)
+
+
+async def async_chunks(chunks):
+    """
+    Асинхронный итератор для StreamingHttpResponse под ASGI: синхронный
+    Django сначала целиком собирает в список. Части читаются в потоке
+    синхронного кода (thread_sensitive) - там же, где открыт курсор базы.
+    """
+    chunks = iter(chunks)
+    done = object()
+    while (chunk := await sync_to_async(next)(chunks, done)) is not done:
+        yield chunk
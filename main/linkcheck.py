@@ -0,0 +1,328 @@
+# main/linkcheck.py
+"""
+Проверка внешних ссылок каталога (Site.url, Course.course_url).
+
+Ссылки проверяются одновременно в одном цикле событий: HTTP/1.1-клиент
+на asyncio.open_connection с общим ограничением соединений
+(LINK_CHECK_CONCURRENCY) и отдельным - на каждый хост (LINK_CHECK_PER_HOST),
+чтобы не нагружать один сайт десятками запросов. Соединения keep-alive
+переиспользуются для следующих ссылок того же хоста и закрываются, когда
+ссылок этого хоста в очереди не осталось: число свободных соединений не
+растет с числом хостов.
+
+Запрос - HEAD (GET, если сервер не поддерживает HEAD), с переходом по
+перенаправлениям и условными заголовками If-None-Match/If-Modified-Since
+из прошлой проверки: неизменившийся ресурс отвечает 304 без тела.
+
+run_checks() сохраняет результаты в LinkCheck (код, время ответа, ошибка,
+число неудач подряд). Ссылка, не ответившая LINK_CHECK_DEAD_AFTER раз
+подряд, считается мертвой; unpublish_dead() снимает такие объекты с
+публикации (у курсов поля публикации нет - они только попадают в отчет).
+"""
+import asyncio
+import ssl
+import time
+from collections import defaultdict
+from datetime import timedelta
+from urllib.parse import quote, urljoin, urlsplit
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import LinkCheck
+
+# Вид -> (модель, поле ссылки, фильтр проверяемых объектов, поле публикации или None)
+TARGETS = {
+    'site': ('sites.Site', 'url', {'is_published': True}, 'is_published'),
+    'course': ('education.Course', 'course_url', {}, None),
+}
+
+USER_AGENT = 'web_coffee-linkcheck/1.0'
+
+MAX_REDIRECTS = 5
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+
+# Ответы, после которых ресурс считается недоступным (и все 5xx). 401, 403
+# и 429 - сайт на месте, но не отвечает роботу
+DEAD_STATUSES = {404, 410}
+
+# Символы, которые остаются в пути и строке запроса как есть
+SAFE_PATH = "/%:@!$&'()*+,;=-._~"
+SAFE_QUERY = SAFE_PATH + '?'
+
+
+class CheckResult:
+    def __init__(self, status=None, latency_ms=None, error='', etag='', last_modified=''):
+        self.status = status
+        self.latency_ms = latency_ms
+        self.error = error
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def is_alive(self):
+        return not self.error and self.status is not None and self.status not in DEAD_STATUSES and self.status < 500
+
+
+class HostPool:
+    """Ограничение одновременных запросов к хосту и его свободные соединения"""
+
+    def __init__(self, limit):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.idle = []    # (reader, writer)
+        self.queued = 0   # начатых и еще не завершенных проверок ссылок хоста
+
+
+def _pool_key(parts):
+    host = parts.hostname.encode('idna').decode('ascii')
+    return parts.scheme, host, parts.port or (443 if parts.scheme == 'https' else 80)
+
+
+class LinkChecker:
+    def __init__(self, concurrency=20, per_host=2, timeout=10):
+        self.connections = asyncio.Semaphore(concurrency)
+        self.hosts = defaultdict(lambda: HostPool(per_host))
+        self.timeout = timeout
+        self.ssl_context = ssl.create_default_context()
+        self.closing = set()    # задачи, ожидающие закрытия соединений
+
+    async def check(self, url, etag='', last_modified=''):
+        """Результат проверки url (исключения сети возвращаются как CheckResult.error)"""
+        # Учет до первого await: задачи gather(...) регистрируются раньше, чем
+        # первая из них освободит соединение
+        pool = self._host_pool(url)
+        if pool is not None:
+            pool.queued += 1
+        try:
+            return await self._check(url, etag, last_modified)
+        finally:
+            if pool is not None:
+                pool.queued -= 1
+                if not pool.queued:
+                    self._close_idle(pool)
+
+    def _host_pool(self, url):
+        """Пул хоста ссылки или None для ссылки, которую проверить нельзя (ошибку вернет _request)"""
+        try:
+            parts = urlsplit(url)
+            return self.hosts[_pool_key(parts)] if parts.hostname else None
+        except ValueError:
+            return None
+
+    async def _check(self, url, etag, last_modified):
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        latency = 0
+        try:
+            for _ in range(MAX_REDIRECTS + 1):
+                status, response_headers, elapsed = await self._request('HEAD', url, headers)
+                latency += elapsed
+                if status in (405, 501):
+                    # HEAD не поддерживается - GET, тело не читается
+                    status, response_headers, elapsed = await self._request('GET', url, headers)
+                    latency += elapsed
+                location = response_headers.get('location')
+                if status not in REDIRECT_STATUSES or not location:
+                    break
+                url = urljoin(url, location)
+            else:
+                return CheckResult(status, round(latency), 'слишком много перенаправлений')
+        except TimeoutError:
+            return CheckResult(latency_ms=round(latency), error=f'нет ответа за {self.timeout} с')
+        except (OSError, EOFError, ValueError, asyncio.LimitOverrunError) as exc:
+            return CheckResult(latency_ms=round(latency), error=f'{type(exc).__name__}: {exc}'[:200])
+        return CheckResult(
+            status, round(latency), etag=response_headers.get('etag', ''),
+            last_modified=response_headers.get('last-modified', ''),
+        )
+
+    async def _request(self, method, url, headers):
+        """(код, заголовки, время в мс) одного запроса без перехода по перенаправлениям"""
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError(f'схема {parts.scheme!r} не поддерживается')
+        if not parts.hostname:
+            raise ValueError('в ссылке нет хоста')
+        key = _pool_key(parts)
+        _, host, port = key
+        target = quote(parts.path or '/', safe=SAFE_PATH)
+        if parts.query:
+            target += '?' + quote(parts.query, safe=SAFE_QUERY)
+        host_header = host if parts.port is None else f'{host}:{port}'
+
+        pool = self.hosts[key]
+        # Сначала место у хоста, потом общее: ожидающие своей очереди к
+        # одному хосту не занимают соединения, нужные другим
+        async with pool.semaphore, self.connections:
+            started = time.perf_counter()
+            async with asyncio.timeout(self.timeout):
+                while True:
+                    reused = bool(pool.idle)
+                    reader, writer = pool.idle.pop() if reused else await asyncio.open_connection(
+                        host, port, ssl=self.ssl_context if parts.scheme == 'https' else None,
+                    )
+                    try:
+                        status, response_headers, keep_alive = await self._exchange(
+                            reader, writer, method, target, host_header, headers,
+                        )
+                        break
+                    except BaseException as exc:
+                        self._close(writer)
+                        # Сервер мог закрыть простаивавшее соединение - повтор на новом
+                        if reused and isinstance(exc, (OSError, EOFError, ValueError)):
+                            continue
+                        raise
+            # Соединение ждет следующую ссылку хоста, только если она есть
+            if keep_alive and pool.queued:
+                pool.idle.append((reader, writer))
+            else:
+                self._close(writer)
+            return status, response_headers, (time.perf_counter() - started) * 1000
+
+    async def _exchange(self, reader, writer, method, target, host, headers):
+        lines = [f'{method} {target} HTTP/1.1', f'Host: {host}', f'User-Agent: {USER_AGENT}', 'Accept: */*']
+        lines.extend(f'{name}: {value}' for name, value in headers.items())
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+        while True:
+            head = await reader.readuntil(b'\r\n\r\n')
+            status_line, *header_lines = head.decode('latin-1').split('\r\n')
+            version, status = status_line.split(' ', 2)[:2]
+            status = int(status)
+            # Промежуточные ответы 1xx - ждем окончательный
+            if status >= 200:
+                break
+        response_headers = {}
+        for line in header_lines:
+            name, _, value = line.partition(':')
+            if value:
+                response_headers[name.strip().lower()] = value.strip()
+        # После GET тело не читается - соединение не переиспользуется
+        keep_alive = (
+            method == 'HEAD' and version == 'HTTP/1.1'
+            and response_headers.get('connection', '').lower() != 'close'
+        )
+        return status, response_headers, keep_alive
+
+    def _close(self, writer):
+        """Закрывает соединение; закрытие (для TLS - обмен close_notify) дожидается отдельная задача"""
+        writer.close()
+        task = asyncio.ensure_future(self._wait_closed(writer))
+        self.closing.add(task)
+        task.add_done_callback(self.closing.discard)
+
+    async def _wait_closed(self, writer):
+        try:
+            async with asyncio.timeout(self.timeout):
+                await writer.wait_closed()
+        except (TimeoutError, OSError):
+            pass
+
+    def _close_idle(self, pool):
+        for _, writer in pool.idle:
+            self._close(writer)
+        pool.idle.clear()
+
+    async def close(self):
+        """Закрывает свободные соединения и дожидается закрытия всех"""
+        for pool in self.hosts.values():
+            self._close_idle(pool)
+        await asyncio.gather(*self.closing)
+
+
+async def check_urls(urls, concurrency=20, per_host=2, timeout=10):
+    """Результаты для urls - списка (ссылка, ETag, Last-Modified) - в том же порядке"""
+    checker = LinkChecker(concurrency, per_host, timeout)
+    try:
+        return await asyncio.gather(*(checker.check(url, etag, last_modified) for url, etag, last_modified in urls))
+    finally:
+        await checker.close()
+
+
+def latest_checks(content_type):
+    """Последняя проверка каждого объекта типа: {id объекта: LinkCheck}"""
+    last_ids = LinkCheck.objects.filter(content_type=content_type).values('object_id').annotate(
+        last=Max('id'),
+    ).values('last').order_by()
+    return {check.object_id: check for check in LinkCheck.objects.filter(id__in=last_ids)}
+
+
+def run_checks(kinds=None, concurrency=None, per_host=None, timeout=None):
+    """Проверяет ссылки объектов видов kinds (по умолчанию всех) и сохраняет историю; возвращает новые LinkCheck"""
+    targets = []
+    for kind in kinds or TARGETS:
+        label, url_field, filters, _ = TARGETS[kind]
+        model = apps.get_model(label)
+        content_type = ContentType.objects.get_for_model(model)
+        previous_checks = latest_checks(content_type)
+        objects = model._default_manager.filter(**filters).exclude(**{url_field: ''}).values_list('pk', url_field)
+        for pk, url in objects.iterator():
+            previous = previous_checks.get(pk)
+            # Ссылка изменилась - прошлые неудачи и валидаторы к ней не относятся
+            if previous is not None and previous.url != url:
+                previous = None
+            targets.append((content_type, pk, url, previous))
+
+    results = asyncio.run(check_urls(
+        [(url, previous.etag, previous.last_modified) if previous else (url, '', '') for _, _, url, previous in targets],
+        concurrency=concurrency or getattr(settings, 'LINK_CHECK_CONCURRENCY', 20),
+        per_host=per_host or getattr(settings, 'LINK_CHECK_PER_HOST', 2),
+        timeout=timeout or getattr(settings, 'LINK_CHECK_TIMEOUT', 10),
+    ))
+
+    now = timezone.now()
+    checks = []
+    for (content_type, pk, url, previous), result in zip(targets, results):
+        etag, last_modified = result.etag, result.last_modified
+        if result.status == 304 and previous is not None:
+            # 304 может прийти без валидаторов - остаются прежние
+            etag, last_modified = etag or previous.etag, last_modified or previous.last_modified
+        checks.append(LinkCheck(
+            content_type=content_type, object_id=pk, url=url, checked_at=now,
+            status=result.status, latency_ms=result.latency_ms, error=result.error,
+            is_alive=result.is_alive,
+            failures=0 if result.is_alive else (previous.failures if previous else 0) + 1,
+            etag=etag[:200], last_modified=last_modified[:100],
+        ))
+    LinkCheck.objects.bulk_create(checks, batch_size=1000)
+    return checks
+
+
+def dead_checks(checks, dead_after=None):
+    """Проверки ссылок, не ответивших dead_after раз подряд"""
+    dead_after = dead_after or getattr(settings, 'LINK_CHECK_DEAD_AFTER', 3)
+    return [check for check in checks if check.failures >= dead_after]
+
+
+def unpublish_dead(checks, dead_after=None):
+    """Снимает с публикации объекты с мертвыми ссылками; возвращает снятые объекты"""
+    dead_ids = defaultdict(set)
+    for check in dead_checks(checks, dead_after):
+        dead_ids[check.content_type_id].add(check.object_id)
+    unpublished = []
+    for label, _, _, publish_field in TARGETS.values():
+        model = apps.get_model(label)
+        ids = dead_ids.get(ContentType.objects.get_for_model(model).pk)
+        if publish_field is None or not ids:
+            continue
+        # Полный save(): сигналы обновляют подсказки поиска и версии кэша,
+        # updated_at - условные GET-запросы страниц
+        for obj in model._default_manager.filter(pk__in=ids, **{publish_field: True}):
+            setattr(obj, publish_field, False)
+            obj.save()
+            unpublished.append(obj)
+    return unpublished
+
+
+def compact_checks(now=None):
+    """Удаляет результаты старше LINK_CHECK_HISTORY_DAYS; возвращает их число"""
+    now = now or timezone.now()
+    before = now - timedelta(days=getattr(settings, 'LINK_CHECK_HISTORY_DAYS', 90))
+    deleted, _ = LinkCheck.objects.filter(checked_at__lt=before).delete()
+    return deleted
@@ -0,0 +1,219 @@
+import json
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from apps.books.models import Book
+from apps.books.views import BOOK_SORTS
+from apps.education.models import Course
+from apps.education.views import COURSE_SORTS
+from apps.films.models import Film, FilmCollection
+from apps.films.views import FILM_SORTS
+from apps.forum.models import ForumCategory, ForumPost, ForumTopic
+from apps.sites.models import Site
+from apps.sites.views import SITE_SORTS
+from main.metrics import RequestMetrics, measure
+
+
+def _first(queryset, field='pk'):
+    return queryset.values_list(field, flat=True).first()
+
+
+# Аргументы URL: самый популярный (или первый) объект каждого вида
+URL_ARGUMENTS = {
+    'books:book_detail': lambda: {'book_id': _first(Book.objects.order_by('-likes_count'))},
+    'books:book_reader': lambda: {'book_id': _first(Book.objects.order_by('-likes_count'))},
+    'education:course_detail': lambda: {'course_id': _first(Course.objects.order_by('-likes_count'))},
+    'education:course_by_level': lambda: {'level': 'beginner'},
+    'films:detail': lambda: {'slug': _first(Film.objects.order_by('-views_count'), 'slug')},
+    'films:collection': lambda: {'slug': _first(FilmCollection.objects.all(), 'slug')},
+    'forum:category': lambda: {'slug': _first(ForumCategory.objects.order_by('-topics_count'), 'slug')},
+    'forum:topic': lambda: {'topic_id': _first(ForumTopic.objects.order_by('-posts_count'))},
+    'forum:edit_post': lambda: {'post_id': _first(ForumPost.objects.all())},
+    'sites:detail': lambda: {'slug': _first(Site.objects.filter(is_published=True), 'slug')},
+    'sites:redirect': lambda: {'slug': _first(Site.objects.filter(is_published=True), 'slug')},
+}
+
+# Параметры запроса для страниц поиска
+QUERY_STRINGS = {
+    'search': 'q=история',
+    'autocomplete': 'q=ист',
+    'books:book_search': 'q=история',
+    'films:search': 'q=история',
+    'forum:search': 'q=история',
+}
+
+# Списки с параметром ?sort= (--sorts измеряет каждую сортировку отдельно)
+SORTED_VIEWS = {
+    'books:book_list': BOOK_SORTS,
+    'education:course_list': COURSE_SORTS,
+    'films:list': FILM_SORTS,
+    'sites:list': SITE_SORTS,
+}
+
+# Только POST, выход из системы и отдача видеофайлов не измеряются
+SKIP = {'accounts:logout', 'reviews:favorite', 'forum:create_post', 'films:video_stream'}
+
+
+def iter_url_patterns(patterns=None, prefix='', namespace=None):
+    """(имя представления, шаблон пути) для всех именованных URL проекта"""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.app_name == 'admin':
+                continue
+            inner = ':'.join(filter(None, [namespace, pattern.namespace])) or None
+            yield from iter_url_patterns(pattern.url_patterns, prefix + str(pattern.pattern), inner)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            name = f'{namespace}:{pattern.name}' if namespace else pattern.name
+            yield name, prefix + str(pattern.pattern)
+
+
+def percentile(values, fraction):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[round(fraction * 100) - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет все страницы из web_coffee/urls.py тестовым клиентом Django: '
+        'p50/p95 времени ответа и число SQL-запросов; результаты сохраняются в JSON '
+        'для сравнения с предыдущими прогонами (данные - manage.py generate_data)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Измерений на страницу')
+        parser.add_argument('--warmup', type=int, default=2, help='Запросов прогрева (не учитываются)')
+        parser.add_argument('--user', help='Измерять от имени пользователя (логин)')
+        parser.add_argument('--cold', action='store_true', help='Очищать кэш перед каждым запросом')
+        parser.add_argument('--only', action='append', help='Только эти представления (например books:book_list)')
+        parser.add_argument('--sorts', action='store_true',
+                            help='Измерять списки со всеми сортировками (films:list?sort=title и т.д.)')
+        parser.add_argument('--output', help='Сохранить результаты в JSON')
+        parser.add_argument('--compare', help='JSON предыдущего прогона: показать изменения')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Доля роста p95, считающаяся регрессией (по умолчанию 0.2)')
+
+    def handle(self, *args, **options):
+        # Ошибки страниц попадают в отчет кодом 500, а не прерывают прогон
+        client = Client(raise_request_exception=False, HTTP_HOST='127.0.0.1')
+        if options['user']:
+            try:
+                client.force_login(User.objects.get(username=options['user']))
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь {options["user"]} не найден')
+
+        results = {}
+        for name, route in iter_url_patterns():
+            if name in SKIP or (options['only'] and name not in options['only']):
+                continue
+            url = self._build_url(name, route)
+            if url is None:
+                self.stdout.write(self.style.WARNING(f'{name}: нет данных для {route}, пропущено'))
+                continue
+            results[name] = self._measure(client, url, options)
+            self._print(name, results[name])
+            if options['sorts'] and name in SORTED_VIEWS:
+                for key in SORTED_VIEWS[name].options:
+                    variant = f'{name}?sort={key}'
+                    results[variant] = self._measure(client, f'{url}?sort={key}', options)
+                    self._print(variant, results[variant])
+
+        report = {
+            'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': self._commit(),
+            'user': options['user'],
+            'cold_cache': options['cold'],
+            'repeat': options['repeat'],
+            'data': {model.__name__: model.objects.count() for model in (Book, Film, Course, Site, ForumTopic, ForumPost)},
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        if options['compare']:
+            self._compare(options['compare'], results, options['threshold'])
+
+    def _build_url(self, name, route):
+        kwargs = {}
+        if name in URL_ARGUMENTS:
+            kwargs = URL_ARGUMENTS[name]()
+            if None in kwargs.values():
+                return None
+        elif '<' in route:
+            return None
+        # Подстановка значений в шаблон пути: <int:book_id> -> 42
+        url = '/' + route
+        for part in route.split('<')[1:]:
+            converter = part.split('>')[0]
+            url = url.replace(f'<{converter}>', str(kwargs[converter.split(':')[-1]]), 1)
+        if name in QUERY_STRINGS:
+            url += '?' + QUERY_STRINGS[name]
+        return url
+
+    def _measure(self, client, url, options):
+        cache = caches['default']
+        timings, queries, similar, status = [], [], [], None
+        for attempt in range(options['warmup'] + options['repeat']):
+            if options['cold']:
+                cache.clear()
+            metrics = RequestMetrics()
+            # Запросы асинхронных представлений из потоков пула (main/parallel.py) тоже учитываются
+            with measure(metrics):
+                start = time.perf_counter()
+                response = client.get(url)
+                elapsed = time.perf_counter() - start
+            status = response.status_code
+            if attempt >= options['warmup']:
+                timings.append(elapsed * 1000)
+                queries.append(metrics.queries)
+                similar.append(metrics.similar)
+        return {
+            'url': url,
+            'status': status,
+            'p50_ms': round(percentile(timings, 0.5), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'mean_ms': round(statistics.fmean(timings), 2),
+            'queries': max(queries),
+            'repeated_queries': max(similar),
+        }
+
+    def _print(self, name, result):
+        line = (
+            f'{name:36} {result["status"]:>4} p50 {result["p50_ms"]:8.2f} мс  p95 {result["p95_ms"]:8.2f} мс  '
+            f'SQL {result["queries"]:>4} (повт. {result["repeated_queries"]})'
+        )
+        self.stdout.write(self.style.WARNING(line) if result['status'] >= 400 else line)
+
+    def _commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def _compare(self, path, results, threshold):
+        with open(path, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        self.stdout.write(f'\nСравнение с {path}:')
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0
+            line = (
+                f'{name:36} p95 {before["p95_ms"]:8.2f} -> {result["p95_ms"]:8.2f} мс ({change:+.0%})  '
+                f'SQL {before["queries"]} -> {result["queries"]}'
+            )
+            regression = change > threshold or result['queries'] > before['queries']
+            self.stdout.write(self.style.ERROR(line) if regression else line)
@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.linkcheck import TARGETS, compact_checks, dead_checks, run_checks, unpublish_dead
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет внешние ссылки сайтов и курсов одновременными запросами (main/linkcheck.py) '
+        'и сохраняет историю проверок. Запускайте по расписанию, например раз в сутки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('types', nargs='*', help=f'Виды объектов: {", ".join(TARGETS)} (по умолчанию все)')
+        parser.add_argument('--concurrency', type=int, help='Одновременных соединений (LINK_CHECK_CONCURRENCY)')
+        parser.add_argument('--per-host', type=int, help='Одновременных запросов к одному хосту (LINK_CHECK_PER_HOST)')
+        parser.add_argument('--timeout', type=float, help='Секунды на запрос (LINK_CHECK_TIMEOUT)')
+        parser.add_argument('--dead-after', type=int, help='Неудач подряд до «мертвой» ссылки (LINK_CHECK_DEAD_AFTER)')
+        parser.add_argument('--unpublish', action='store_true', help='Снять с публикации сайты с мертвыми ссылками')
+
+    def handle(self, *args, **options):
+        unknown = set(options['types']) - set(TARGETS)
+        if unknown:
+            raise CommandError(f'Неизвестные виды: {", ".join(sorted(unknown))}')
+        started = time.monotonic()
+        checks = run_checks(
+            options['types'], concurrency=options['concurrency'], per_host=options['per_host'],
+            timeout=options['timeout'],
+        )
+        alive = sum(check.is_alive for check in checks)
+        self.stdout.write(
+            f'Проверено ссылок: {len(checks)}, доступны: {alive}, не ответили: {len(checks) - alive}, '
+            f'{time.monotonic() - started:.1f} с'
+        )
+
+        dead_after = options['dead_after'] or settings.LINK_CHECK_DEAD_AFTER
+        for check in dead_checks(checks, dead_after):
+            self.stdout.write(self.style.WARNING(
+                f'{check.content_type.model} #{check.object_id} {check.url}: '
+                f'{check.status or check.error} ({check.failures} раз подряд)'
+            ))
+        if options['unpublish']:
+            for obj in unpublish_dead(checks, dead_after):
+                self.stdout.write(f'Снят с публикации: {obj}')
+        deleted = compact_checks()
+        if deleted:
+            self.stdout.write(f'Удалено старых результатов: {deleted}')
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.trending import compute_trending, flush_activity
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает «популярное сейчас» по часовой активности с затуханием (main/trending.py) '
+        'и удаляет устаревшие корзины. Запускайте по расписанию, например каждые 15 минут'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Размер пакета bulk_create')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        # События этого процесса (веб-процессы записывают свои раз в TRENDING_FLUSH_INTERVAL)
+        flush_activity()
+        scored, deleted = compute_trending(batch_size=options['batch_size'])
+        self.stdout.write(
+            f'Объектов с популярностью: {scored}, удалено корзин: {deleted}, {time.monotonic() - started:.1f} с'
+        )
@@ -0,0 +1,119 @@
+import os
+import tempfile
+import threading
+import time
+from copy import deepcopy
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+
+ROWS = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест SQLite: параллельные чтения и записи (счетчики просмотров, '
+        'отзывы) во временной базе с настройками профилей development и production'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help='Потоков чтения')
+        parser.add_argument('--writers', type=int, default=4, help='Потоков записи')
+        parser.add_argument('--seconds', type=float, default=5, help='Длительность каждого прогона')
+        parser.add_argument('--profile', choices=sorted(settings.DATABASE_PROFILES), action='append',
+                            help='Какие профили сравнивать (по умолчанию все)')
+
+    def handle(self, *args, **options):
+        if settings.DATABASES['default']['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('Тест предназначен для SQLite')
+
+        for profile in options['profile'] or ['development', 'production']:
+            with tempfile.TemporaryDirectory() as tmp:
+                alias = f'loadtest_{profile}'
+                self._add_database(alias, profile, os.path.join(tmp, 'loadtest.sqlite3'))
+                try:
+                    self._prepare(alias)
+                    result = self._run(alias, options)
+                finally:
+                    connections[alias].close()
+                    del connections.settings[alias]
+            self.stdout.write(
+                f'{profile:12} чтений/с: {result["reads"] / options["seconds"]:8.0f}  '
+                f'записей/с: {result["writes"] / options["seconds"]:7.0f}  '
+                f'ошибок "database is locked": {result["locked"]}'
+            )
+
+    def _add_database(self, alias, profile, path):
+        """Регистрирует временную базу с настройками профиля как отдельный alias"""
+        config = deepcopy(settings.DATABASES['default'])
+        config.update(deepcopy(settings.DATABASE_PROFILES[profile]))
+        config['NAME'] = path
+        connections.settings[alias] = connections.configure_settings({'default': config})['default']
+
+    def _prepare(self, alias):
+        with connections[alias].cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id INTEGER PRIMARY KEY, views INTEGER NOT NULL DEFAULT 0)')
+            cursor.execute(
+                'CREATE TABLE review (id INTEGER PRIMARY KEY, item_id INTEGER NOT NULL, '
+                'rating INTEGER NOT NULL, comment TEXT NOT NULL)'
+            )
+            cursor.execute('CREATE INDEX review_item ON review (item_id)')
+            cursor.executemany('INSERT INTO item (id) VALUES (%s)', [(i,) for i in range(1, ROWS + 1)])
+
+    def _run(self, alias, options):
+        deadline = time.monotonic() + options['seconds']
+        result = {'reads': 0, 'writes': 0, 'locked': 0}
+        lock = threading.Lock()
+
+        def count(key):
+            with lock:
+                result[key] += 1
+
+        def reader(n):
+            while time.monotonic() < deadline:
+                with connections[alias].cursor() as cursor:
+                    cursor.execute(
+                        'SELECT i.id, i.views, COUNT(r.id) FROM item i '
+                        'LEFT JOIN review r ON r.item_id = i.id WHERE i.id BETWEEN %s AND %s GROUP BY i.id',
+                        [n % ROWS, n % ROWS + 20],
+                    )
+                    cursor.fetchall()
+                count('reads')
+                n += 7
+
+        def writer(n):
+            while time.monotonic() < deadline:
+                item_id = n % ROWS + 1
+                try:
+                    # Как add_review: сначала чтение, затем запись в одной транзакции
+                    with transaction.atomic(using=alias):
+                        with connections[alias].cursor() as cursor:
+                            cursor.execute('SELECT COUNT(*) FROM review WHERE item_id = %s', [item_id])
+                            cursor.fetchone()
+                            cursor.execute(
+                                'INSERT INTO review (item_id, rating, comment) VALUES (%s, %s, %s)',
+                                [item_id, n % 5 + 1, 'x' * 200],
+                            )
+                            # Как счетчик просмотров: UPDATE ... SET views = views + 1
+                            cursor.execute('UPDATE item SET views = views + 1 WHERE id = %s', [item_id])
+                    count('writes')
+                except OperationalError as e:
+                    if 'locked' not in str(e):
+                        raise
+                    count('locked')
+                n += 13
+
+        def run(target, n):
+            try:
+                target(n)
+            finally:
+                connections[alias].close()
+
+        threads = [threading.Thread(target=run, args=(reader, i * 97)) for i in range(options['readers'])]
+        threads += [threading.Thread(target=run, args=(writer, i * 89)) for i in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return result
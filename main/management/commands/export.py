@@ -0,0 +1,92 @@
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from main.exports import EXPORTS, FORMATS, get_chunk_size, stream_export
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает книги, фильмы, курсы, сайты, отзывы и сообщения форума в CSV или JSON Lines '
+        '(main/exports.py) потоком, без загрузки выборки в память'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help=f'Выгрузки: {", ".join(EXPORTS)} (по умолчанию все)')
+        parser.add_argument('--format', choices=list(FORMATS), default='csv')
+        parser.add_argument(
+            '--output-dir', default='.', help='Каталог для файлов <имя>-<дата>.<формат>; "-" - одну выгрузку в стандартный вывод',
+        )
+        parser.add_argument('--chunk-size', type=int, help='Строк на одно чтение из базы (EXPORT_CHUNK_SIZE)')
+        parser.add_argument(
+            '--benchmark', action='store_true',
+            help='Без записи: скорость выгрузки и пиковая память потоком и со списком всех строк',
+        )
+
+    def handle(self, *args, **options):
+        names = options['names'] or list(EXPORTS)
+        unknown = set(names) - set(EXPORTS)
+        if unknown:
+            raise CommandError(f'Неизвестные выгрузки: {", ".join(sorted(unknown))}')
+        fmt, chunk_size = options['format'], options['chunk_size'] or get_chunk_size()
+
+        if options['benchmark']:
+            for name in names:
+                self._benchmark(name, fmt, chunk_size)
+            return
+        if options['output_dir'] == '-':
+            if len(names) != 1:
+                raise CommandError('В стандартный вывод - только одна выгрузка')
+            for chunk in stream_export(names[0], fmt, chunk_size):
+                sys.stdout.write(chunk)
+            return
+
+        output_dir = Path(options['output_dir'])
+        output_dir.mkdir(parents=True, exist_ok=True)
+        for name in names:
+            path = output_dir / f'{name}-{timezone.localdate():%Y-%m-%d}.{fmt}'
+            started = time.perf_counter()
+            # newline='' - csv сам пишет окончания строк \r\n
+            with open(path, 'w', encoding='utf-8', newline='') as output:
+                for chunk in stream_export(name, fmt, chunk_size):
+                    output.write(chunk)
+            self.stdout.write(f'{path}: {path.stat().st_size / 2**20:.1f} МБ, {time.perf_counter() - started:.1f} с')
+
+    def _benchmark(self, name, fmt, chunk_size):
+        export = EXPORTS[name]
+        render = FORMATS[fmt][1]
+
+        rows = 0
+
+        def counted(iterator):
+            nonlocal rows
+            for row in iterator:
+                rows += 1
+                yield row
+
+        started = time.perf_counter()
+        size = sum(len(chunk.encode()) for chunk in render(export.header, counted(export.rows(chunk_size)), chunk_size))
+        elapsed = time.perf_counter() - started
+
+        # Память - отдельными проходами: tracemalloc замедляет выполнение
+        tracemalloc.start()
+        try:
+            for _ in render(export.header, export.rows(chunk_size), chunk_size):
+                pass
+            _, streaming_peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            # Для сравнения: все строки списком и ответ одной строкой
+            ''.join(render(export.header, iter(list(export.rows(chunk_size))), chunk_size))
+            _, list_peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.stdout.write(
+            f'{name}.{fmt}: {rows} строк, {size / 2**20:.1f} МБ, {elapsed:.2f} с, '
+            f'{rows / elapsed if elapsed else 0:.0f} строк/с; пиковая память: потоком '
+            f'{streaming_peak / 2**20:.1f} МБ, списком {list_peak / 2**20:.1f} МБ'
+        )
@@ -0,0 +1,276 @@
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from apps.books.models import Book
+from apps.books.services import compute_chunk_offsets
+from apps.education.models import Course
+from apps.films.models import Actor, Director, Film, Genre
+from apps.forum.models import ForumCategory, ForumPost, ForumTopic
+from apps.reviews.models import Favorite, Review
+from apps.reviews.services import recount_favorites, update_cached_ratings
+from apps.sites.models import Site, SiteCategory
+
+# Объемы наборов данных; значения параметров командной строки их переопределяют
+PRESETS = {
+    'small': {
+        'users': 200, 'books': 1000, 'films': 500, 'courses': 300, 'sites': 300,
+        'topics': 500, 'posts': 10000, 'reviews': 20000, 'favorites': 5000,
+    },
+    'large': {
+        'users': 20000, 'books': 100000, 'films': 50000, 'courses': 10000, 'sites': 5000,
+        'topics': 50000, 'posts': 1000000, 'reviews': 5000000, 'favorites': 500000,
+    },
+}
+
+WORDS = (
+    'доступность книга фильм курс субтитры жестовый перевод описание история город '
+    'человек время жизнь дорога свет голос музыка память море лес дом письмо друг '
+    'школа учитель урок вопрос ответ мир война любовь путь ночь утро зима лето '
+    'сказка роман герой встреча решение слово язык звук образ картина сцена'
+).split()
+GENRES = ['Драма', 'Комедия', 'Мелодрама', 'Триллер', 'Фантастика', 'Документальный',
+          'Детектив', 'Приключения', 'Семейный', 'Исторический']
+LEVELS = [level for level, _ in Course.LEVEL_CHOICES]
+FILM_TYPES = [value for value, _ in Film.CONTENT_TYPE_CHOICES]
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует синтетические данные для нагрузочных измерений (bulk_create пакетами): '
+        'пользователи, книги, фильмы с актерами и жанрами, курсы, сайты, форум, отзывы, избранное'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--preset', choices=sorted(PRESETS), default='small',
+                            help='Объемы по умолчанию (large - 100 тыс. книг, 1 млн сообщений, 5 млн отзывов)')
+        for name in PRESETS['small']:
+            parser.add_argument(f'--{name}', type=int, help=f'Количество: {name}')
+        parser.add_argument('--content-size', type=int, default=50000, help='Длина текста книги (символов)')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Размер пакета bulk_create')
+        parser.add_argument('--seed', type=int, default=42, help='Начальное значение генератора')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        # Метка запуска делает slug и логины уникальными при повторной генерации
+        self.run = f'{int(time.time()):x}'
+        sizes = {name: options[name] if options[name] is not None else value
+                 for name, value in PRESETS[options['preset']].items()}
+
+        started = time.monotonic()
+        users = self._step('users', sizes['users'], self.create_users)
+        objects = {
+            Book: self._step('books', sizes['books'], self.create_books, options['content_size']),
+            Film: self._step('films', sizes['films'], self.create_films),
+            Course: self._step('courses', sizes['courses'], self.create_courses),
+        }
+        self._step('sites', sizes['sites'], self.create_sites)
+        topics = self._step('topics', sizes['topics'], self.create_topics, users)
+        self._step('posts', sizes['posts'], self.create_posts, users, topics)
+        self._step('reviews', sizes['reviews'], self.create_reviews, users, objects)
+        self._step('favorites', sizes['favorites'], self.create_favorites, users, objects)
+        self.stdout.write(self.style.SUCCESS(f'Готово за {time.monotonic() - started:.1f} с'))
+
+    def _step(self, name, count, create, *args):
+        started = time.monotonic()
+        result = create(count, *args) if count else []
+        self.stdout.write(f'{name:10} {count:>9}  {time.monotonic() - started:7.1f} с')
+        return result
+
+    def _text(self, words):
+        return ' '.join(self.random.choices(WORDS, k=words)).capitalize() + '.'
+
+    def _paragraphs(self, size):
+        parts, length = [], 0
+        while length < size:
+            paragraph = ' '.join(self._text(self.random.randint(8, 20)) for _ in range(self.random.randint(3, 8)))
+            parts.append(paragraph)
+            length += len(paragraph) + 2
+        return '\n\n'.join(parts)[:size]
+
+    def _bulk_create(self, model, objects):
+        """Сохраняет объекты пакетами, не держа в памяти весь набор; возвращает первичные ключи"""
+        ids, batch = [], []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                ids += self._flush(model, batch)
+                batch = []
+        if batch:
+            ids += self._flush(model, batch)
+        return ids
+
+    def _flush(self, model, batch):
+        with transaction.atomic():
+            created = model.objects.bulk_create(batch)
+        return [obj.pk for obj in created]
+
+    def create_users(self, count):
+        # Один хеш на всех: make_password на каждого занял бы минуты
+        password = make_password(f'bench-{self.run}')
+        return self._bulk_create(User, (
+            User(username=f'bench_{self.run}_{number}', email=f'bench{number}@example.com', password=password)
+            for number in range(count)
+        ))
+
+    def create_books(self, count, content_size):
+        # Тексты повторяются из небольшого набора: генерация - не узкое место измерений
+        texts = [self._paragraphs(content_size) for _ in range(min(count, 20))]
+        offsets = [compute_chunk_offsets(text) for text in texts]
+
+        def books():
+            for number in range(count):
+                variant = number % len(texts)
+                yield Book(
+                    title=self._text(3)[:-1], author=self._text(2)[:-1],
+                    description=self._text(40), content=texts[variant], chunk_offsets=offsets[variant],
+                    tags=', '.join(self.random.sample(WORDS, 3)),
+                    has_subtitles=self.random.random() < 0.5,
+                    has_audio_description=self.random.random() < 0.2,
+                )
+        return self._bulk_create(Book, books())
+
+    def create_films(self, count):
+        for number, name in enumerate(GENRES):
+            Genre.objects.get_or_create(slug=f'bench-genre-{number}', defaults={'name': name})
+        genres = list(Genre.objects.values_list('pk', flat=True))
+        actors = self._bulk_create(Actor, (Actor(name=self._text(2)[:-1]) for _ in range(max(count // 5, 1))))
+        directors = self._bulk_create(Director, (Director(name=self._text(2)[:-1]) for _ in range(max(count // 20, 1))))
+
+        film_ids = self._bulk_create(Film, (
+            Film(
+                title=self._text(3)[:-1], slug=f'bench-{self.run}-{number}',
+                content_type=self.random.choice(FILM_TYPES),
+                description=self._text(80), short_description=self._text(15),
+                year=self.random.randint(1950, 2026), duration=self.random.randint(70, 180),
+                imdb_rating=round(self.random.uniform(4, 9.5), 1),
+                views_count=int(self.random.paretovariate(1.2) * 100),
+                has_sign_language=self.random.random() < 0.1,
+            )
+            for number in range(count)
+        ))
+
+        def links(through, field, pool, per_film):
+            for film_id in film_ids:
+                for related_id in set(self.random.choices(pool, k=per_film)):
+                    yield through(film_id=film_id, **{field: related_id})
+        self._bulk_create(Film.genres.through, links(Film.genres.through, 'genre_id', genres, 2))
+        self._bulk_create(Film.actors.through, links(Film.actors.through, 'actor_id', actors, 6))
+        self._bulk_create(Film.directors.through, links(Film.directors.through, 'director_id', directors, 1))
+        return film_ids
+
+    def create_courses(self, count):
+        return self._bulk_create(Course, (
+            Course(
+                title=self._text(4)[:-1], instructor=self._text(2)[:-1], description=self._text(60),
+                duration_hours=self.random.randint(2, 120), level=self.random.choice(LEVELS),
+                tags=', '.join(self.random.sample(WORDS, 3)), platform='Stepik',
+            )
+            for _ in range(count)
+        ))
+
+    def create_sites(self, count):
+        categories = list(SiteCategory.objects.values_list('pk', flat=True))
+        if not categories:
+            categories = [
+                SiteCategory.objects.create(name=f'Категория {number}', slug=f'bench-{self.run}-{number}', order=number).pk
+                for number in range(8)
+            ]
+        return self._bulk_create(Site, (
+            Site(
+                title=self._text(3)[:-1], slug=f'bench-{self.run}-{number}',
+                url=f'https://example.com/{self.run}/{number}', category_id=self.random.choice(categories),
+                description=self._text(50), short_description=self._text(10),
+                is_featured=self.random.random() < 0.05,
+            )
+            for number in range(count)
+        ))
+
+    def create_topics(self, count, users):
+        # Категории форума - дерево MPTT, их создаем обычным save()
+        categories = list(ForumCategory.objects.values_list('pk', flat=True))
+        if not categories:
+            categories = [
+                ForumCategory.objects.create(name=f'Раздел {number}', slug=f'bench-{self.run}-{number}', order=number).pk
+                for number in range(6)
+            ]
+        return self._bulk_create(ForumTopic, (
+            ForumTopic(
+                title=self._text(5)[:-1], category_id=self.random.choice(categories),
+                author_id=self.random.choice(users), content=self._text(60),
+                views=self.random.randint(0, 5000), is_pinned=self.random.random() < 0.01,
+            )
+            for _ in range(count)
+        ))
+
+    def create_posts(self, count, users, topics):
+        if not topics:
+            topics = list(ForumTopic.objects.values_list('pk', flat=True))
+        # Первые темы собирают больше ответов: длинные темы для постраничного вывода
+        ids = self._bulk_create(ForumPost, (
+            ForumPost(
+                topic_id=topics[int(len(topics) * self.random.random() ** 2)],
+                author_id=self.random.choice(users), content=self._text(self.random.randint(10, 120)),
+            )
+            for _ in range(count)
+        ))
+        posts = ForumPost.objects.filter(topic=OuterRef('pk')).order_by().values('topic').annotate(n=Count('pk')).values('n')
+        ForumTopic.objects.update(posts_count=Coalesce(Subquery(posts, output_field=IntegerField()), 0))
+        topics_count = ForumTopic.objects.filter(category=OuterRef('pk')).order_by().values('category').annotate(n=Count('pk')).values('n')
+        ForumCategory.objects.update(topics_count=Coalesce(Subquery(topics_count, output_field=IntegerField()), 0))
+        return ids
+
+    def _pairs(self, count, users, objects):
+        """
+        Уникальные пары (пользователь, объект): у каждого пользователя
+        случайный набор объектов без повторов.
+        """
+        keys = [
+            (ContentType.objects.get_for_model(model).pk, object_id)
+            for model, ids in objects.items() for object_id in ids
+        ]
+        if not keys or not users:
+            return
+        per_user = min(len(keys), -(-count // len(users)))
+        produced = 0
+        for user_id in users:
+            for key in self.random.sample(keys, per_user):
+                if produced >= count:
+                    return
+                yield user_id, key
+                produced += 1
+
+    def create_reviews(self, count, users, objects):
+        touched = set()
+
+        def reviews():
+            for user_id, key in self._pairs(count, users, objects):
+                touched.add(key)
+                yield Review(
+                    user_id=user_id, content_type_id=key[0], object_id=key[1],
+                    rating=min(5, max(1, round(self.random.gauss(3.8, 1)))),
+                    comment=self._text(self.random.randint(5, 60)),
+                    accessibility_subtitles=self.random.random() < 0.5,
+                )
+        ids = self._bulk_create(Review, reviews())
+        touched = list(touched)
+        for start in range(0, len(touched), 500):
+            update_cached_ratings(touched[start:start + 500])
+        return ids
+
+    def create_favorites(self, count, users, objects):
+        ids = self._bulk_create(Favorite, (
+            Favorite(user_id=user_id, content_type_id=key[0], object_id=key[1])
+            for user_id, key in self._pairs(count, users, objects)
+        ))
+        for model in objects:
+            recount_favorites(model)
+        return ids
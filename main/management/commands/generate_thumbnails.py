@@ -0,0 +1,40 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from main import thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Создает миниатюры для уже загруженных изображений (постеры, фото, логотипы)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Пересоздать миниатюры, даже если манифест уже есть')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Количество потоков')
+
+    def handle(self, *args, **options):
+        files = []
+        for model, field_names in thumbnails.registry.items():
+            queryset = model.objects.only('pk', *field_names).order_by('pk')
+            for obj in queryset.iterator(chunk_size=500):
+                for field_name in field_names:
+                    field_file = getattr(obj, field_name)
+                    if not field_file:
+                        continue
+                    if options['force'] or thumbnails.get_manifest(field_file) is None:
+                        files.append(field_file)
+
+        def generate(field_file):
+            try:
+                thumbnails.generate_thumbnails(field_file.storage, field_file.name)
+                return True
+            except Exception as e:
+                self.stderr.write(f'{field_file.name}: {e}')
+                return False
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            done = sum(executor.map(generate, files))
+
+        self.stdout.write(self.style.SUCCESS(f'Обработано изображений: {done} из {len(files)}'))
@@ -0,0 +1,98 @@
+import json
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from apps.books.models import Book
+from apps.books.views import BOOK_SORTS, BOOKS_PER_PAGE
+from apps.education.views import COURSE_SORTS, COURSES_BY_LEVEL_PER_PAGE, COURSES_PER_PAGE, course_list_queryset
+from apps.films.views import (
+    FILM_SORTS, FILMS_PER_PAGE, film_list_queryset, latest_films, popular_films_fallback,
+)
+from apps.forum.views import (
+    POSTS_PER_PAGE, TOPICS_PER_PAGE, category_topics_queryset, recent_topics_queryset, topic_posts_queryset,
+)
+from apps.reviews.services import FAVORITES_PER_PAGE, REVIEWS_PER_PAGE, reviews_page_queryset, user_favorites_queryset
+from apps.sites.views import SITE_SORTS, SITES_PER_PAGE, featured_sites_queryset, site_list_queryset
+
+
+def audited_queries():
+    """
+    Запросы горячих путей, построенные теми же функциями, что и в
+    представлениях (фильтры, сортировка по умолчанию, LIMIT страницы):
+    изменение представления сразу попадает в аудит.
+    """
+    book_type = ContentType.objects.get_for_model(Book)
+    queries = {
+        'education.course_by_level': course_list_queryset('beginner')[:COURSES_BY_LEVEL_PER_PAGE],
+        'films.film_list new': latest_films(),
+        'films.film_list popular': popular_films_fallback()[:10],
+        'sites.site_list category': SITE_SORTS.apply(site_list_queryset('gov'), None)[0][:SITES_PER_PAGE],
+        'sites.site_list featured': featured_sites_queryset(),
+        'forum.forum_index recent': recent_topics_queryset(),
+        'forum.category_topics': category_topics_queryset(1)[:TOPICS_PER_PAGE],
+        'forum.topic_detail posts': topic_posts_queryset(1)[:POSTS_PER_PAGE],
+        'reviews object reviews': reviews_page_queryset(book_type, 1)[:REVIEWS_PER_PAGE + 1],
+        'reviews profile favorites': user_favorites_queryset(1)[:FAVORITES_PER_PAGE],
+    }
+    # Списки: сортировка по умолчанию (имя списка) и все сортировки ?sort=
+    sorted_lists = {
+        'books.book_list': (BOOK_SORTS, Book.objects.all(), BOOKS_PER_PAGE),
+        'education.course_list': (COURSE_SORTS, course_list_queryset(), COURSES_PER_PAGE),
+        'films.film_list': (FILM_SORTS, film_list_queryset(), FILMS_PER_PAGE),
+        'sites.site_list': (SITE_SORTS, site_list_queryset(), SITES_PER_PAGE),
+    }
+    for name, (registry, queryset, per_page) in sorted_lists.items():
+        queries[name] = registry.apply(queryset, None)[0][:per_page]
+        for key, option in registry.options.items():
+            queries[f'{name} sort={key}'] = option.apply(queryset)[:per_page]
+    return queries
+
+
+def find_issues(plan, vendor):
+    """Признаки неиндексированного доступа в плане запроса"""
+    issues = []
+    for line in plan.splitlines():
+        if vendor == 'sqlite':
+            if 'SCAN ' in line and ' USING ' not in line:
+                issues.append('полный просмотр ' + line.split('SCAN ', 1)[1].split()[0])
+            if 'USE TEMP B-TREE' in line:
+                issues.append('сортировка без индекса')
+        elif vendor == 'postgresql':
+            if 'Seq Scan on ' in line:
+                issues.append('полный просмотр ' + line.split('Seq Scan on ', 1)[1].split()[0])
+            if line.strip().lstrip('-> ').startswith('Sort '):
+                issues.append('сортировка без индекса')
+    return issues
+
+
+class Command(BaseCommand):
+    help = (
+        'Аудит индексов: EXPLAIN (QUERY PLAN) для запросов горячих путей '
+        'представлений, поиск полных просмотров таблиц и сортировок без индекса'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Сохранить планы в JSON (для сравнения до/после)')
+        parser.add_argument('--only-issues', action='store_true', help='Показывать только проблемные запросы')
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        report = {}
+        for name, queryset in audited_queries().items():
+            plan = queryset.explain()
+            issues = find_issues(plan, vendor)
+            report[name] = {'sql': str(queryset.query), 'plan': plan, 'issues': issues}
+            if options['only_issues'] and not issues:
+                continue
+            style = self.style.WARNING if issues else self.style.SUCCESS
+            self.stdout.write(style(f'{name}: {"; ".join(issues) or "OK"}'))
+            for line in plan.splitlines():
+                self.stdout.write(f'    {line}')
+
+        problems = sum(1 for item in report.values() if item['issues'])
+        self.stdout.write(f'Запросов: {len(report)}, с проблемами: {problems}')
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,180 @@
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from urllib.parse import quote
+from wsgiref.util import setup_testing_defaults
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import override_settings
+
+from .benchmark import percentile
+
+DEFAULT_PATHS = ['/', '/search/?q=история']
+
+
+class QueryLatency:
+    """execute_wrapper: задержка каждого запроса - сетевой круг до сервера базы"""
+
+    def __init__(self, milliseconds):
+        self.seconds = milliseconds / 1000
+
+    def __call__(self, execute, sql, params, many, context):
+        time.sleep(self.seconds)
+        return execute(sql, params, many, context)
+
+    def install(self, sender, connection, **kwargs):
+        # Объект соединения потока переживает переподключения (CONN_MAX_AGE=0)
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+def _split(path):
+    path_info, _, query = path.partition('?')
+    return path_info, quote(query, safe='=&')
+
+
+def wsgi_request(application, path):
+    path_info, query = _split(path)
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path_info, 'QUERY_STRING': query, 'HTTP_HOST': '127.0.0.1'}
+    setup_testing_defaults(environ)
+    status = []
+    result = application(environ, lambda line, headers, exc_info=None: status.append(line))
+    try:
+        for _ in result:
+            pass
+    finally:
+        # Сигнал request_finished: закрытие соединений с базой, как на сервере
+        result.close()
+    return int(status[0].split()[0])
+
+
+async def asgi_request(application, path):
+    path_info, query = _split(path)
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path_info, 'raw_path': path_info.encode(), 'query_string': query.encode(),
+        'headers': [(b'host', b'127.0.0.1')], 'client': ('127.0.0.1', 50000), 'server': ('127.0.0.1', 80),
+    }
+    received = False
+    status = []
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # Клиент не отключается до конца ответа
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность WSGI- и ASGI-приложения проекта при '
+        'одновременных клиентах: приложения вызываются в процессе, без сетевого '
+        'сервера (WSGI - пул потоков, как у многопоточного сервера; ASGI - один цикл событий)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', action='append', help=f'Адрес страницы (по умолчанию {", ".join(DEFAULT_PATHS)})')
+        parser.add_argument('--concurrency', type=int, default=16, help='Одновременных клиентов')
+        parser.add_argument('--requests', type=int, default=400, help='Запросов на страницу и интерфейс')
+        parser.add_argument('--warmup', type=int, default=10, help='Запросов прогрева (не учитываются)')
+        parser.add_argument('--interface', choices=['wsgi', 'asgi', 'both'], default='both')
+        parser.add_argument('--no-cache', action='store_true',
+                            help='Отключить кэш страниц: каждый запрос выполняет представление')
+        parser.add_argument('--db-latency', type=float, default=0,
+                            help='Задержка каждого SQL-запроса, мс (имитация сервера базы в сети; SQLite - в процессе)')
+        parser.add_argument('--query-threads', type=int,
+                            help='ASYNC_QUERY_THREADS на время прогона (0 - запросы представлений по очереди)')
+
+    def handle(self, *args, **options):
+        interfaces = ['wsgi', 'asgi'] if options['interface'] == 'both' else [options['interface']]
+        with ExitStack() as stack:
+            if options['no_cache']:
+                stack.enter_context(override_settings(CACHES={
+                    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+                }))
+            if options['query_threads'] is not None:
+                stack.enter_context(override_settings(ASYNC_QUERY_THREADS=options['query_threads']))
+            if options['db_latency']:
+                # Каждое новое соединение (в любом потоке) и уже открытые
+                latency = QueryLatency(options['db_latency'])
+                connection_created.connect(latency.install, weak=False)
+                stack.callback(connection_created.disconnect, latency.install)
+                for connection in connections.all(initialized_only=True):
+                    stack.enter_context(connection.execute_wrapper(latency))
+            runners = {'wsgi': self._run_wsgi, 'asgi': self._run_asgi}
+            for path in options['path'] or DEFAULT_PATHS:
+                for interface in interfaces:
+                    timings, statuses, elapsed = runners[interface](path, options)
+                    self._print(path, interface, timings, statuses, elapsed)
+
+    def _run_wsgi(self, path, options):
+        application = get_wsgi_application()
+        for _ in range(options['warmup']):
+            wsgi_request(application, path)
+
+        def timed():
+            start = time.perf_counter()
+            status = wsgi_request(application, path)
+            return (time.perf_counter() - start) * 1000, status
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            results = list(executor.map(lambda _: timed(), range(options['requests'])))
+        elapsed = time.perf_counter() - start
+        return [ms for ms, _ in results], [status for _, status in results], elapsed
+
+    def _run_asgi(self, path, options):
+        application = get_asgi_application()
+
+        async def timed():
+            start = time.perf_counter()
+            status = await asgi_request(application, path)
+            return (time.perf_counter() - start) * 1000, status
+
+        async def run():
+            for _ in range(options['warmup']):
+                await asgi_request(application, path)
+            remaining = iter(range(options['requests']))
+            results = []
+
+            async def client():
+                for _ in remaining:
+                    results.append(await timed())
+
+            start = time.perf_counter()
+            await asyncio.gather(*(client() for _ in range(options['concurrency'])))
+            return results, time.perf_counter() - start
+
+        # Отдельный поток: у команды нет своего цикла событий, а asyncio.run
+        # в основном потоке мешал бы синхронным вызовам Django после прогона
+        output = {}
+        thread = threading.Thread(target=lambda: output.update(result=asyncio.run(run())))
+        thread.start()
+        thread.join()
+        results, elapsed = output['result']
+        return [ms for ms, _ in results], [status for _, status in results], elapsed
+
+    def _print(self, path, interface, timings, statuses, elapsed):
+        errors = sum(1 for status in statuses if status >= 400)
+        line = (
+            f'{path:30} {interface:4}  {len(timings) / elapsed:8.1f} запр/с  '
+            f'p50 {percentile(timings, 0.5):8.2f} мс  p95 {percentile(timings, 0.95):8.2f} мс  '
+            f'сред. {statistics.fmean(timings):8.2f} мс  ошибок {errors}'
+        )
+        self.stdout.write(self.style.WARNING(line) if errors else line)
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.reviews.ranking import rebuild_rankings
+from apps.reviews.services import CONTENT_TYPES
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рейтинг «лучшие по оценкам» (байесовская оценка, apps/reviews/ranking.py). '
+        'Запускайте по расписанию, например раз в час из cron'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('types', nargs='*', help=f'Типы контента: {", ".join(sorted(CONTENT_TYPES))} (по умолчанию все)')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Размер пакета bulk_create')
+
+    def handle(self, *args, **options):
+        unknown = set(options['types']) - set(CONTENT_TYPES)
+        if unknown:
+            raise CommandError(f'Неизвестные типы контента: {", ".join(sorted(unknown))}')
+        for content_type in options['types'] or sorted(CONTENT_TYPES):
+            started = time.monotonic()
+            rows = rebuild_rankings(content_type, batch_size=options['batch_size'])
+            self.stdout.write(f'{content_type:8} {rows:>9} строк  {time.monotonic() - started:6.1f} с')
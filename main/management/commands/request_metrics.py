@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from main.metrics import get_metrics, reset_metrics
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводка метрик запросов по представлениям (main/metrics.py). '
+        'Данные других процессов видны при общем кэше (file или redis)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Вывести полную сводку с гистограммами в JSON')
+        parser.add_argument('--reset', action='store_true', help='Обнулить накопленные метрики')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            reset_metrics()
+            self.stdout.write(self.style.SUCCESS('Метрики обнулены'))
+            return
+
+        metrics = get_metrics()
+        if options['json']:
+            self.stdout.write(json.dumps(metrics, ensure_ascii=False, indent=2))
+            return
+        if not metrics:
+            self.stdout.write('Метрик нет: включите REQUEST_METRICS_ENABLED')
+            return
+
+        header = f'{"представление":<32} {"запросы":>8} {"p50 мс":>7} {"p95 мс":>7} {"SQL":>6} {"повт.":>6} {"БД мс":>7} {"шабл. мс":>8}'
+        self.stdout.write(header)
+        rows = sorted(metrics.items(), key=lambda item: item[1]['total']['avg'] * item[1]['requests'], reverse=True)
+        for view, item in rows:
+            line = (
+                f'{view:<32} {item["requests"]:>8} {item["total"]["p50"]:>7} {item["total"]["p95"]:>7} '
+                f'{item["queries"]["avg"]:>6} {item["similar_queries_avg"]:>6} '
+                f'{item["db"]["avg"]:>7} {item["template"]["avg"]:>8}'
+            )
+            style = self.style.WARNING if item['similar_queries_avg'] >= 5 else str
+            self.stdout.write(style(line))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.sites.clicks import flush_clicks, rollup_clicks
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит журнал переходов на сайты в счетчики Site.visits_count и дневную '
+        'статистику (apps/sites/clicks.py). Запускайте по расписанию, например каждые 5 минут'
+    )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        # Переходы этого процесса (веб-процессы записывают свои раз в SITE_CLICK_FLUSH_INTERVAL)
+        flush_clicks()
+        clicks = rollup_clicks()
+        self.stdout.write(f'Перенесено переходов: {clicks}, {time.monotonic() - started:.1f} с')
@@ -0,0 +1,328 @@
+# main/metrics.py
+"""
+Метрики запросов: число SQL-запросов, повторяющиеся запросы (N+1),
+время в базе, время рендеринга шаблонов и общее время ответа.
+
+RequestMetricsMiddleware включается настройкой REQUEST_METRICS_ENABLED и
+не зависит от DEBUG: запросы к базе перехватываются через
+connection.execute_wrapper, SQL не накапливается в connection.queries.
+
+Значения каждого запроса отдаются в заголовке Server-Timing и
+суммируются по представлениям в гистограммы. Гистограммы копятся в
+памяти процесса и раз в REQUEST_METRICS_FLUSH_INTERVAL секунд
+переносятся в кэш (cache.incr), поэтому видны всем процессам:
+см. get_metrics(), /metrics/ (для персонала) и manage.py request_metrics.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+from .cache import get_cache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'metrics:'
+VIEWS_KEY = KEY_PREFIX + 'views'
+
+# Верхние границы корзин гистограмм (последняя - все остальное)
+TIME_BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]   # мс
+QUERY_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100, 200]
+HISTOGRAMS = {
+    'total': TIME_BUCKETS,
+    'db': TIME_BUCKETS,
+    'template': TIME_BUCKETS,
+    'queries': QUERY_BUCKETS,
+}
+
+_current = ContextVar('request_metrics', default=None)
+# Все действующие измерения: запрос внутри manage.py benchmark учитывается в обоих
+_active = ContextVar('active_request_metrics', default=())
+
+
+class RequestMetrics:
+    """Измерения одного HTTP-запроса"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.statements = Counter()   # SQL без параметров -> число выполнений
+        self.exact = Counter()        # (SQL, параметры) -> число выполнений
+        # Запросы одного ответа могут выполняться в потоках пула (main/parallel.py)
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper: считает каждый запрос и его время
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.db_time += elapsed
+                self.queries += 1
+                self.statements[sql] += 1
+                self.exact[(sql, repr(params))] += 1
+
+    @property
+    def duplicates(self):
+        """Повторы запросов с теми же параметрами (их можно не выполнять)"""
+        return sum(count - 1 for count in self.exact.values())
+
+    @property
+    def similar(self):
+        """Повторы одного SQL с разными параметрами (признак N+1)"""
+        return sum(count - 1 for count in self.statements.values())
+
+    def most_repeated(self):
+        return self.statements.most_common(1)[0] if self.statements else (None, 0)
+
+
+@contextmanager
+def track_queries(metrics=None):
+    """Учитывает запросы текущего потока в metrics или во всех действующих измерениях"""
+    with ExitStack() as stack:
+        for item in (metrics,) if metrics is not None else _active.get():
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(item))
+        yield
+
+
+@contextmanager
+def _activate(metrics):
+    current, active = _current.set(metrics), _active.set(_active.get() + (metrics,))
+    try:
+        yield
+    finally:
+        _active.reset(active)
+        _current.reset(current)
+
+
+@contextmanager
+def measure(metrics):
+    """
+    Учитывает в metrics запросы текущего потока и потоков пула
+    main/parallel.py (они получают metrics через контекст)
+    """
+    with _activate(metrics), track_queries(metrics):
+        yield metrics
+
+
+def _timed_render(original):
+    def render(self, context):
+        metrics = _current.get()
+        # Вложенные шаблоны ({% include %}, наследование) входят во время внешнего
+        if metrics is None or metrics.template_depth:
+            return original(self, context)
+        metrics.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            metrics.template_time += time.perf_counter() - start
+            metrics.template_depth -= 1
+    render.original = original
+    return render
+
+
+def install_template_timer():
+    if not hasattr(Template.render, 'original'):
+        Template.render = _timed_render(Template.render)
+
+
+def _bucket(value, bounds):
+    for bound in bounds:
+        if value <= bound:
+            return str(bound)
+    return 'inf'
+
+
+class MetricsStore:
+    """Счетчики гистограмм в памяти процесса с периодическим переносом в кэш"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = Counter()
+        self.views = set()
+        self.last_flush = time.monotonic()
+
+    def add(self, view_name, metrics, total_time):
+        values = {
+            'total': total_time * 1000,
+            'db': metrics.db_time * 1000,
+            'template': metrics.template_time * 1000,
+            'queries': metrics.queries,
+        }
+        with self.lock:
+            self.views.add(view_name)
+            self.counters[f'{view_name}|count'] += 1
+            self.counters[f'{view_name}|duplicates'] += metrics.duplicates
+            self.counters[f'{view_name}|similar'] += metrics.similar
+            for name, value in values.items():
+                self.counters[f'{view_name}|{name}|{_bucket(value, HISTOGRAMS[name])}'] += 1
+                # Суммы времени - в микросекундах: cache.incr работает с целыми
+                self.counters[f'{view_name}|{name}|sum'] += round(value * 1000) if name != 'queries' else value
+        interval = getattr(settings, 'REQUEST_METRICS_FLUSH_INTERVAL', 10)
+        if time.monotonic() - self.last_flush >= interval:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            counters, self.counters = self.counters, Counter()
+            views, self.views = self.views, set()
+            self.last_flush = time.monotonic()
+        if not counters:
+            return
+        cache = get_cache()
+        known = cache.get(VIEWS_KEY, set())
+        if not views <= known:
+            cache.set(VIEWS_KEY, known | views, None)
+        for key, value in counters.items():
+            if not value:
+                continue
+            key = KEY_PREFIX + key
+            try:
+                cache.incr(key, value)
+            except ValueError:
+                if not cache.add(key, value, None):
+                    cache.incr(key, value)
+
+
+store = MetricsStore()
+
+
+def _bucket_names(bounds):
+    return [str(bound) for bound in bounds] + ['inf']
+
+
+def _view_keys(view):
+    keys = [f'{KEY_PREFIX}{view}|{name}' for name in ('count', 'duplicates', 'similar')]
+    for name, bounds in HISTOGRAMS.items():
+        keys += [f'{KEY_PREFIX}{view}|{name}|{bucket}' for bucket in _bucket_names(bounds) + ['sum']]
+    return keys
+
+
+def _percentile(histogram, count, fraction):
+    """Верхняя граница корзины, в которую попадает заданная доля запросов"""
+    seen = 0
+    for bucket, hits in histogram.items():
+        seen += hits
+        if seen >= count * fraction:
+            return bucket
+    return 'inf'
+
+
+def get_metrics():
+    """Сводка по представлениям: число запросов, средние значения, p50/p95 и гистограммы"""
+    store.flush()
+    cache = get_cache()
+    views = sorted(cache.get(VIEWS_KEY, set()))
+    values = cache.get_many([key for view in views for key in _view_keys(view)])
+
+    def value(key):
+        return values.get(KEY_PREFIX + key, 0)
+
+    result = {}
+    for view in views:
+        count = value(f'{view}|count')
+        if not count:
+            continue
+        item = {
+            'requests': count,
+            'duplicate_queries_avg': round(value(f'{view}|duplicates') / count, 2),
+            'similar_queries_avg': round(value(f'{view}|similar') / count, 2),
+        }
+        for name, bounds in HISTOGRAMS.items():
+            histogram = {bucket: value(f'{view}|{name}|{bucket}') for bucket in _bucket_names(bounds)}
+            total = value(f'{view}|{name}|sum')
+            item[name] = {
+                # Время - в миллисекундах (суммы хранятся в микросекундах)
+                'avg': round(total / count, 2) if name == 'queries' else round(total / count / 1000, 2),
+                'p50': _percentile(histogram, count, 0.5),
+                'p95': _percentile(histogram, count, 0.95),
+                'histogram': {bucket: hits for bucket, hits in histogram.items() if hits},
+            }
+        result[view] = item
+    return result
+
+
+def reset_metrics():
+    store.flush()
+    cache = get_cache()
+    views = cache.get(VIEWS_KEY, set())
+    cache.delete_many([VIEWS_KEY] + [key for view in views for key in _view_keys(view)])
+
+
+def _server_timing(metrics, total_time):
+    return ', '.join([
+        f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries, {metrics.similar} repeated"',
+        f'tpl;dur={metrics.template_time * 1000:.1f}',
+        f'total;dur={total_time * 1000:.1f}',
+    ])
+
+
+class RequestMetricsMiddleware:
+    """
+    Измеряет каждый запрос. Должен стоять первым в MIDDLEWARE, чтобы
+    учитывать запросы к базе из остальных middleware (сессии, пользователь).
+    Работает и в асинхронной цепочке (ASGI), не переводя ее в синхронный режим.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        install_template_timer()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        start = time.perf_counter()
+        with measure(metrics):
+            response = self.get_response(request)
+        return self._finish(request, response, metrics, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        start = time.perf_counter()
+        with _activate(metrics):
+            # Синхронный код запроса (ORM, сессии, пользователь) выполняется в одном
+            # потоке ThreadSensitiveContext: обертки ставятся на его соединения
+            queries = ExitStack()
+            await sync_to_async(queries.enter_context)(track_queries())
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(queries.close)()
+        return await sync_to_async(self._finish)(request, response, metrics, time.perf_counter() - start)
+
+    def _finish(self, request, response, metrics, total_time):
+        match = request.resolver_match
+        view_name = match.view_name if match else 'unresolved'
+        store.add(view_name, metrics, total_time)
+
+        sql, repeats = metrics.most_repeated()
+        threshold = getattr(settings, 'REQUEST_METRICS_DUPLICATE_THRESHOLD', 5)
+        if repeats >= threshold:
+            logger.warning(
+                '%s: %d SQL queries, one statement repeated %d times (possible N+1): %s',
+                view_name, metrics.queries, repeats, sql,
+            )
+        if getattr(settings, 'REQUEST_METRICS_SERVER_TIMING', True):
+            response['Server-Timing'] = _server_timing(metrics, total_time)
+        return response
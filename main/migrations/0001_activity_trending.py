@@ -0,0 +1,51 @@
+# Generated by Django 6.0.2 on 2026-10-19 14:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('hour', models.DateTimeField(verbose_name='Час')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='Просмотры')),
+                ('favorites', models.PositiveIntegerField(default=0, verbose_name='Добавления в избранное')),
+                ('reviews', models.PositiveIntegerField(default=0, verbose_name='Отзывы')),
+                ('posts', models.PositiveIntegerField(default=0, verbose_name='Сообщения')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'verbose_name': 'Активность за час',
+                'verbose_name_plural': 'Активность по часам',
+                'indexes': [models.Index(fields=['hour'], name='activity_hour_idx')],
+                'unique_together': {('content_type', 'object_id', 'hour')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('score', models.FloatField(verbose_name='Популярность')),
+                ('computed_at', models.DateTimeField(verbose_name='Дата расчета')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'verbose_name': 'Популярность',
+                'verbose_name_plural': 'Популярное сейчас',
+                'indexes': [models.Index(fields=['content_type', '-score', 'object_id'], name='trending_score_idx')],
+                'unique_together': {('content_type', 'object_id')},
+            },
+        ),
+    ]
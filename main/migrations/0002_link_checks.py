@@ -0,0 +1,37 @@
+# Generated by Django 6.0.2 on 2026-10-19 15:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('main', '0001_activity_trending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LinkCheck',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('url', models.URLField(max_length=500, verbose_name='Ссылка')),
+                ('checked_at', models.DateTimeField(verbose_name='Время проверки')),
+                ('status', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Код ответа')),
+                ('latency_ms', models.PositiveIntegerField(blank=True, null=True, verbose_name='Время ответа, мс')),
+                ('error', models.CharField(blank=True, max_length=200, verbose_name='Ошибка')),
+                ('is_alive', models.BooleanField(verbose_name='Доступна')),
+                ('failures', models.PositiveIntegerField(default=0, verbose_name='Неудач подряд')),
+                ('etag', models.CharField(blank=True, max_length=200, verbose_name='ETag')),
+                ('last_modified', models.CharField(blank=True, max_length=100, verbose_name='Last-Modified')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'verbose_name': 'Проверка ссылки',
+                'verbose_name_plural': 'Проверки ссылок',
+                'indexes': [models.Index(fields=['content_type', 'object_id', 'id'], name='link_check_object_idx'), models.Index(fields=['checked_at'], name='link_check_time_idx')],
+            },
+        ),
+    ]
@@ -1,3 +1,82 @@
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
 
-# Create your models here.
+
+class ActivityBucket(models.Model):
+    """Активность по объекту за один час (см. main/trending.py)"""
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey('content_type', 'object_id')
+    hour = models.DateTimeField('Час')
+
+    views = models.PositiveIntegerField('Просмотры', default=0)
+    favorites = models.PositiveIntegerField('Добавления в избранное', default=0)
+    reviews = models.PositiveIntegerField('Отзывы', default=0)
+    posts = models.PositiveIntegerField('Сообщения', default=0)
+
+    class Meta:
+        unique_together = ('content_type', 'object_id', 'hour')
+        verbose_name = 'Активность за час'
+        verbose_name_plural = 'Активность по часам'
+        indexes = [
+            # Расчет популярности и удаление старых корзин - по диапазону часов
+            models.Index(fields=['hour'], name='activity_hour_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.content_type} #{self.object_id} {self.hour:%Y-%m-%d %H}:00'
+
+
+class TrendingScore(models.Model):
+    """Популярность объекта с затуханием по времени, пересчитывается compute_trending"""
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey('content_type', 'object_id')
+    score = models.FloatField('Популярность')
+    computed_at = models.DateTimeField('Дата расчета')
+
+    class Meta:
+        unique_together = ('content_type', 'object_id')
+        verbose_name = 'Популярность'
+        verbose_name_plural = 'Популярное сейчас'
+        indexes = [
+            models.Index(fields=['content_type', '-score', 'object_id'], name='trending_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.content_type} #{self.object_id}: {self.score:.2f}'
+
+
+class LinkCheck(models.Model):
+    """Результат проверки внешней ссылки объекта (см. main/linkcheck.py)"""
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey('content_type', 'object_id')
+    url = models.URLField('Ссылка', max_length=500)
+    checked_at = models.DateTimeField('Время проверки')
+
+    status = models.PositiveSmallIntegerField('Код ответа', null=True, blank=True)
+    latency_ms = models.PositiveIntegerField('Время ответа, мс', null=True, blank=True)
+    error = models.CharField('Ошибка', max_length=200, blank=True)
+    is_alive = models.BooleanField('Доступна')
+    # Неудачных проверок подряд, включая эту
+    failures = models.PositiveIntegerField('Неудач подряд', default=0)
+
+    # Валидаторы ответа для условного запроса при следующей проверке
+    etag = models.CharField('ETag', max_length=200, blank=True)
+    last_modified = models.CharField('Last-Modified', max_length=100, blank=True)
+
+    class Meta:
+        verbose_name = 'Проверка ссылки'
+        verbose_name_plural = 'Проверки ссылок'
+        indexes = [
+            # Последняя проверка каждого объекта (Max('id') по объекту) и история объекта
+            models.Index(fields=['content_type', 'object_id', 'id'], name='link_check_object_idx'),
+            # Удаление старой истории
+            models.Index(fields=['checked_at'], name='link_check_time_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.url}: {self.status or self.error}'
+
@@ -0,0 +1,70 @@
+# main/parallel.py
+"""
+Одновременное выполнение независимых запросов в асинхронных представлениях.
+
+Асинхронный ORM Django (aget, acount, ...) выполняет запросы через
+sync_to_async в одном потоке, поэтому запросы одного представления все
+равно идут по очереди. gather() запускает синхронные функции в общем пуле
+из ASYNC_QUERY_THREADS потоков: у каждого потока свое соединение с базой,
+и независимые запросы выполняются одновременно. Размер пула ограничивает
+число соединений, которые открывают асинхронные представления.
+
+Внутри транзакции (в том числе транзакции теста) функции выполняются по
+очереди в потоке транзакции: другие соединения не видят ее изменений.
+"""
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from .metrics import track_queries
+
+_executor = None
+_executor_size = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor, _executor_size
+    with _executor_lock:
+        # Размер меняется только в тестах и manage.py loadtest --query-threads
+        if _executor_size != settings.ASYNC_QUERY_THREADS:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.ASYNC_QUERY_THREADS, thread_name_prefix='async-query',
+            )
+            _executor_size = settings.ASYNC_QUERY_THREADS
+        return _executor
+
+
+def _in_transaction():
+    return any(connection.in_atomic_block for connection in connections.all(initialized_only=True))
+
+
+def _run(func):
+    # Соединения потоков пула живут по тем же правилам CONN_MAX_AGE, что и в запросах
+    close_old_connections()
+    try:
+        with track_queries():
+            return func()
+    finally:
+        close_old_connections()
+
+
+async def gather(*funcs):
+    """Результаты вызовов funcs (синхронных функций без аргументов) в том же порядке"""
+    if not getattr(settings, 'ASYNC_QUERY_THREADS', 0) or await sync_to_async(_in_transaction)():
+        return [await sync_to_async(func)() for func in funcs]
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    # Контекст (закрепление за основной базой, метрики запроса) передается в потоки пула
+    return await asyncio.gather(*(
+        loop.run_in_executor(executor, partial(contextvars.copy_context().run, _run, func))
+        for func in funcs
+    ))
@@ -0,0 +1,140 @@
+# main/search.py
+"""
+Полнотекстовый поиск по каталогам.
+
+На PostgreSQL используется встроенный полнотекстовый поиск (SearchVector /
+SearchRank с конфигурацией settings.SEARCH_CONFIG, по умолчанию 'russian':
+морфология, стоп-слова) и нечеткое совпадение названия через pg_trgm.
+Оба вида поиска опираются на GIN-индексы, которые создают миграции
+приложений (см. search_index_migration).
+
+На SQLite поиск, как и раньше, - icontains по тем же полям.
+"""
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connections, migrations
+from django.db.models import Q
+
+# Поля полнотекстового поиска с весами (A - самый важный)
+# и поле для нечеткого совпадения (опечатки, неполное название)
+SEARCH_FIELDS = {
+    'books.Book': {
+        'vector': [('title', 'A'), ('author', 'A'), ('tags', 'B'), ('description', 'C')],
+        'trigram': 'title',
+    },
+    'films.Film': {
+        'vector': [('title', 'A'), ('original_title', 'A'), ('short_description', 'B'), ('description', 'C')],
+        'trigram': 'title',
+    },
+    'education.Course': {
+        'vector': [('title', 'A'), ('instructor', 'A'), ('tags', 'B'), ('description', 'C')],
+        'trigram': 'title',
+    },
+    'sites.Site': {
+        'vector': [('title', 'A'), ('short_description', 'B'), ('description', 'C')],
+        'trigram': 'title',
+    },
+    'forum.ForumTopic': {
+        'vector': [('title', 'A'), ('content', 'B')],
+        'trigram': 'title',
+    },
+}
+
+
+def get_search_config():
+    return getattr(settings, 'SEARCH_CONFIG', 'russian')
+
+
+def uses_postgres_search(using='default'):
+    return connections[using].vendor == 'postgresql'
+
+
+def get_search_vector(label):
+    """Взвешенный SearchVector модели (то же выражение, что в GIN-индексе)"""
+    from django.contrib.postgres.search import SearchVector
+    config = get_search_config()
+    return reduce(lambda a, b: a + b, [
+        SearchVector(field, weight=weight, config=config)
+        for field, weight in SEARCH_FIELDS[label]['vector']
+    ])
+
+
+def get_search_indexes(label):
+    """GIN-индексы для полнотекстового и триграммного поиска по модели"""
+    from django.contrib.postgres.indexes import GinIndex
+    app_label, model_name = label.lower().split('.')
+    trigram_field = SEARCH_FIELDS[label]['trigram']
+    return [
+        GinIndex(get_search_vector(label), name=f'{app_label}_{model_name}_search_idx'),
+        GinIndex(fields=[trigram_field], opclasses=['gin_trgm_ops'],
+                 name=f'{app_label}_{model_name}_{trigram_field}_trgm'),
+    ]
+
+
+def search_queryset(queryset, query, extra_q=None, fallback_order=None):
+    """
+    Фильтрует queryset по поисковой строке.
+
+    extra_q - дополнительные условия через OR (поиск по связанным
+    моделям, URL и т. п.), одинаковые для обоих бэкендов.
+    На PostgreSQL результат упорядочен по релевантности, на SQLite -
+    по fallback_order (или сохраняет исходный порядок).
+    """
+    query = (query or '').strip()
+    if not query:
+        return queryset
+    label = queryset.model._meta.label
+    fields = SEARCH_FIELDS[label]
+
+    if not uses_postgres_search(queryset.db):
+        condition = reduce(or_, [Q(**{f'{field}__icontains': query}) for field, _ in fields['vector']])
+        if extra_q is not None:
+            condition |= extra_q
+        queryset = queryset.filter(condition)
+        if extra_q is not None:
+            queryset = queryset.distinct()
+        return queryset.order_by(*fallback_order) if fallback_order else queryset
+
+    from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+    search_query = SearchQuery(query, config=get_search_config(), search_type='websearch')
+    trigram_field = fields['trigram']
+    queryset = queryset.annotate(
+        search=get_search_vector(label),
+        rank=SearchRank(get_search_vector(label), search_query),
+        similarity=TrigramSimilarity(trigram_field, query),
+    )
+    # trigram_similar (оператор %) использует GIN-индекс gin_trgm_ops
+    condition = Q(search=search_query) | Q(**{f'{trigram_field}__trigram_similar': query})
+    if extra_q is not None:
+        condition |= extra_q
+    queryset = queryset.filter(condition)
+    if extra_q is not None:
+        queryset = queryset.distinct()
+    return queryset.order_by('-rank', '-similarity', 'pk')
+
+
+def search_index_migration(app_label, model_name):
+    """
+    Операция миграции, создающая поисковые индексы модели на PostgreSQL
+    (вместе с расширением pg_trgm). На других базах ничего не делает.
+    """
+    label = f'{app_label}.{model_name}'
+
+    def forwards(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        model = apps.get_model(app_label, model_name)
+        for index in get_search_indexes(label):
+            schema_editor.add_index(model, index)
+
+    def backwards(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        model = apps.get_model(app_label, model_name)
+        for index in get_search_indexes(label):
+            schema_editor.remove_index(model, index)
+
+    return migrations.RunPython(forwards, backwards)
@@ -0,0 +1,220 @@
+# main/sitemaps.py
+"""
+Карта сайта (/sitemap.xml) для поисковых роботов.
+
+Разделы - книги, фильмы, курсы, опубликованные сайты, активные темы и
+категории форума и основные списки. Роботу не нужно обходить страницы
+списков: каждый объект есть в карте с датой изменения (lastmod из
+updated_at).
+
+Строки раздела читаются итератором values_list (ссылка и дата, без
+создания объектов) в порядке id, по SITEMAP_LIMIT ссылок на файл. Раздел
+больше лимита делится на страницы (?p=2, ...), /sitemap.xml - индекс всех
+файлов (стандартное представление django.contrib.sitemaps). Файл раздела
+собирается строками, без шаблона sitemap.xml: 50 тыс. ссылок через шаблон
+и reverse() на каждую - секунды. Готовый XML кэшируется (main/cache.py) с
+тегами раздела: карта пересчитывается после изменения объектов раздела,
+не на каждый запрос.
+"""
+import datetime
+from xml.sax.saxutils import escape
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.sitemaps import Sitemap
+from django.contrib.sitemaps import views as sitemap_views
+from django.core.paginator import EmptyPage, PageNotAnInteger
+from django.db.models import Max
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.http import http_date
+
+from .cache import cache_page_anonymous
+
+
+class ModelSitemap(Sitemap):
+    """Раздел по модели: model, url_name, поле для URL и поле даты изменения"""
+    model = None
+    url_name = None
+    url_field = 'pk'
+    lastmod_field = 'updated_at'
+    filters = {}
+    # Теги кэша, при смене версии которых раздел пересчитывается
+    tags = ()
+
+    @property
+    def limit(self):
+        return getattr(settings, 'SITEMAP_LIMIT', 50000)
+
+    def get_queryset(self):
+        return apps.get_model(self.model)._default_manager.filter(**self.filters)
+
+    def items(self):
+        return self.get_queryset().order_by('pk').values_list(self.url_field, self.lastmod_field)
+
+    @cached_property
+    def url_parts(self):
+        """Части адреса до и после значения url_field: reverse() один раз на раздел"""
+        marker = 'sitemap-marker' if self.url_field == 'slug' else 987654321
+        prefix, suffix = reverse(self.url_name, args=[marker]).split(str(marker))
+        return prefix, suffix
+
+    def location(self, item):
+        prefix, suffix = self.url_parts
+        return f'{prefix}{item[0]}{suffix}'
+
+    def lastmod(self, item):
+        return item[1]
+
+    def get_latest_lastmod(self):
+        # Базовый класс перебирает все объекты раздела - здесь один агрегатный запрос
+        return self.get_queryset().aggregate(latest=Max(self.lastmod_field))['latest']
+
+
+class BookSitemap(ModelSitemap):
+    model = 'books.Book'
+    url_name = 'books:book_detail'
+    tags = ('book',)
+
+
+class FilmSitemap(ModelSitemap):
+    model = 'films.Film'
+    url_name = 'films:detail'
+    url_field = 'slug'
+    tags = ('film',)
+
+
+class CourseSitemap(ModelSitemap):
+    model = 'education.Course'
+    url_name = 'education:course_detail'
+    tags = ('course',)
+
+
+class SiteSitemap(ModelSitemap):
+    model = 'sites.Site'
+    url_name = 'sites:detail'
+    url_field = 'slug'
+    filters = {'is_published': True}
+    tags = ('site',)
+
+
+class ForumTopicSitemap(ModelSitemap):
+    model = 'forum.ForumTopic'
+    url_name = 'forum:topic'
+    filters = {'is_active': True}
+    changefreq = 'daily'
+    tags = ('forum',)
+
+
+class ForumCategorySitemap(ModelSitemap):
+    """Категории форума; дата изменения - последняя активность в их темах"""
+    model = 'forum.ForumCategory'
+    url_name = 'forum:category'
+    url_field = 'slug'
+    filters = {'is_active': True}
+    changefreq = 'daily'
+    tags = ('forum',)
+
+    def items(self):
+        return self.get_queryset().annotate(latest=Max('topics__updated_at')).order_by('pk').values_list('slug', 'latest')
+
+    def get_latest_lastmod(self):
+        return self.get_queryset().aggregate(latest=Max('topics__updated_at'))['latest']
+
+
+class ListSitemap(Sitemap):
+    """Главная и основные списки"""
+    changefreq = 'daily'
+    priority = 0.8
+    tags = ()
+
+    def items(self):
+        return ['home', 'books:book_list', 'films:list', 'education:course_list', 'sites:list', 'forum:index']
+
+    def location(self, item):
+        return reverse(item)
+
+
+SITEMAPS = {
+    'pages': ListSitemap,
+    'books': BookSitemap,
+    'films': FilmSitemap,
+    'courses': CourseSitemap,
+    'sites': SiteSitemap,
+    'forum-categories': ForumCategorySitemap,
+    'forum-topics': ForumTopicSitemap,
+}
+
+# Все теги: индекс содержит даты изменения всех разделов
+ALL_TAGS = tuple(dict.fromkeys(tag for sitemap in SITEMAPS.values() for tag in sitemap.tags))
+
+
+def get_timeout():
+    return getattr(settings, 'SITEMAP_CACHE_TIMEOUT', 6 * 60 * 60)
+
+
+@cache_page_anonymous(*ALL_TAGS, timeout=get_timeout)
+def index(request):
+    # TemplateResponse отрисовывается здесь: кэш сохраняет готовое содержимое
+    return sitemap_views.index(request, SITEMAPS, sitemap_url_name='sitemap_section').render()
+
+
+def _value(sitemap, name, item):
+    value = getattr(sitemap, name, None)
+    return value(item) if callable(value) else value
+
+
+def render_section(sitemap, page, base_url):
+    """(XML страницы раздела, последняя дата изменения или None)"""
+    try:
+        rows = sitemap.paginator.page(page).object_list
+    except (EmptyPage, PageNotAnInteger):
+        raise Http404('Нет такой страницы карты сайта')
+    if hasattr(rows, 'iterator'):
+        rows = rows.iterator(chunk_size=5000)
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    ]
+    latest = None
+    for item in rows:
+        parts.append(f'<url><loc>{escape(base_url + sitemap.location(item))}</loc>')
+        lastmod = _value(sitemap, 'lastmod', item)
+        if lastmod is not None:
+            latest = lastmod if latest is None else max(latest, lastmod)
+            day = timezone.localdate(lastmod) if isinstance(lastmod, datetime.datetime) else lastmod
+            parts.append(f'<lastmod>{day.isoformat()}</lastmod>')
+        changefreq = _value(sitemap, 'changefreq', item)
+        if changefreq:
+            parts.append(f'<changefreq>{changefreq}</changefreq>')
+        priority = _value(sitemap, 'priority', item)
+        if priority is not None:
+            parts.append(f'<priority>{priority}</priority>')
+        parts.append('</url>\n')
+    parts.append('</urlset>\n')
+    return ''.join(parts), latest
+
+
+def _section(request, section):
+    xml, latest = render_section(SITEMAPS[section](), request.GET.get('p', 1), f'{request.scheme}://{request.get_host()}')
+    response = HttpResponse(xml, content_type='application/xml')
+    if isinstance(latest, datetime.datetime):
+        response.headers['Last-Modified'] = http_date(latest.timestamp())
+    response.headers['X-Robots-Tag'] = 'noindex, noodp, noarchive'
+    return response
+
+
+# Разделы кэшируются со своими тегами: новая тема форума не пересчитывает карту книг
+_section_views = {
+    name: cache_page_anonymous(*sitemap.tags, timeout=get_timeout)(_section)
+    for name, sitemap in SITEMAPS.items()
+}
+
+
+def section(request, section):
+    view = _section_views.get(section)
+    if view is None:
+        raise Http404('Нет такого раздела карты сайта')
+    return view(request, section)
@@ -0,0 +1,57 @@
+# main/sorting.py
+"""
+Сортировки списков, разрешенные параметром ?sort=.
+
+Значение из запроса не передается в order_by() напрямую: каждому ключу
+реестра соответствует упорядочивание, для которого есть индекс, с
+уникальным полем (id) в конце - порядок страниц детерминирован и при
+равных значениях. Неизвестное значение означает сортировку по умолчанию.
+
+Сортировки по полям, где значение может отсутствовать (год, рейтинги),
+показывают только объекты со значением: NULL по-разному упорядочиваются
+в SQLite и PostgreSQL, а индекс с NULLS LAST SQLite не поддерживает.
+"""
+
+
+class SortOption:
+    """Вариант сортировки: подпись, поля order_by и необязательный фильтр"""
+
+    def __init__(self, label, ordering=(), filter=None, prepare=None):
+        self.label = label
+        self.ordering = ordering
+        self.filter = filter or {}
+        # prepare(queryset) - сортировка, которой нужны соединения или аннотации
+        self.prepare = prepare
+
+    def apply(self, queryset):
+        if self.filter:
+            queryset = queryset.filter(**self.filter)
+        if self.prepare is not None:
+            return self.prepare(queryset)
+        return queryset.order_by(*self.ordering)
+
+
+class SortRegistry:
+    """Разрешенные сортировки списка: ключ ?sort= -> SortOption"""
+
+    def __init__(self, options, default, aliases=None):
+        self.options = options
+        self.default = default
+        # Прежние значения параметра (имена полей) - чтобы старые ссылки работали.
+        # Псевдоним с именем ключа сделал бы этот ключ недоступным
+        self.aliases = aliases or {}
+        clashes = set(self.aliases) & set(options)
+        if clashes:
+            raise ValueError(f'Псевдонимы совпадают с ключами сортировок: {", ".join(sorted(clashes))}')
+
+    def resolve(self, value):
+        value = self.aliases.get(value, value)
+        return value if value in self.options else self.default
+
+    def apply(self, queryset, value):
+        """Отсортированный queryset и выбранный ключ (для шаблона)"""
+        key = self.resolve(value)
+        return self.options[key].apply(queryset), key
+
+    def choices(self):
+        return [(key, option.label) for key, option in self.options.items()]
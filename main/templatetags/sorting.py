@@ -0,0 +1,15 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def sort_url(context, key):
+    """
+    {% sort_url key %} - строка запроса текущей страницы с сортировкой key:
+    фильтры сохраняются (и повторяющиеся параметры), страница сбрасывается
+    """
+    params = context['request'].GET.copy()
+    params.pop('page', None)
+    params['sort'] = key
+    return '?' + params.urlencode()
@@ -0,0 +1,34 @@
+from django import template
+
+from main import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail_url(field_file, width, fmt='jpeg'):
+    """{% thumbnail_url film.poster 200 %} - URL миниатюры нужной ширины"""
+    return thumbnails.thumbnail_url(field_file, width, fmt)
+
+
+@register.simple_tag
+def srcset(field_file, fmt='webp'):
+    """{% srcset film.poster 'jpeg' %} - значение для атрибута srcset"""
+    return thumbnails.srcset(field_file, fmt)
+
+
+@register.inclusion_tag('main/partials/picture.html')
+def picture(field_file, width, alt='', sizes='', css_class='', style=''):
+    """
+    {% picture film.poster 200 alt=film.title css_class="film-poster" %}
+    Элемент <picture> с WebP/JPEG вариантами и запасным <img>.
+    """
+    return {
+        'src': thumbnails.thumbnail_url(field_file, width),
+        'webp_srcset': thumbnails.srcset(field_file, 'webp'),
+        'jpeg_srcset': thumbnails.srcset(field_file, 'jpeg'),
+        'sizes': sizes or f'{width}px',
+        'alt': alt,
+        'css_class': css_class,
+        'style': style,
+    }
@@ -0,0 +1,64 @@
+# main/testing.py
+"""
+Проверка «бюджета» SQL-запросов страниц для тестов приложений.
+
+Число запросов страницы-списка не должно зависеть от количества строк
+на ней: assertConstantQueries открывает страницу при двух размерах
+набора данных и сравнивает количество запросов. Запрос на каждую строку
+(N+1 в шаблоне или представлении) дает разницу и роняет тест.
+
+TestRunner (TEST_RUNNER в настройках) отключает фоновую запись буферов
+событий (main/buffers.py): тесты записывают их явным flush().
+"""
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext
+
+# Кэш страниц и фрагментов отключен: измеряется сама страница
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        # Не восстанавливается: atexit-запись после удаления тестовой базы ушла бы в рабочую
+        settings.TRENDING_FLUSH_INTERVAL = None
+        settings.SITE_CLICK_FLUSH_INTERVAL = None
+
+
+class QueryBudgetMixin:
+    # Сколько строк страницы добавляется между двумя измерениями
+    small_size = 2
+    large_size = 5
+
+    def setUp(self):
+        super().setUp()
+        # События «популярного» не записываются посреди измерения
+        self.enterContext(override_settings(CACHES=NO_CACHE, TRENDING_FLUSH_INTERVAL=None))
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries), queries
+
+    def assertConstantQueries(self, url, seed, budget=None):
+        """
+        seed(count) создает count строк, попадающих на страницу url.
+        budget - дополнительно верхняя граница числа запросов.
+        """
+        seed(self.small_size)
+        # Первый запрос заполняет кэши процесса (ContentType и т.п.) - не измеряется
+        self.client.get(url)
+        small, _ = self.count_queries(url)
+        seed(self.large_size - self.small_size)
+        large, queries = self.count_queries(url)
+        sql = '\n'.join(query['sql'] for query in queries.captured_queries)
+        self.assertEqual(
+            small, large,
+            f'{url}: {small} запросов при {self.small_size} строках, {large} при {self.large_size}\n{sql}',
+        )
+        if budget is not None:
+            self.assertLessEqual(large, budget, f'{url}: бюджет {budget} запросов превышен\n{sql}')
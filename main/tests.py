@@ -1,3 +1,1073 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipIf, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.messages import add_message, INFO
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.backends.cache import SessionStore
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.asgi import get_asgi_application
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import Q
+from django.db.utils import ConnectionHandler
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from apps.books.models import Book
+from apps.education.models import Course
+from apps.films.models import Actor, Director, Film
+from apps.films.views import FILM_SORTS
+from apps.forum.models import ForumCategory, ForumPost, ForumTopic
+from apps.reviews.services import add_review, set_favorite
+from apps.sites.models import Site, SiteCategory
+from .autocomplete import index as autocomplete_index
+from .buffers import PeriodicBuffer
+from .exports import async_chunks, stream_export
+from .db_router import PIN_COOKIE, ReplicaPinningMiddleware, ReplicaRouter, use_primary
+from .linkcheck import LinkChecker, check_urls, run_checks, unpublish_dead
+from .management.commands.index_audit import audited_queries, find_issues
+from .metrics import RequestMetrics, RequestMetricsMiddleware, get_metrics, measure, reset_metrics
+from .models import ActivityBucket, LinkCheck, TrendingScore
+from .parallel import gather
+from .search import search_queryset, uses_postgres_search
+from .sorting import SortOption, SortRegistry
+from .testing import NO_CACHE, QueryBudgetMixin
+from . import thumbnails
+from .cache import cache_page_anonymous, cache_version, get_cache
+from .trending import compute_trending, flush_activity, record_activity, trending
+
+# Тесты поиска на PostgreSQL запускаются с локальным сервером:
+# DATABASE_ENGINE=postgresql POSTGRES_DB=... python manage.py test main
+is_postgres = connection.vendor == 'postgresql'
+
+
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.media_root)
+        cls.enterClassContext(override_settings(
+            MEDIA_ROOT=cls.media_root, THUMBNAIL_WIDTHS=[100, 200], THUMBNAIL_ASYNC=False,
+        ))
+
+    def upload(self, name='photo.png', size=(300, 150)):
+        buffer = io.BytesIO()
+        Image.new('RGBA', size, (200, 100, 50, 128)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_generated_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            actor = Actor.objects.create(name='Актер', photo=self.upload())
+            # До коммита - только оригинал
+            self.assertIsNone(thumbnails.get_manifest(actor.photo))
+        # Генерация миниатюр и обновление подсказок поиска
+        for callback in callbacks:
+            callback()
+
+        manifest = thumbnails.get_manifest(actor.photo)
+        self.assertEqual((manifest['width'], manifest['height']), (300, 150))
+        self.assertEqual([(v['width'], v['height']) for v in manifest['variants']], [(100, 50), (200, 100)])
+        storage = actor.photo.storage
+        for variant in manifest['variants']:
+            self.assertTrue(storage.exists(variant['webp']))
+            with storage.open(variant['jpeg']) as file:
+                self.assertEqual(Image.open(file).format, 'JPEG')
+        self.assertTrue(storage.exists(thumbnails.manifest_name(actor.photo.name)))
+
+        # Сохранение без смены фото не ставит генерацию заново
+        with mock.patch.object(thumbnails, 'schedule') as schedule, self.captureOnCommitCallbacks(execute=True):
+            actor.save()
+        schedule.assert_not_called()
+
+    def test_urls_and_template_tag(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            actor = Actor.objects.create(name='Актер', photo=self.upload())
+        base = actor.photo.url.rsplit('.', 1)[0]
+        self.assertEqual(thumbnails.thumbnail_url(actor.photo, 150), f'{base}.w200.jpg')
+        self.assertEqual(thumbnails.thumbnail_url(actor.photo, 200, 'webp'), f'{base}.w200.webp')
+        # Больше любой миниатюры - оригинал
+        self.assertEqual(thumbnails.thumbnail_url(actor.photo, 250), actor.photo.url)
+        self.assertEqual(thumbnails.srcset(actor.photo), f'{base}.w100.webp 100w, {base}.w200.webp 200w')
+
+        html = Template('{% load thumbnails %}{% picture photo 200 alt="Фото" %}').render(Context({'photo': actor.photo}))
+        self.assertIn(f'<source type="image/webp" srcset="{base}.w100.webp 100w, {base}.w200.webp 200w"', html)
+        self.assertIn(f'<img src="{base}.w200.jpg" alt="Фото"', html)
+
+    def test_missing_manifest_is_remembered(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            actor = Actor.objects.create(name='Актер', photo=self.upload('missing.png'))
+        storage = actor.photo.storage
+        thumbnails._missing.pop(actor.photo.name)
+        with mock.patch.object(storage, 'exists', wraps=storage.exists) as exists:
+            for _ in range(3):
+                self.assertEqual(thumbnails.thumbnail_url(actor.photo, 100), actor.photo.url)
+            self.assertEqual(exists.call_count, 1)
+        # Генерация сбрасывает запомненное отсутствие
+        thumbnails.generate_thumbnails(storage, actor.photo.name)
+        self.assertNotIn(actor.photo.name, thumbnails._missing)
+        self.assertTrue(thumbnails.thumbnail_url(actor.photo, 100).endswith('.w100.jpg'))
+
+    def test_missing_manifest_expires(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            actor = Actor.objects.create(name='Актер', photo=self.upload('elsewhere.png'))
+        self.assertIsNone(thumbnails.get_manifest(actor.photo))
+        # Миниатюры создал другой процесс: видны после THUMBNAIL_MISS_TTL
+        manifest = thumbnails.generate_thumbnails(actor.photo.storage, actor.photo.name)
+        thumbnails._manifests.pop(actor.photo.name)
+        thumbnails._missing[actor.photo.name] = time.monotonic()
+        self.assertIsNone(thumbnails.get_manifest(actor.photo))
+        with override_settings(THUMBNAIL_MISS_TTL=0):
+            self.assertEqual(thumbnails.get_manifest(actor.photo), manifest)
+
+
+    def test_replaced_and_deleted_images_drop_thumbnails(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            actor = Actor.objects.create(name='Актер', photo=self.upload('first.png'))
+        storage, first = actor.photo.storage, actor.photo.name
+        first_files = [thumbnails.manifest_name(first)] + [
+            variant[fmt] for variant in thumbnails.get_manifest(actor.photo)['variants'] for fmt in thumbnails.FORMATS
+        ]
+        self.assertTrue(all(storage.exists(name) for name in first_files))
+
+        actor = Actor.objects.get(pk=actor.pk)
+        actor.photo = self.upload('second.png')
+        with self.captureOnCommitCallbacks(execute=True):
+            actor.save()
+        self.assertFalse(any(storage.exists(name) for name in first_files))
+        self.assertNotIn(first, thumbnails._manifests)
+        second = actor.photo.name
+        self.assertIsNotNone(thumbnails.get_manifest(actor.photo))
+
+        # Загрузка объекта без поля фото не читает его и не теряет миниатюры
+        with self.captureOnCommitCallbacks(execute=True):
+            Actor.objects.only('name').get(pk=actor.pk).save()
+        self.assertTrue(storage.exists(thumbnails.manifest_name(second)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            actor.delete()
+        self.assertFalse(storage.exists(thumbnails.manifest_name(second)))
+        self.assertNotIn(second, thumbnails._manifests)
+
+    def test_rolled_back_replacement_keeps_thumbnails(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            actor = Actor.objects.create(name='Актер', photo=self.upload('kept.png'))
+        name = actor.photo.name
+        actor.photo = self.upload('other.png')
+        with self.captureOnCommitCallbacks() as callbacks:
+            try:
+                with transaction.atomic():
+                    actor.save()
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertTrue(actor.photo.storage.exists(thumbnails.manifest_name(name)))
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = SiteCategory.objects.create(name='Госуслуги', slug='gov')
+        cls.site = Site.objects.create(title='Портал', slug='portal', url='https://example.com',
+                                       category=cls.category, description='Описание')
+
+    def setUp(self):
+        get_cache().clear()
+        self.calls = 0
+
+    def test_save_bumps_model_tag(self):
+        version = cache_version('site')
+        self.site.save(update_fields=['visits_count'])
+        # Счетчики не сбрасывают кэш
+        self.assertEqual(cache_version('site'), version)
+        self.site.save()
+        self.assertNotEqual(cache_version('site'), version)
+
+        version, film_version = cache_version('site'), cache_version('film')
+        film = Film.objects.create(title='Фильм', slug='film')
+        self.assertNotEqual(cache_version('film'), film_version)
+        film_version = cache_version('film')
+        film.actors.add(Actor.objects.create(name='Актер'))
+        self.assertNotEqual(cache_version('film'), film_version)
+        self.assertEqual(cache_version('site'), version)
+
+    def test_cached_page_changes_after_save(self):
+        self.assertContains(self.client.get('/sites/'), 'Портал')
+        # Изменение в обход сигналов - страница из кэша
+        Site.objects.filter(pk=self.site.pk).update(title='Новый портал')
+        self.assertNotContains(self.client.get('/sites/'), 'Новый портал')
+        self.site.refresh_from_db()
+        self.site.save()
+        self.assertContains(self.client.get('/sites/'), 'Новый портал')
+
+    def view(self, request, cookie=False):
+        self.calls += 1
+        response = HttpResponse('страница')
+        if cookie:
+            response.set_cookie('seen', '1')
+        return response
+
+    def request(self, user=None, message=None):
+        request = RequestFactory().get('/page/')
+        request.user = user or AnonymousUser()
+        request.session = SessionStore()
+        request._messages = FallbackStorage(request)
+        if message:
+            add_message(request, INFO, message)
+        return request
+
+    def test_not_stored(self):
+        view = cache_page_anonymous('site')(self.view)
+        for _ in range(2):
+            view(self.request(), cookie=True)
+        self.assertEqual(self.calls, 2)
+        for _ in range(2):
+            view(self.request(message='Сохранено'))
+        self.assertEqual(self.calls, 4)
+        user = User.objects.create_user('reader')
+        for _ in range(2):
+            view(self.request(user=user))
+        self.assertEqual(self.calls, 6)
+        # Обычный анонимный запрос - из кэша со второго раза
+        for _ in range(2):
+            self.assertEqual(view(self.request()).content.decode(), 'страница')
+        self.assertEqual(self.calls, 7)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(
+            title='Война и мир', author='Лев Толстой', content='...',
+            description='Роман-эпопея о войне 1812 года', tags='классика, история',
+        )
+        cls.other = Book.objects.create(title='Мастер и Маргарита', author='Михаил Булгаков', content='...')
+        cls.film = Film.objects.create(title='Москва слезам не верит', slug='moskva', description='Мелодрама')
+        actor = Actor.objects.create(name='Вера Алентова')
+        cls.film.actors.add(actor)
+
+    def test_empty_query_returns_queryset(self):
+        self.assertEqual(search_queryset(Book.objects.all(), '  ').count(), 2)
+
+    def test_title_match(self):
+        self.assertEqual(list(search_queryset(Book.objects.all(), 'Маргарита')), [self.other])
+
+    def test_extra_condition_on_related_model(self):
+        films = search_queryset(Film.objects.all(), 'Алентова', extra_q=Q(actors__name__icontains='Алентова'))
+        self.assertEqual(list(films), [self.film])
+
+    @skipIf(is_postgres, 'проверяет поиск без PostgreSQL')
+    def test_fallback_icontains(self):
+        self.assertFalse(uses_postgres_search())
+        self.assertEqual(list(search_queryset(Book.objects.all(), 'Толст')), [self.book])
+
+    @skipUnless(is_postgres, 'нужен PostgreSQL')
+    def test_russian_morphology(self):
+        # «войны» находит «война»/«войне» благодаря конфигурации russian
+        self.assertEqual(list(search_queryset(Book.objects.all(), 'войны')), [self.book])
+
+    @skipUnless(is_postgres, 'нужен PostgreSQL')
+    def test_ranking_prefers_title(self):
+        Book.objects.create(title='Сборник', author='Разные', content='...', description='Есть рассказ о мире')
+        results = list(search_queryset(Book.objects.all(), 'мир'))
+        self.assertEqual(results[0], self.book)
+
+    @skipUnless(is_postgres, 'нужен PostgreSQL')
+    def test_trigram_typo(self):
+        self.assertIn(self.other, search_queryset(Book.objects.all(), 'Мастер и Маргорита'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1', 'replica_2'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def read_db_during(self, request):
+        """Куда маршрутизируется чтение во время обработки запроса"""
+        used = []
+
+        def view(request):
+            used.append(self.router.db_for_read(Book))
+            return HttpResponse()
+
+        response = ReplicaPinningMiddleware(view)(request)
+        return used[0], response
+
+    def test_reads_go_to_replicas_and_writes_to_default(self):
+        self.assertIn(self.router.db_for_read(Book), ['replica_1', 'replica_2'])
+        self.assertEqual(self.router.db_for_write(Book), 'default')
+        self.assertFalse(self.router.allow_migrate('replica_1', 'books'))
+
+    def test_use_primary(self):
+        with use_primary():
+            self.assertEqual(self.router.db_for_read(Book), 'default')
+        self.assertNotEqual(self.router.db_for_read(Book), 'default')
+
+    def test_post_reads_primary_and_pins_following_requests(self):
+        db, response = self.read_db_during(self.factory.post('/'))
+        self.assertEqual(db, 'default')
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        db, response = self.read_db_during(request)
+        self.assertEqual(db, 'default')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+        db, _ = self.read_db_during(self.factory.get('/'))
+        self.assertNotEqual(db, 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        db, response = self.read_db_during(self.factory.post('/'))
+        self.assertEqual(db, 'default')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+class SQLiteReadReplicaTests(SimpleTestCase):
+    """Две базы-алиаса на одном файле: основная и реплика mode=ro (как SQLITE_READ_REPLICAS)"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, 'db.sqlite3')
+        engine = 'django.db.backends.sqlite3'
+        primary = {'ENGINE': engine, 'NAME': path}
+        # Отдельный набор соединений: алиасы вне settings.DATABASES
+        # не затрагивают тестовую базу
+        self.connections = ConnectionHandler({
+            'default': primary,
+            'primary': primary,
+            'replica': {'ENGINE': engine, 'NAME': f'file:{path}?mode=ro'},
+        })
+        self.addCleanup(self.connections.close_all)
+
+    def test_replica_reads_committed_data_and_rejects_writes(self):
+        with self.connections['primary'].cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id INTEGER PRIMARY KEY, title TEXT)')
+            cursor.execute("INSERT INTO item (title) VALUES ('книга')")
+        with self.connections['replica'].cursor() as cursor:
+            cursor.execute('SELECT title FROM item')
+            self.assertEqual(cursor.fetchall(), [('книга',)])
+            with self.assertRaisesMessage(OperationalError, 'readonly'):
+                cursor.execute("INSERT INTO item (title) VALUES ('фильм')")
+
+
+@override_settings(
+    REQUEST_METRICS_ENABLED=True,
+    REQUEST_METRICS_FLUSH_INTERVAL=0,
+    REQUEST_METRICS_DUPLICATE_THRESHOLD=1000,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'metrics-tests'}},
+)
+class RequestMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(3):
+            Book.objects.create(title=f'Книга {number}', author='Автор', content='...')
+
+    def setUp(self):
+        reset_metrics()
+
+    def test_server_timing_header(self):
+        response = self.client.get('/books/')
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn('tpl;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_histograms_by_view(self):
+        self.client.get('/books/')
+        self.client.get('/books/')
+        metrics = get_metrics()['books:book_list']
+        self.assertEqual(metrics['requests'], 2)
+        self.assertGreater(metrics['queries']['avg'], 0)
+        self.assertEqual(sum(metrics['total']['histogram'].values()), 2)
+
+    def test_staff_endpoint(self):
+        self.client.get('/books/')
+        self.assertEqual(self.client.get('/metrics/').status_code, 302)
+        User.objects.create_user('staff', password='pass', is_staff=True)
+        self.client.login(username='staff', password='pass')
+        self.assertIn('books:book_list', self.client.get('/metrics/').json())
+
+    def test_async_chain(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(RequestMetricsMiddleware(get_response)))
+        self.assertFalse(iscoroutinefunction(RequestMetricsMiddleware(lambda request: HttpResponse())))
+
+    @override_settings(REQUEST_METRICS_ENABLED=False)
+    def test_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            RequestMetricsMiddleware(lambda request: HttpResponse())
+
+
+@override_settings(TRENDING_FLUSH_INTERVAL=None, TRENDING_HALF_LIFE_HOURS=24, TRENDING_WINDOW_HOURS=72,
+                   TRENDING_WEIGHTS={'views': 1, 'favorites': 5, 'reviews': 8, 'posts': 3})
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.old = Film.objects.create(title='Старый хит', slug='old-hit', year=2000)
+        cls.new = Film.objects.create(title='Новинка', slug='new', year=2026)
+        cls.user = User.objects.create_user('viewer')
+
+    def setUp(self):
+        # События других тестов в буфере процесса не должны попасть в корзины
+        flush_activity()
+        ActivityBucket.objects.all().delete()
+        self.now = timezone.now().replace(minute=30, second=0, microsecond=0)
+
+    def add_bucket(self, film, hours_ago, **counts):
+        ActivityBucket.objects.create(
+            content_type=ContentType.objects.get_for_model(Film), object_id=film.pk,
+            hour=self.now.replace(minute=0) - timedelta(hours=hours_ago), **counts,
+        )
+
+    def test_events_are_merged_into_hourly_bucket(self):
+        for _ in range(3):
+            record_activity(Film, self.new.pk, 'views')
+        set_favorite(self.user, self.new, True)
+        add_review(self.user, self.new, 5, 'Отлично')
+        self.client.get(self.new.get_absolute_url())
+        flush_activity()
+        bucket = ActivityBucket.objects.get(object_id=self.new.pk)
+        self.assertEqual((bucket.views, bucket.favorites, bucket.reviews), (4, 1, 1))
+
+        record_activity(Film, self.new.pk, 'views')
+        flush_activity()
+        self.assertEqual(ActivityBucket.objects.get(object_id=self.new.pk).views, 5)
+
+    def test_forum_posts_count_for_topic(self):
+        category = ForumCategory.objects.create(name='Общение', slug='talk')
+        topic = ForumTopic.objects.create(title='Тема', category=category, author=self.user, content='Текст')
+        ForumPost.objects.create(topic=topic, author=self.user, content='Ответ')
+        flush_activity()
+        self.assertEqual(ActivityBucket.objects.get(object_id=topic.pk, posts__gt=0).posts, 1)
+
+    def test_detail_views_count_on_not_modified(self):
+        book = Book.objects.create(title='Книга', author='Автор', content='Текст')
+        course = Course.objects.create(title='Курс', instructor='Преподаватель', description='Описание',
+                                       duration_hours=10)
+        for obj, url in ((self.new, self.new.get_absolute_url()), (book, f'/books/{book.pk}/'),
+                         (course, f'/education/{course.pk}/')):
+            # Первый просмотр создает строку рейтинга - ETag берется со второго
+            self.client.get(url)
+            etag = self.client.get(url).headers['ETag']
+            self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304, url)
+            flush_activity()
+            bucket = ActivityBucket.objects.get(content_type=ContentType.objects.get_for_model(obj), object_id=obj.pk)
+            self.assertEqual(bucket.views, 3, url)
+
+    def test_recent_activity_beats_old(self):
+        # 10 просмотров двое суток назад весят 10 / 4 = 2.5 - меньше трех свежих
+        self.add_bucket(self.old, 48, views=10)
+        self.add_bucket(self.new, 0, views=3)
+        scored, deleted = compute_trending(now=self.now)
+        self.assertEqual((scored, deleted), (2, 0))
+        films = trending(Film)
+        self.assertEqual(films, [self.new, self.old])
+        self.assertAlmostEqual(films[0].trending_score, 3)
+        self.assertAlmostEqual(films[1].trending_score, 2.5)
+
+    def test_old_buckets_are_compacted(self):
+        self.add_bucket(self.old, 100, views=50)
+        self.add_bucket(self.new, 1, favorites=1)
+        scored, deleted = compute_trending(now=self.now)
+        self.assertEqual((scored, deleted), (1, 1))
+        self.assertEqual(list(TrendingScore.objects.values_list('object_id', flat=True)), [self.new.pk])
+
+    def test_fallback_before_first_computation(self):
+        fallback = Film.objects.order_by('title')
+        self.assertEqual(trending(Film, fallback=fallback), [self.new, self.old])
+        self.assertEqual(trending(Film), [])
+
+
+class ListBuffer(PeriodicBuffer):
+    interval_setting = 'TEST_BUFFER_INTERVAL'
+    default_interval = None
+    size_setting = 'TEST_BUFFER_SIZE'
+
+    def __init__(self):
+        super().__init__()
+        self.written = []
+        self.flushed = threading.Event()
+
+    def new(self):
+        return []
+
+    def add(self, item):
+        with self.lock:
+            self.pending.append(item)
+        self.added(len(self.pending))
+
+    def write(self, items):
+        self.written.extend(items)
+        self.flushed.set()
+        return len(items)
+
+
+class PeriodicBufferTests(SimpleTestCase):
+    def make_buffer(self):
+        buffer = ListBuffer()
+        # После теста настройки нет (интервал None) - разбуженный поток завершается
+        self.addCleanup(buffer._wakeup.set)
+        return buffer
+
+    @override_settings(TEST_BUFFER_INTERVAL=0.05)
+    def test_flushes_by_timer(self):
+        buffer = self.make_buffer()
+        buffer.add(1)
+        self.assertTrue(buffer.flushed.wait(5))
+        self.assertEqual((buffer.written, buffer.pending), ([1], []))
+
+    @override_settings(TEST_BUFFER_INTERVAL=60, TEST_BUFFER_SIZE=2)
+    def test_flushes_when_full(self):
+        buffer = self.make_buffer()
+        buffer.add(1)
+        self.assertFalse(buffer.flushed.wait(0.1))
+        buffer.add(2)
+        self.assertTrue(buffer.flushed.wait(5))
+        self.assertEqual(buffer.written, [1, 2])
+
+    @override_settings(TEST_BUFFER_INTERVAL=60)
+    def test_flushes_at_exit(self):
+        buffer = self.make_buffer()
+        buffer.add(1)
+        buffer._flush_at_exit()
+        self.assertEqual(buffer.written, [1])
+        self.assertEqual(buffer.flush(), 0)
+
+    @override_settings(TEST_BUFFER_INTERVAL=None)
+    def test_explicit_flush_only(self):
+        buffer = ListBuffer()
+        buffer.add(1)
+        buffer._flush_at_exit()
+        self.assertIsNone(buffer._thread)
+        self.assertEqual(buffer.written, [])
+        self.assertEqual(buffer.flush(), 1)
+
+
+class AutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title='Война и мир', author='Лев Толстой', content='...')
+        cls.film = Film.objects.create(title='Ёлки', slug='yolki')
+        cls.actor = Actor.objects.create(name='Иван Ургант')
+        cls.director = Director.objects.create(name='Тимур Бекмамбетов')
+        category = SiteCategory.objects.create(name='Госуслуги', slug='gos')
+        cls.site = Site.objects.create(title='Госуслуги', slug='gosuslugi', url='https://gosuslugi.ru', category=category)
+
+    def setUp(self):
+        autocomplete_index.clear()
+
+    def titles(self, query, **params):
+        response = self.client.get('/search/autocomplete/', {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [item['title'] for item in response.json()['results']]
+
+    def test_prefix_of_title_and_inner_word(self):
+        self.assertEqual(self.titles('вой'), ['Война и мир'])
+        self.assertEqual(self.titles('МИР'), ['Война и мир'])
+        self.assertEqual(self.titles('елк'), ['Ёлки'])
+        self.assertEqual(self.titles(''), [])
+
+    def test_answers_without_queries(self):
+        autocomplete_index.ensure_loaded()
+        with self.assertNumQueries(0):
+            self.client.get('/search/autocomplete/', {'q': 'гос'})
+
+    def test_typo_fallback(self):
+        self.assertEqual(self.titles('вйона'), ['Война и мир'])
+        self.assertEqual(self.titles('бекманбетов'), ['Тимур Бекмамбетов'])
+        self.assertEqual(self.titles('xyzxyz'), [])
+
+    def test_types_filter_and_urls(self):
+        response = self.client.get('/search/autocomplete/', {'q': 'ур', 'types': 'actor,unknown'})
+        [item] = response.json()['results']
+        self.assertEqual((item['type'], item['label']), ('actor', 'Актер'))
+        self.assertEqual(item['url'], '/films/search/?q=%D0%98%D0%B2%D0%B0%D0%BD+%D0%A3%D1%80%D0%B3%D0%B0%D0%BD%D1%82')
+        self.assertEqual(self.titles('гос', types='book'), [])
+        self.assertEqual(self.client.get('/search/autocomplete/', {'q': 'гос'}).json()['results'][0]['url'],
+                         '/sites/gosuslugi/')
+
+    def test_signals_update_index(self):
+        autocomplete_index.ensure_loaded()
+        with self.captureOnCommitCallbacks(execute=True):
+            course = Course.objects.create(title='Жестовый язык', instructor='Анна', description='...',
+                                           duration_hours=10)
+        self.assertEqual(self.titles('жест'), ['Жестовый язык'])
+        course.title = 'Русский жестовый язык'
+        with self.captureOnCommitCallbacks(execute=True):
+            course.save()
+        self.assertEqual(self.titles('рус'), ['Русский жестовый язык'])
+        with self.captureOnCommitCallbacks(execute=True):
+            course.delete()
+        self.assertEqual(self.titles('жест'), [])
+        self.site.is_published = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.site.save()
+        self.assertEqual(self.titles('гос'), [])
+
+    def test_rolled_back_changes_skip_index(self):
+        autocomplete_index.ensure_loaded()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    Course.objects.create(title='Жестовый язык', instructor='Анна', description='...',
+                                          duration_hours=10)
+                    self.book.delete()
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.titles('жест'), [])
+        self.assertEqual(self.titles('вой'), ['Война и мир'])
+
+
+def count_books():
+    return threading.current_thread().name, Book.objects.count()
+
+
+# Данные должны быть зафиксированы: потоки пула читают их через свои соединения
+@override_settings(ASYNC_QUERY_THREADS=2)
+class AsyncViewTests(TransactionTestCase):
+    def setUp(self):
+        Book.objects.create(title='Война и мир', author='Лев Толстой', content='...')
+        Film.objects.create(title='Война и мир', slug='voina-i-mir')
+
+    def test_gather_uses_pool_threads(self):
+        results = async_to_sync(gather)(count_books, count_books, lambda: 'готово')
+        self.assertEqual([count for _, count in results[:2]], [1, 1])
+        self.assertTrue(all(name.startswith('async-query') for name, _ in results[:2]))
+        self.assertEqual(results[2], 'готово')
+
+    def test_gather_inside_transaction_runs_in_caller_thread(self):
+        with transaction.atomic():
+            Book.objects.create(title='Анна Каренина', author='Лев Толстой', content='...')
+            [(name, count)] = async_to_sync(gather)(count_books)
+        self.assertEqual((name, count), (threading.current_thread().name, 2))
+
+    def test_search_through_asgi(self):
+        async def request():
+            communicator = ApplicationCommunicator(get_asgi_application(), {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': '/search/', 'raw_path': b'/search/', 'query_string': 'q=Война'.encode(),
+                'headers': [(b'host', b'127.0.0.1')], 'client': ('127.0.0.1', 50000), 'server': ('127.0.0.1', 80),
+            })
+            await communicator.send_input({'type': 'http.request', 'body': b''})
+            start = await communicator.receive_output(5)
+            body = await communicator.receive_output(5)
+            return start['status'], body['body'].decode()
+
+        status, body = async_to_sync(request)()
+        self.assertEqual(status, 200)
+        self.assertIn('Найдено: 2 записей', body)
+
+    @override_settings(CACHES=NO_CACHE)
+    def test_measure_counts_pool_queries(self):
+        counts = {}
+        for threads in (0, 4):
+            with override_settings(ASYNC_QUERY_THREADS=threads):
+                metrics = RequestMetrics()
+                with measure(metrics):
+                    self.client.get('/search/', {'q': 'Война'})
+                counts[threads] = metrics.queries
+        self.assertGreater(counts[0], 2)
+        self.assertEqual(counts[4], counts[0])
+
+    @override_settings(REQUEST_METRICS_ENABLED=True)
+    def test_metrics_through_asgi(self):
+        async def request():
+            communicator = ApplicationCommunicator(get_asgi_application(), {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': '/search/', 'raw_path': b'/search/', 'query_string': 'q=Война'.encode(),
+                'headers': [(b'host', b'127.0.0.1')], 'client': ('127.0.0.1', 50000), 'server': ('127.0.0.1', 80),
+            })
+            await communicator.send_input({'type': 'http.request', 'body': b''})
+            start = await communicator.receive_output(5)
+            await communicator.receive_output(5)
+            return dict(start['headers'])[b'Server-Timing'].decode()
+
+        get_cache().clear()
+        metrics = RequestMetrics()
+        with measure(metrics):
+            self.client.get('/search/', {'q': 'Война'})
+        reset_metrics()
+        get_cache().clear()
+        timing = async_to_sync(request)()
+        # Запросы потока синхронного кода и потоков пула
+        self.assertIn(f'desc="{metrics.queries} queries', timing)
+        self.assertEqual(get_metrics()['search']['requests'], 1)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Сайты для проверки ссылок: ответ зависит от пути"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_HEAD(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.command, self.path, self.headers.get('If-None-Match')))
+            server.clients.add(self.client_address)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            self.respond()
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    do_GET = do_HEAD
+
+    def respond(self):
+        headers = {}
+        if self.path == '/ok':
+            status = 304 if self.headers.get('If-None-Match') == '"v1"' else 200
+            headers['ETag'] = '"v1"'
+        elif self.path == '/moved':
+            status, headers['Location'] = 301, '/ok'
+        elif self.path == '/head-not-allowed':
+            status = 405 if self.command == 'HEAD' else 200
+        elif self.path == '/slow':
+            time.sleep(1)
+            status = 200
+        elif self.path.startswith('/busy'):
+            time.sleep(0.05)
+            status = 200
+        else:
+            status = 404
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class LinkCheckTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        cls.server.lock = threading.Lock()
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.requests = []
+        self.server.clients = set()
+        self.server.in_flight = self.server.max_in_flight = 0
+
+    def check(self, *paths, **options):
+        options.setdefault('timeout', 0.5)
+        return asyncio.run(check_urls([(self.base + path, '', '') for path in paths], **options))
+
+    def test_statuses(self):
+        ok, moved, head_not_allowed, missing, slow = self.check('/ok', '/moved', '/head-not-allowed', '/missing', '/slow')
+        self.assertEqual((ok.status, ok.etag, ok.is_alive), (200, '"v1"', True))
+        self.assertEqual((moved.status, moved.is_alive), (200, True))
+        self.assertEqual((head_not_allowed.status, head_not_allowed.is_alive), (200, True))
+        self.assertIn(('GET', '/head-not-allowed', None), self.server.requests)
+        self.assertEqual((missing.status, missing.is_alive), (404, False))
+        self.assertFalse(slow.is_alive)
+        self.assertIn('нет ответа', slow.error)
+        self.assertFalse(asyncio.run(check_urls([('ftp://example.com/', '', '')]))[0].is_alive)
+
+    def test_per_host_limit(self):
+        results = self.check(*(f'/busy/{number}' for number in range(8)), per_host=2)
+        self.assertTrue(all(result.is_alive for result in results))
+        self.assertEqual(self.server.max_in_flight, 2)
+
+    def test_keep_alive_closed_when_host_is_done(self):
+        async def run():
+            checker = LinkChecker(per_host=1, timeout=0.5)
+            paths = [f'/busy/{number}' for number in range(4)]
+            results = await asyncio.gather(*(checker.check(self.base + path) for path in paths))
+            idle = sum(len(pool.idle) for pool in checker.hosts.values())
+            await checker.close()
+            return results, idle, checker.closing
+
+        results, idle, closing = asyncio.run(run())
+        self.assertTrue(all(result.is_alive for result in results))
+        # Одно соединение на все ссылки хоста, после последней оно закрыто
+        self.assertEqual(len(self.server.clients), 1)
+        self.assertEqual((idle, closing), (0, set()))
+
+    def test_history_conditional_requests_and_unpublish(self):
+        category = SiteCategory.objects.create(name='Госуслуги', slug='gov')
+        alive = Site.objects.create(title='Портал', slug='portal', url=self.base + '/ok', category=category,
+                                    description='Описание')
+        dead = Site.objects.create(title='Архив', slug='archive', url=self.base + '/gone', category=category,
+                                   description='Описание')
+        course = Course.objects.create(title='Курс', instructor='Автор', description='Описание', duration_hours=1,
+                                       course_url=self.base + '/gone')
+        Course.objects.create(title='Без ссылки', instructor='Автор', description='Описание', duration_hours=1)
+
+        run_checks(timeout=0.5)
+        checks = run_checks(timeout=0.5)
+        self.assertEqual(LinkCheck.objects.count(), 6)
+        # Вторая проверка - условный запрос с ETag первой, ответ 304
+        self.assertIn(('HEAD', '/ok', '"v1"'), self.server.requests)
+        latest = {(check.content_object, check.status, check.failures, check.etag) for check in checks}
+        self.assertEqual(latest, {(alive, 304, 0, '"v1"'), (dead, 404, 2, ''), (course, 404, 2, '')})
+
+        self.assertEqual(unpublish_dead(checks, dead_after=3), [])
+        self.assertEqual(unpublish_dead(checks, dead_after=2), [dead])
+        dead.refresh_from_db()
+        self.assertFalse(dead.is_published)
+
+
+@override_settings(SITEMAP_LIMIT=2, CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sitemap-tests'},
+})
+class SitemapTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(3):
+            Book.objects.create(title=f'Книга {number}', author='Автор', content='Текст')
+        category = SiteCategory.objects.create(name='Госуслуги', slug='gov')
+        Site.objects.create(title='Портал', slug='portal', url='https://example.com', category=category,
+                            description='Описание')
+        Site.objects.create(title='Скрытый', slug='hidden', url='https://example.com', category=category,
+                            description='Описание', is_published=False)
+        user = User.objects.create_user('author')
+        forum = ForumCategory.objects.create(name='Общение', slug='talk')
+        cls.topic = ForumTopic.objects.create(title='Новая тема', category=forum, author=user, content='Текст')
+        ForumTopic.objects.create(title='Скрытая тема', category=forum, author=user, content='Текст', is_active=False)
+        Film.objects.create(title='Фильм', slug='film', description='Описание', year=2020)
+
+    def test_index_pages_large_sections(self):
+        content = self.client.get('/sitemap.xml').content.decode()
+        self.assertIn('http://testserver/sitemap-books.xml</loc>', content)
+        self.assertIn('http://testserver/sitemap-books.xml?p=2</loc>', content)
+        self.assertNotIn('sitemap-sites.xml?p=2', content)
+
+    def test_section(self):
+        books = Book.objects.order_by('pk')
+        response = self.client.get('/sitemap-books.xml?p=2')
+        self.assertEqual(response['Content-Type'], 'application/xml')
+        self.assertEqual(response.content.decode().count('<url>'), 1)
+        self.assertIn(f'<loc>http://testserver/books/{books[2].pk}/</loc><lastmod>', response.content.decode())
+        self.assertEqual(self.client.get('/sitemap-books.xml?p=3').status_code, 404)
+        self.assertEqual(self.client.get('/sitemap-unknown.xml').status_code, 404)
+
+        sites = self.client.get('/sitemap-sites.xml').content.decode()
+        self.assertIn('/sites/portal/', sites)
+        self.assertNotIn('/sites/hidden/', sites)
+        topics = self.client.get('/sitemap-forum-topics.xml').content.decode()
+        self.assertEqual(topics.count('<url>'), 1)
+        self.assertIn('/forum/category/talk/', self.client.get('/sitemap-forum-categories.xml').content.decode())
+
+    def test_section_cached_until_content_changes(self):
+        self.client.get('/sitemap-films.xml')
+        with self.assertNumQueries(0):
+            self.client.get('/sitemap-films.xml')
+        Film.objects.create(title='Второй', slug='second', description='Описание')
+        self.assertIn('/films/second/', self.client.get('/sitemap-films.xml').content.decode())
+
+    def test_cached_response_keeps_headers(self):
+        get_cache().clear()
+        for url in ('/sitemap-books.xml', '/films/feed/'):
+            response = self.client.get(url)
+            with self.assertNumQueries(0):
+                cached = self.client.get(url)
+            self.assertTrue(response.has_header('Last-Modified'), url)
+            for name in ('Content-Type', 'Last-Modified', 'X-Robots-Tag'):
+                self.assertEqual(cached.get(name), response.get(name), f'{url}: {name}')
+        self.assertEqual(cached['Content-Type'], 'application/atom+xml; charset=utf-8')
+        self.assertEqual(self.client.get('/sitemap-books.xml')['X-Robots-Tag'], 'noindex, noodp, noarchive')
+
+    def test_timeout_read_on_each_store(self):
+        get_cache().clear()
+        cache = get_cache()
+        with override_settings(SITEMAP_CACHE_TIMEOUT=5), mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            self.client.get('/sitemap-sites.xml')
+        self.assertEqual([call.args[2] for call in cache_set.call_args_list if call.args[0].startswith('page:')], [5])
+
+    def test_fragments_use_page_timeout(self):
+        get_cache().clear()
+        cache = get_cache()
+        with override_settings(PAGE_CACHE_TIMEOUT=5), mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            for url in ('/', '/films/', '/sites/', '/forum/'):
+                self.client.get(url)
+        timeouts = [call.args[2] for call in cache_set.call_args_list if call.args[0].startswith('template.cache.')]
+        self.assertEqual(len(timeouts), 9)
+        self.assertEqual(set(timeouts), {5})
+
+    @override_settings(CACHES=NO_CACHE)
+    def test_feeds(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/forum/feed/')
+        self.assertEqual(response['Content-Type'], 'application/atom+xml; charset=utf-8')
+        content = response.content.decode()
+        self.assertIn('<title>Новая тема</title>', content)
+        self.assertNotIn('Скрытая тема', content)
+        self.assertIn('<title>Фильм (2020)</title>', self.client.get('/films/feed/').content.decode())
+        self.assertIn('Sitemap: http://testserver/sitemap.xml', self.client.get('/robots.txt').content.decode())
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pass', is_staff=True)
+        Book.objects.create(title='Война и мир', author='Лев Толстой', content='...')
+        Book.objects.create(title='Книга, "с кавычками"', author='Автор', content='...')
+        cls.film = Film.objects.create(title='Фильм', slug='film', year=2020)
+        Film.objects.create(title='Второй', slug='second')
+        cls.film.actors.add(Actor.objects.create(name='Второй актер'), Actor.objects.create(name='Первый актер'))
+        cls.film.directors.add(Director.objects.create(name='Режиссер'))
+
+    def test_staff_only(self):
+        self.assertEqual(self.client.get('/export/books.csv').status_code, 302)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get('/export/unknown.csv').status_code, 404)
+        self.assertEqual(self.client.get('/export/books.xml').status_code, 404)
+
+    def test_csv_streams_rows(self):
+        self.client.force_login(self.staff)
+        response = self.client.get('/export/books.csv')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="books-', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'title', 'author'])
+        self.assertEqual(len(lines), 3)
+        self.assertIn('"Книга, ""с кавычками"""', lines[2])
+
+    def test_csv_escapes_formulas(self):
+        book = Book.objects.create(title='=HYPERLINK("http://evil")', author='-2+3', content='...', tags='@SUM(1)')
+        self.film.actors.add(Actor.objects.create(name='+Актер'))
+        books = {row['id']: row for row in csv.DictReader(io.StringIO(''.join(stream_export('books', 'csv'))))}
+        row = books[str(book.pk)]
+        self.assertEqual((row['title'], row['author'], row['tags']), ("'" + book.title, "'-2+3", "'@SUM(1)"))
+        self.assertEqual(books[str(book.pk - 1)]['title'], 'Книга, "с кавычками"')
+        films = list(csv.DictReader(io.StringIO(''.join(stream_export('films', 'csv')))))
+        self.assertEqual(films[0]['actors'], 'Второй актер; Первый актер; +Актер')
+        # JSON Lines - без изменений
+        self.assertEqual(json.loads(list(stream_export('books', 'jsonl'))[0].splitlines()[-1])['title'], book.title)
+
+    def test_jsonl_many_to_many_in_one_query_per_chunk(self):
+        # Фильмы по одному на пакет: строки и по запросу на каждую связь для пакета
+        with self.assertNumQueries(1 + 2 * 4):
+            rows = [json.loads(line) for line in ''.join(stream_export('films', 'jsonl', chunk_size=1)).splitlines()]
+        self.assertEqual(rows[0]['id'], self.film.pk)
+        self.assertEqual(rows[0]['actors'], ['Второй актер', 'Первый актер'])
+        self.assertEqual(rows[0]['directors'], ['Режиссер'])
+        self.assertEqual(rows[1]['actors'], [])
+        self.assertEqual(rows[0]['year'], 2020)
+
+    def test_async_chunks(self):
+        async def collect():
+            return [chunk async for chunk in async_chunks(stream_export('books', 'csv'))]
+
+        self.assertEqual(async_to_sync(collect)(), list(stream_export('books', 'csv')))
+
+    def test_command_writes_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('export', 'films', 'sites', format='jsonl', output_dir=directory, stdout=open(os.devnull, 'w'))
+            names = sorted(name.split('-')[0] for name in os.listdir(directory))
+            self.assertEqual(names, ['films', 'sites'])
+            path = next(os.path.join(directory, name) for name in os.listdir(directory) if name.startswith('films'))
+            with open(path, encoding='utf-8') as output:
+                self.assertEqual(len(output.readlines()), 2)
+
+
+class SortRegistryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Одинаковые просмотры - порядок задает id
+        cls.first = Film.objects.create(title='Б', slug='b', year=2001, imdb_rating=7.5, views_count=5)
+        cls.second = Film.objects.create(title='А', slug='a', year=2001, views_count=5)
+        cls.undated = Film.objects.create(title='В', slug='v', views_count=9)
+
+    def test_unknown_value_falls_back_to_default(self):
+        self.assertEqual(FILM_SORTS.resolve('title; DROP TABLE'), 'new')
+        self.assertEqual(FILM_SORTS.resolve('password'), 'new')
+        self.assertEqual(FILM_SORTS.resolve(None), 'new')
+        response = self.client.get('/films/', {'sort': 'author__password'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['current_sort'], 'new')
+
+    def test_legacy_field_names(self):
+        self.assertEqual(FILM_SORTS.resolve('-views_count'), 'popular')
+        self.assertEqual(FILM_SORTS.resolve('-year'), 'year')
+        # Ключ реестра не перекрывается псевдонимом
+        self.assertEqual(FILM_SORTS.resolve('year'), 'year')
+        films = self.client.get('/films/', {'sort': 'year'})
+        self.assertEqual(films.context['current_sort'], 'year')
+        with self.assertRaises(ValueError):
+            SortRegistry({'new': SortOption('Новые', ('-id',))}, default='new', aliases={'new': 'old'})
+
+    def test_ties_are_ordered_by_id(self):
+        films, key = FILM_SORTS.apply(Film.objects.all(), 'popular')
+        self.assertEqual(key, 'popular')
+        self.assertEqual(list(films), [self.undated, self.second, self.first])
+
+    def test_nullable_fields_list_only_known_values(self):
+        films, _ = FILM_SORTS.apply(Film.objects.all(), 'year_old')
+        self.assertEqual(list(films), [self.first, self.second])
+        films, _ = FILM_SORTS.apply(Film.objects.all(), 'imdb')
+        self.assertEqual(list(films), [self.first])
+
+    def test_sort_links_keep_filters(self):
+        request = RequestFactory().get('/sites/', {'genre': ['a', 'b'], 'page': '3', 'sort': 'new', 'x&y': 'да'})
+        html = Template("{% include 'main/partials/sort_links.html' %}").render(Context({
+            'request': request, 'sort_options': [('new', 'Новые'), ('title', 'По названию')], 'current_sort': 'new',
+        }))
+        self.assertIn('href="?genre=a&amp;genre=b&amp;sort=title&amp;x%26y=%D0%B4%D0%B0"', html)
+        self.assertNotIn('page=', html)
+
+    @skipIf(is_postgres, 'признаки плана проверяются для SQLite')
+    def test_sorts_are_index_backed(self):
+        for name, queryset in audited_queries().items():
+            if ' sort=' in name:
+                self.assertEqual(find_issues(queryset.explain(), 'sqlite'), [], name)
+
+
+class MainQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Главная и глобальный поиск: число запросов не зависит от числа результатов"""
+
+    def seed_content(self, count):
+        for number in range(count):
+            number = Book.objects.count()
+            Book.objects.create(title=f'История {number}', author='Автор', content='Текст')
+            Film.objects.create(title=f'История {number}', slug=f'story-{number}', description='Описание')
+            Course.objects.create(title=f'История {number}', instructor='Преподаватель',
+                                  description='Описание', duration_hours=5)
+
+    def test_index(self):
+        # Новинки трех типов и «лучшие по оценкам»: позиции рейтинга и объекты по каждому типу
+        self.assertConstantQueries('/', self.seed_content, budget=9)
+
+    def test_search(self):
+        self.assertConstantQueries('/search/?q=История', self.seed_content, budget=6)
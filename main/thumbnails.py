@@ -0,0 +1,287 @@
+# main/thumbnails.py
+"""
+Производные изображения (миниатюры) для ImageField.
+
+Для каждого загруженного изображения генерируются уменьшенные копии
+в форматах WebP и JPEG, которые сохраняются рядом с оригиналом:
+
+    films/posters/poster.jpg
+    films/posters/poster.w200.webp
+    films/posters/poster.w200.jpg
+    films/posters/poster.thumbs.json   <- манифест
+
+Генерация выполняется в пуле потоков после коммита транзакции,
+а не в потоке запроса. Манифест пишется последним, поэтому пока
+его нет, шаблоны отдают оригинал. При замене изображения и удалении
+объекта миниатюры прежнего файла удаляются (тоже после коммита).
+"""
+import io
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# формат -> (формат Pillow, расширение файла)
+FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+# модель -> имена ImageField, для которых строятся миниатюры
+registry = {}
+
+_manifests = {}
+# Оригиналы без манифеста: имя -> время проверки (time.monotonic())
+_missing = {}
+_manifests_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_widths():
+    return sorted(getattr(settings, 'THUMBNAIL_WIDTHS', [100, 200, 400, 800]))
+
+
+def derivative_name(name, width, fmt):
+    """Имя файла миниатюры рядом с оригиналом"""
+    root, _ = os.path.splitext(name)
+    return f'{root}.w{width}.{FORMATS[fmt][1]}'
+
+
+def manifest_name(name):
+    """Имя файла манифеста для оригинала"""
+    root, _ = os.path.splitext(name)
+    return f'{root}.thumbs.json'
+
+
+def _save(storage, name, data):
+    # Перезаписываем, а не получаем новое имя от get_available_name()
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, ContentFile(data))
+
+
+def _encode(image, fmt):
+    pil_format = FORMATS[fmt][0]
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.split()[-1])
+            image = background
+        else:
+            image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, quality=getattr(settings, 'THUMBNAIL_QUALITY', 80), optimize=True)
+    return buffer.getvalue()
+
+
+def generate_thumbnails(storage, name):
+    """
+    Генерирует все миниатюры для файла и записывает манифест.
+    Возвращает манифест (dict).
+    """
+    with storage.open(name, 'rb') as f:
+        image = Image.open(f)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    # Не увеличиваем: берем только ширины меньше оригинала
+    widths = [w for w in get_widths() if w < image.width] or [image.width]
+    variants = []
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.Resampling.LANCZOS)
+        variant = {'width': width, 'height': height}
+        for fmt in FORMATS:
+            variant[fmt] = _save(storage, derivative_name(name, width, fmt), _encode(resized, fmt))
+        variants.append(variant)
+
+    manifest = {
+        'source': name,
+        'width': image.width,
+        'height': image.height,
+        'variants': variants,
+    }
+    _save(storage, manifest_name(name), json.dumps(manifest).encode())
+    with _manifests_lock:
+        _manifests[name] = manifest
+        _missing.pop(name, None)
+    return manifest
+
+
+def delete_thumbnails(storage, name):
+    """Удаляет манифест и миниатюры оригинала name и забывает его манифест"""
+    with _manifests_lock:
+        manifest = _manifests.pop(name, None)
+        _missing.pop(name, None)
+    path = manifest_name(name)
+    try:
+        if manifest is None and storage.exists(path):
+            with storage.open(path, 'rb') as f:
+                manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = None
+    # Манифест - первым: пока миниатюры удаляются, шаблоны отдают оригинал
+    names = [path]
+    if manifest:
+        names += [variant[fmt] for variant in manifest['variants'] for fmt in FORMATS]
+    for file_name in names:
+        if storage.exists(file_name):
+            storage.delete(file_name)
+
+
+def get_manifest(field_file):
+    """
+    Манифест миниатюр для FieldFile или None, если они еще не готовы.
+    Найденные манифесты кэшируются в памяти процесса. Имя файла может
+    освободиться только при замене изображения или удалении объекта -
+    тогда delete_thumbnails() убирает манифест из кэша этого процесса
+    (другой процесс отдаст устаревшие ссылки до перезапуска, если за это
+    время под тем же именем загрузят новый файл).
+    Отсутствие манифеста запоминается на THUMBNAIL_MISS_TTL секунд -
+    миниатюры мог создать другой процесс.
+    """
+    if not field_file:
+        return None
+    name = field_file.name
+    manifest = _manifests.get(name)
+    if manifest is not None:
+        return manifest
+    checked_at = _missing.get(name)
+    if checked_at is not None and time.monotonic() - checked_at < getattr(settings, 'THUMBNAIL_MISS_TTL', 60):
+        return None
+    storage = field_file.storage
+    path = manifest_name(name)
+    try:
+        if storage.exists(path):
+            with storage.open(path, 'rb') as f:
+                manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = None
+    with _manifests_lock:
+        if manifest is None:
+            _missing[name] = time.monotonic()
+        else:
+            _manifests[name] = manifest
+    return manifest
+
+
+def thumbnail_url(field_file, width, fmt='jpeg'):
+    """URL наименьшей миниатюры шириной не меньше width (или оригинала)"""
+    if not field_file:
+        return ''
+    manifest = get_manifest(field_file)
+    if not manifest or not manifest['variants']:
+        return field_file.url
+    variants = manifest['variants']
+    chosen = next((v for v in variants if v['width'] >= int(width)), variants[-1])
+    if chosen['width'] < int(width) and manifest['width'] > chosen['width']:
+        # Нужна ширина больше любой миниатюры - отдаем оригинал
+        return field_file.url
+    return field_file.storage.url(chosen[fmt])
+
+
+def srcset(field_file, fmt='webp'):
+    """Значение атрибута srcset по всем миниатюрам"""
+    manifest = get_manifest(field_file)
+    if not manifest:
+        return ''
+    storage = field_file.storage
+    return ', '.join(f"{storage.url(v[fmt])} {v['width']}w" for v in manifest['variants'])
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'THUMBNAIL_WORKERS', 2),
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def _run(storage, name):
+    try:
+        generate_thumbnails(storage, name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+
+
+def _run_delete(storage, name):
+    try:
+        delete_thumbnails(storage, name)
+    except Exception:
+        logger.exception('Не удалось удалить миниатюры для %s', name)
+
+
+def _submit(func, storage, name):
+    if getattr(settings, 'THUMBNAIL_ASYNC', True):
+        _get_executor().submit(func, storage, name)
+    else:
+        func(storage, name)
+
+
+def schedule(field_file):
+    """Ставит генерацию миниатюр в очередь пула (или выполняет сразу)"""
+    _submit(_run, field_file.storage, field_file.name)
+
+
+def schedule_delete(storage, name):
+    """Ставит удаление миниатюр файла name в очередь пула (или выполняет сразу)"""
+    _submit(_run_delete, storage, name)
+
+
+def register(model, *field_names):
+    """
+    Подключает генерацию миниатюр при сохранении модели
+    для указанных ImageField и удаление миниатюр прежнего файла
+    при его замене и при удалении объекта.
+    """
+    registry[model] = field_names
+    uid = f'thumbnails_{model._meta.label_lower}'
+
+    def remember_sources(sender, instance, **kwargs):
+        # Имена файлов на момент загрузки объекта - чтобы заметить замену.
+        # Значение читается из __dict__: отложенное поле (only/defer) не загружается
+        sources = {}
+        for field_name in field_names:
+            if field_name in instance.__dict__:
+                value = instance.__dict__[field_name]
+                sources[field_name] = getattr(value, 'name', value)
+        instance._thumbnail_sources = sources
+
+    def on_save(sender, instance, created=False, update_fields=None, **kwargs):
+        sources = instance.__dict__.setdefault('_thumbnail_sources', {})
+        for field_name in field_names:
+            if update_fields is not None and field_name not in update_fields:
+                continue
+            field_file = getattr(instance, field_name)
+            previous = sources.get(field_name)
+            sources[field_name] = field_file.name
+            if not created and previous and previous != field_file.name:
+                transaction.on_commit(lambda s=field_file.storage, n=previous: schedule_delete(s, n))
+            if not field_file or get_manifest(field_file) is not None:
+                continue
+            transaction.on_commit(lambda f=field_file: schedule(f))
+
+    def on_delete(sender, instance, **kwargs):
+        for field_name in field_names:
+            field_file = getattr(instance, field_name)
+            if field_file:
+                transaction.on_commit(lambda s=field_file.storage, n=field_file.name: schedule_delete(s, n))
+
+    post_init.connect(remember_sources, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(on_save, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(on_delete, sender=model, weak=False, dispatch_uid=uid)
@@ -0,0 +1,182 @@
+# main/trending.py
+"""
+«Популярное сейчас»: активность по часам и популярность с затуханием.
+
+События (просмотры, добавления в избранное, отзывы, сообщения форума)
+копятся в памяти процесса и фоновым потоком раз в TRENDING_FLUSH_INTERVAL
+секунд (и при завершении процесса, см. main/buffers.py) прибавляются к
+часовым корзинам ActivityBucket - одна строка на объект и час, а не на
+событие.
+
+compute_trending() (manage.py compute_trending, по расписанию) суммирует
+корзины за TRENDING_WINDOW_HOURS с весами TRENDING_WEIGHTS и затуханием
+вдвое за TRENDING_HALF_LIFE_HOURS, заменяет таблицу TrendingScore и
+удаляет корзины старше окна. Страницы читают только TrendingScore:
+trending() - топ по индексу trending_score_idx.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from .buffers import PeriodicBuffer
+from .models import ActivityBucket, TrendingScore
+
+KINDS = ('views', 'favorites', 'reviews', 'posts')
+
+DEFAULT_WEIGHTS = {'views': 1, 'favorites': 5, 'reviews': 8, 'posts': 3}
+
+
+def _current_hour():
+    return timezone.now().replace(minute=0, second=0, microsecond=0)
+
+
+class ActivityBuffer(PeriodicBuffer):
+    """Счетчики событий в памяти процесса с периодической записью в ActivityBucket"""
+    interval_setting = 'TRENDING_FLUSH_INTERVAL'
+    default_interval = 60
+
+    def new(self):
+        return Counter()
+
+    def add(self, content_type_id, object_id, kind, count=1):
+        with self.lock:
+            self.pending[(content_type_id, object_id, _current_hour(), kind)] += count
+        self.added(len(self.pending))
+
+    def write(self, counts):
+        buckets = defaultdict(dict)
+        for (content_type_id, object_id, hour, kind), count in counts.items():
+            buckets[(content_type_id, object_id, hour)][kind] = count
+        with transaction.atomic():
+            for (content_type_id, object_id, hour), values in buckets.items():
+                _add_to_bucket(content_type_id, object_id, hour, values)
+        return len(buckets)
+
+
+def _add_to_bucket(content_type_id, object_id, hour, values):
+    bucket = ActivityBucket.objects.filter(content_type_id=content_type_id, object_id=object_id, hour=hour)
+    increments = {kind: F(kind) + count for kind, count in values.items()}
+    if bucket.update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            ActivityBucket.objects.create(content_type_id=content_type_id, object_id=object_id, hour=hour, **values)
+    except IntegrityError:
+        # Корзину только что создал другой процесс
+        bucket.update(**increments)
+
+
+buffer = ActivityBuffer()
+
+
+def record_activity(model, object_id, kind, count=1):
+    """Учитывает событие kind ('views', 'favorites', 'reviews', 'posts') для объекта модели"""
+    buffer.add(ContentType.objects.get_for_model(model).pk, object_id, kind, count)
+
+
+def flush_activity():
+    buffer.flush()
+
+
+def decay(age_hours, half_life_hours):
+    return 0.5 ** (age_hours / half_life_hours)
+
+
+def compute_trending(now=None, batch_size=2000):
+    """
+    Пересчитывает TrendingScore по корзинам за окно и удаляет корзины
+    старше окна. Возвращает (число объектов, число удаленных корзин).
+    """
+    now = now or timezone.now()
+    half_life = getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 24)
+    weights = getattr(settings, 'TRENDING_WEIGHTS', DEFAULT_WEIGHTS)
+    since = now - timedelta(hours=getattr(settings, 'TRENDING_WINDOW_HOURS', 7 * 24))
+
+    scores = defaultdict(float)
+    buckets = ActivityBucket.objects.filter(hour__gte=since).values_list('content_type_id', 'object_id', 'hour', *KINDS)
+    for content_type_id, object_id, hour, *counts in buckets.iterator():
+        # Возраст - от середины часа
+        age = (now - hour).total_seconds() / 3600 - 0.5
+        activity = sum(weights.get(kind, 0) * count for kind, count in zip(KINDS, counts))
+        scores[(content_type_id, object_id)] += activity * decay(max(age, 0), half_life)
+
+    rows = [
+        TrendingScore(content_type_id=content_type_id, object_id=object_id, score=score, computed_at=now)
+        for (content_type_id, object_id), score in scores.items() if score > 0
+    ]
+    with transaction.atomic():
+        TrendingScore.objects.all().delete()
+        TrendingScore.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows), compact_activity(since)
+
+
+def compact_activity(before):
+    """Удаляет корзины старше before: их вклад в популярность пренебрежимо мал"""
+    deleted, _ = ActivityBucket.objects.filter(hour__lt=before).delete()
+    return deleted
+
+
+def get_trending_computed_at(content_type):
+    """Дата последнего пересчета популярности типа (для условных GET-запросов)"""
+    # Таблица пересчитывается целиком - достаточно любой строки типа
+    return next(iter(TrendingScore.objects.filter(content_type=content_type).values_list('computed_at', flat=True)[:1]), None)
+
+
+def trending(model, limit=10, queryset=None, fallback=None):
+    """
+    Самые популярные сейчас объекты модели (с атрибутом trending_score).
+    queryset ограничивает объекты (например, только активные темы),
+    fallback - что показать, пока популярность не рассчитана.
+    """
+    content_type = ContentType.objects.get_for_model(model)
+    scores = list(
+        TrendingScore.objects.filter(content_type=content_type).order_by('-score', 'object_id')[:limit]
+    )
+    if not scores:
+        return list(fallback[:limit]) if fallback is not None else []
+    queryset = queryset if queryset is not None else model._default_manager.all()
+    objects = queryset.in_bulk([score.object_id for score in scores])
+    result = []
+    for score in scores:
+        obj = objects.get(score.object_id)
+        if obj is not None:
+            obj.trending_score = score.score
+            result.append(obj)
+    return result
+
+
+def _generic_target(instance):
+    return instance.content_type_id, instance.object_id
+
+
+def _post_target(post):
+    topic_model = post._meta.get_field('topic').related_model
+    return ContentType.objects.get_for_model(topic_model).pk, post.topic_id
+
+
+# События, которые учитываются при создании строк: модель -> (вид события, объект активности)
+SIGNAL_EVENTS = {
+    'reviews.Favorite': ('favorites', _generic_target),
+    'reviews.Review': ('reviews', _generic_target),
+    'forum.ForumPost': ('posts', _post_target),
+}
+
+
+def _on_create(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    kind, target = SIGNAL_EVENTS[sender._meta.label]
+    buffer.add(*target(instance), kind)
+
+
+def connect_signals():
+    """Подключает учет избранного, отзывов и сообщений к их созданию"""
+    from django.apps import apps
+    for label in SIGNAL_EVENTS:
+        post_save.connect(_on_create, sender=apps.get_model(label), dispatch_uid=f'trending_{label}')
@@ -4,4 +4,8 @@ from . import views
 urlpatterns = [
     path('', views.index, name='home'),
     path('search/', views.search, name='search'),
+    path('robots.txt', views.robots_txt, name='robots_txt'),
+    path('search/autocomplete/', views.autocomplete, name='autocomplete'),
+    path('metrics/', views.request_metrics, name='request_metrics'),
+    path('export/<slug:name>.<str:fmt>', views.export, name='export'),
 ]
@@ -1,24 +1,56 @@
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render
-from django.http import HttpResponse, Http404
+from django.urls import reverse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.contrib.admin.views.decorators import staff_member_required
 from django.db.models import Q
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
 from apps.books.models import Book
 from apps.films.models import Film
 from apps.education.models import Course
+from apps.reviews.ranking import top_rated
+from .autocomplete import SOURCES, suggest
+from .cache import cache_page_anonymous, cache_version, get_timeout
+from .exports import EXPORTS, FORMATS, async_chunks, stream_export
+from .metrics import get_metrics
+from .parallel import gather
+from .search import search_queryset
 
-def index(request):
+@cache_page_anonymous('book', 'film', 'course')
+async def index(request):
     """Главная страница с поиском"""
-    # Получаем несколько последних записей для отображения на главной
-    recent_books = Book.objects.all()[:3]
-    recent_films = Film.objects.all()[:3]
-    recent_courses = Course.objects.all()[:3]
+    # Последние записи и лучшие по оценкам - независимые запросы, выполняются одновременно
+    (
+        recent_books, recent_films, recent_courses, top_books, top_films, top_courses, version,
+    ) = await gather(
+        lambda: list(Book.objects.all()[:3]),
+        lambda: list(Film.objects.all()[:3]),
+        lambda: list(Course.objects.all()[:3]),
+        partial(top_rated, 'book', 3),
+        partial(top_rated, 'film', 3),
+        partial(top_rated, 'course', 3),
+        partial(cache_version, 'book', 'film', 'course'),
+    )
 
-    return render(request, 'main/index.html', {
+    return await sync_to_async(render)(request, 'main/index.html', {
         'recent_books': recent_books,
         'recent_films': recent_films,
         'recent_courses': recent_courses,
+        'top_rated': [
+            ('Книги', top_books, '/books/?sort=rating'),
+            ('Фильмы', top_films, '/films/?sort=rating'),
+            ('Курсы', top_courses, '/education/?sort=rating'),
+        ],
+        'cache_version': version,
+        'cache_timeout': get_timeout(),
     })
 
-def search(request):
+async def search(request):
     """Глобальный поиск по всем типам контента"""
     query = request.GET.get('q', '')
     content_type = request.GET.get('type', 'all')
@@ -31,35 +63,70 @@ def search(request):
     }
 
     if query:
+        # Поиск по каждому типу - отдельный запрос, все выполняются одновременно
+        searches = {}
         if content_type in ['all', 'books']:
-            books = Book.objects.filter(
-                Q(title__icontains=query) |
-                Q(author__icontains=query) |
-                Q(description__icontains=query)
-            )[:10]
-            results['books'] = books
-            results['total'] += books.count()
+            searches['books'] = lambda: list(search_queryset(Book.objects.all(), query)[:10])
 
         if content_type in ['all', 'films']:
-            films = Film.objects.filter(
-                Q(title__icontains=query) |
-                Q(director__icontains=query) |
-                Q(description__icontains=query)
-            )[:10]
-            results['films'] = films
-            results['total'] += films.count()
+            searches['films'] = lambda: list(
+                search_queryset(Film.objects.all(), query, extra_q=Q(directors__name__icontains=query))[:10]
+            )
 
         if content_type in ['all', 'courses']:
-            courses = Course.objects.filter(
-                Q(title__icontains=query) |
-                Q(instructor__icontains=query) |
-                Q(description__icontains=query)
-            )[:10]
-            results['courses'] = courses
-            results['total'] += courses.count()
-
-    return render(request, 'main/search_results.html', {
+            searches['courses'] = lambda: list(search_queryset(Course.objects.all(), query)[:10])
+
+        for name, objects in zip(searches, await gather(*searches.values())):
+            results[name] = objects
+            results['total'] += len(objects)
+
+    return await sync_to_async(render)(request, 'main/search_results.html', {
         'query': query,
         'results': results,
         'content_type': content_type
     })
+
+
+def autocomplete(request):
+    """Подсказки поиска по мере ввода: JSON без запросов к базе (main/autocomplete.py)"""
+    query = request.GET.get('q', '')[:100]
+    kinds = {kind for kind in request.GET.get('types', '').split(',') if kind in SOURCES}
+    response = JsonResponse(
+        {'query': query, 'results': suggest(query, settings.AUTOCOMPLETE_LIMIT, kinds)},
+        json_dumps_params={'ensure_ascii': False},
+    )
+    patch_cache_control(response, max_age=60)
+    return response
+
+
+@staff_member_required
+def request_metrics(request):
+    """Гистограммы времени ответа и числа SQL-запросов по представлениям (main/metrics.py)"""
+    return JsonResponse(get_metrics(), json_dumps_params={'ensure_ascii': False, 'indent': 2})
+
+
+def robots_txt(request):
+    """robots.txt: служебные разделы закрыты, адрес карты сайта для роботов"""
+    lines = [
+        'User-agent: *',
+        'Disallow: /admin/',
+        'Disallow: /accounts/',
+        'Disallow: /search/',
+        'Disallow: /export/',
+        f'Sitemap: {request.build_absolute_uri(reverse("sitemap_index"))}',
+    ]
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain')
+
+
+@staff_member_required
+def export(request, name, fmt):
+    """Выгрузка каталога, отзывов или сообщений форума потоком (main/exports.py)"""
+    if name not in EXPORTS or fmt not in FORMATS:
+        raise Http404('Нет такой выгрузки')
+    chunks = stream_export(name, fmt)
+    if isinstance(request, ASGIRequest):
+        chunks = async_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=FORMATS[fmt][0])
+    response.headers['Content-Disposition'] = f'attachment; filename="{name}-{timezone.localdate():%Y-%m-%d}.{fmt}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
@@ -0,0 +1,12 @@
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'web_coffee.settings')
+
+application = get_asgi_application()
+
+# Индекс подсказок поиска строится в фоне при старте процесса, а не на первом запросе
+from main.autocomplete import preload
+
+preload()
@@ -18,6 +18,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.sitemaps',
 
     # Главное приложение
     'main',
@@ -33,6 +34,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Метрики запросов (включается REQUEST_METRICS_ENABLED), должен быть первым
+    'main.metrics.RequestMetricsMiddleware',
+    'main.db_router.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -59,14 +63,142 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'web_coffee.wsgi.application'
+# ASGI-развертывание (uvicorn web_coffee.asgi:application): главная и поиск - асинхронные представления
+ASGI_APPLICATION = 'web_coffee.asgi.application'
+# Тесты: без фоновой записи буферов событий (main/testing.py)
+TEST_RUNNER = 'main.testing.TestRunner'
 
 # Database
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Профиль базы данных: 'development' или 'production'
+DB_PROFILE = os.environ.get('DB_PROFILE', 'development')
+
+# Сколько секунд соединение ждет снятия блокировки записи (sqlite3_busy_timeout),
+# прежде чем выдать "database is locked"
+SQLITE_BUSY_TIMEOUT = 20
+
+# Выполняются при открытии каждого соединения с SQLite в режиме production
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',      # читатели не блокируют писателя и наоборот
+    'synchronous': 'NORMAL',    # в режиме WAL безопасно и без fsync на каждую транзакцию
+    'mmap_size': 268435456,     # 256 МБ файла базы читаются через mmap
+    'cache_size': -65536,       # 64 МБ страничного кэша на соединение
+    'temp_store': 'MEMORY',     # временные таблицы сортировок в памяти
+}
+
+DATABASE_PROFILES = {
+    'development': {
+        'OPTIONS': {},
+        'CONN_MAX_AGE': 0,
+    },
+    'production': {
+        'OPTIONS': {
+            'timeout': SQLITE_BUSY_TIMEOUT,
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            # Пишущие транзакции (atomic) сразу берут блокировку записи: без этого
+            # транзакция «прочитал, потом записал» получает "database is locked"
+            # сразу, не дожидаясь timeout
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # Соединение переиспользуется между запросами одного потока
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+    },
+}
+
+# База данных: 'sqlite' (по умолчанию) или 'postgresql'
+# (нужен пакет psycopg[binary,pool] и расширение pg_trgm, см. main/search.py)
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite')
+
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'web_coffee'),
+            'USER': os.environ.get('POSTGRES_USER', 'web_coffee'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', '127.0.0.1'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'OPTIONS': {
+                # Пул соединений psycopg (с пулом CONN_MAX_AGE должен быть 0)
+                'pool': {
+                    'min_size': int(os.environ.get('POSTGRES_POOL_MIN', 2)),
+                    'max_size': int(os.environ.get('POSTGRES_POOL_MAX', 10)),
+                },
+            },
+        }
+    }
+    # Поиск (SearchVector, trigram_similar) и миграции расширений
+    INSTALLED_APPS.append('django.contrib.postgres')
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            **DATABASE_PROFILES[DB_PROFILE],
+        }
     }
+
+# Реплики только для чтения (main/db_router.py). Для SQLite - соединения
+# с тем же файлом в режиме только чтения, для PostgreSQL - адреса реплик
+if DATABASE_ENGINE == 'postgresql':
+    for _number, _host in enumerate(filter(None, os.environ.get('POSTGRES_REPLICA_HOSTS', '').split(',')), 1):
+        DATABASES[f'replica_{_number}'] = {**DATABASES['default'], 'HOST': _host.strip()}
+else:
+    # Без записывающих настроек профиля: journal_mode и BEGIN IMMEDIATE
+    # требуют права записи
+    _replica_options = {
+        name: value for name, value in DATABASES['default']['OPTIONS'].items()
+        if name not in ('init_command', 'transaction_mode')
+    }
+    for _number in range(1, int(os.environ.get('SQLITE_READ_REPLICAS', 0)) + 1):
+        DATABASES[f'replica_{_number}'] = {
+            **DATABASES['default'],
+            'NAME': f"file:{DATABASES['default']['NAME']}?mode=ro",
+            'OPTIONS': _replica_options,
+        }
+for _alias in DATABASES:
+    if _alias != 'default':
+        # В тестах реплики используют тестовую основную базу
+        DATABASES[_alias]['TEST'] = {'MIRROR': 'default'}
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['main.db_router.ReplicaRouter']
+# Сколько секунд после изменяющего запроса пользователь читает из основной базы
+REPLICA_PIN_SECONDS = 5
+
+# Конфигурация полнотекстового поиска PostgreSQL (морфология русского языка)
+SEARCH_CONFIG = 'russian'
+
+# Кэш: 'locmem' (по умолчанию), 'file' или 'redis' (любой Redis-совместимый сервер)
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'web-coffee',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', os.path.join(BASE_DIR, '.cache')),
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'redis://127.0.0.1:6379/1'),
+    },
+}
+CACHES = {
+    'default': _CACHE_BACKENDS[CACHE_BACKEND],
 }
+# Время жизни закэшированных страниц и фрагментов (секунды), см. main/cache.py
+PAGE_CACHE_TIMEOUT = 600
+# Как долго браузер может показывать устаревшие счетчики просмотров (ответ 304), см. main/conditional.py
+COUNTER_MAX_STALE = 300
+
+# Метрики запросов (main/metrics.py): число SQL-запросов, повторы, время базы,
+# шаблонов и ответа. Сводка - /metrics/ (персонал) или manage.py request_metrics
+REQUEST_METRICS_ENABLED = os.environ.get('REQUEST_METRICS', '0') == '1'
+REQUEST_METRICS_SERVER_TIMING = True       # заголовок Server-Timing в ответах
+REQUEST_METRICS_FLUSH_INTERVAL = 10        # секунды между переносом гистограмм в кэш
+REQUEST_METRICS_DUPLICATE_THRESHOLD = 5    # с какого числа повторов одного SQL писать предупреждение
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -99,6 +231,60 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Отдача локальных видео: 'python' (FileResponse), 'x-accel' (nginx) или 'x-sendfile' (Apache)
+MEDIA_STREAMING_MODE = os.environ.get('MEDIA_STREAMING_MODE', 'python')
+# internal location в nginx, указывающий на MEDIA_ROOT
+MEDIA_STREAMING_ACCEL_PREFIX = '/protected-media/'
+
+# Миниатюры изображений (main/thumbnails.py)
+THUMBNAIL_WIDTHS = [100, 200, 400, 800, 1280]
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_ASYNC = True  # False - генерировать сразу в потоке сохранения
+THUMBNAIL_MISS_TTL = 60  # секунды, на которые запоминается отсутствие миниатюр
+
+# Размер страницы (в символах) в режиме чтения книги
+BOOK_CHUNK_SIZE = 20000
+
+# Рейтинг «лучшие по оценкам» (apps/reviews/ranking.py, manage.py rank_ratings):
+# вес априорной средней в байесовской оценке - сколько «средних» голосов
+# добавляется к каждому объекту, чтобы одна пятерка не выводила его в топ
+RATING_PRIOR_WEIGHT = 10
+
+# «Популярное сейчас» (main/trending.py, manage.py compute_trending)
+TRENDING_FLUSH_INTERVAL = 60     # секунды между записью накопленных событий в базу
+TRENDING_HALF_LIFE_HOURS = 24    # за сколько часов вклад события уменьшается вдвое
+TRENDING_WINDOW_HOURS = 7 * 24   # более старые часовые корзины удаляются
+TRENDING_WEIGHTS = {'views': 1, 'favorites': 5, 'reviews': 8, 'posts': 3}
+
+# Подсказки поиска по мере ввода (main/autocomplete.py)
+AUTOCOMPLETE_LIMIT = 10           # подсказок в ответе
+AUTOCOMPLETE_MAX_AGE = 15 * 60    # секунды между полными перестройками индекса (изменения других процессов)
+
+# Журнал переходов на сайты (apps/sites/clicks.py, manage.py rollup_site_clicks)
+SITE_CLICK_FLUSH_INTERVAL = 10   # секунды между записью накопленных переходов в базу
+SITE_CLICK_BUFFER_SIZE = 500     # переходов в буфере, при которых запись не ждет интервала
+
+# Проверка внешних ссылок сайтов и курсов (main/linkcheck.py, manage.py check_links)
+LINK_CHECK_CONCURRENCY = 20      # одновременных соединений всего
+LINK_CHECK_PER_HOST = 2          # одновременных запросов к одному хосту
+LINK_CHECK_TIMEOUT = 10          # секунды на запрос (соединение и заголовки ответа)
+LINK_CHECK_DEAD_AFTER = 3        # неудачных проверок подряд, после которых ссылка считается мертвой
+LINK_CHECK_HISTORY_DAYS = 90     # более старые результаты проверок удаляются
+
+# Карта сайта (main/sitemaps.py) и Atom-ленты новых фильмов и тем форума
+SITEMAP_LIMIT = 50000                 # ссылок в одном файле карты (ограничение протокола sitemaps.org)
+SITEMAP_CACHE_TIMEOUT = 6 * 60 * 60   # секунды; изменения объектов раздела сбрасывают кэш раньше
+FEED_ITEMS = 30                       # записей в ленте
+
+# Выгрузка CSV/JSONL (main/exports.py, /export/<имя>.<формат>, manage.py export):
+# строк на одно чтение из базы и на одну часть ответа
+EXPORT_CHUNK_SIZE = 2000
+
+# Потоки для одновременных запросов асинхронных представлений (main/parallel.py);
+# у каждого потока свое соединение с базой, 0 - запросы по очереди
+ASYNC_QUERY_THREADS = int(os.environ.get('ASYNC_QUERY_THREADS', 8))
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
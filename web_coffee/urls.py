@@ -4,6 +4,8 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib.auth import views as auth_views
 
+from main import sitemaps
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('main.urls')),                         # Главная страница
@@ -12,9 +14,14 @@ urlpatterns = [
     path('education/', include('apps.education.urls')),     # Образование
     path('forum/', include('apps.forum.urls')),             # Форум
     path('sites/', include('apps.sites.urls')),             # Интернет-ресурсы
+    path('reviews/', include('apps.reviews.urls')),         # Избранное и отзывы
 
     # Аутентификация
     path('accounts/', include('apps.accounts.urls')),
+
+    # Карта сайта для поисковых роботов (main/sitemaps.py)
+    path('sitemap.xml', sitemaps.index, name='sitemap_index'),
+    path('sitemap-<slug:section>.xml', sitemaps.section, name='sitemap_section'),
 ]
 
 if settings.DEBUG:
@@ -4,4 +4,9 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'web_coffee.settings')
 
-application = get_wsgi_application()
\ No newline at end of file
+application = get_wsgi_application()
+
+# Индекс подсказок поиска строится в фоне при старте процесса, а не на первом запросе
+from main.autocomplete import preload
+
+preload()